@@ -41,17 +41,22 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'recipes',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'recipes.middleware.StaticFilesMiddleware',
+    'recipes.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'recipes.middleware.RequestTimingMiddleware',
+    'recipes.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -77,17 +82,47 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Параметры подключения задаются переменными окружения (или файлом .env).
+# Соединения с базой переиспользуются между запросами DB_CONN_MAX_AGE секунд
+# (0 - новое соединение на каждый запрос, например при ASGI-развертывании);
+# перед повторным использованием соединение проверяется (CONN_HEALTH_CHECKS).
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'dietolog_db',
-        'USER': 'postgres',
-        'PASSWORD': 'admin',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
+        'NAME': os.getenv('DB_NAME', 'dietolog_db'),
+        'USER': os.getenv('DB_USER', 'postgres'),
+        'PASSWORD': os.getenv('DB_PASSWORD', 'admin'),
+        'HOST': os.getenv('DB_HOST', 'localhost'),
+        'PORT': os.getenv('DB_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
     }
 }
 
+# Реплика только для чтения (см. recipes/routers.py). Подключается, если задано
+# DB_REPLICA_NAME или DB_REPLICA_HOST; остальные параметры берутся из основной базы.
+# Для локальной проверки подойдут две базы SQLite:
+#   DB_ENGINE=django.db.backends.sqlite3 DB_NAME=primary.sqlite3 DB_REPLICA_NAME=replica.sqlite3
+DATABASE_REPLICA_ALIAS = os.getenv('DB_REPLICA_ALIAS', 'replica')
+
+if os.getenv('DB_REPLICA_NAME') or os.getenv('DB_REPLICA_HOST'):
+    DATABASES[DATABASE_REPLICA_ALIAS] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.getenv('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.getenv('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+    }
+
+DATABASE_ROUTERS = ['recipes.routers.ReplicaRouter']
+
+# Сколько секунд после изменения данных чтение идет из основной базы
+# (для изменившего их клиента, а после изменения каталога - для всех).
+# Должно быть больше обычного отставания реплики.
+DATABASE_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 10))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,10 +162,113 @@ STATIC_URL = 'static/'
 
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
+# Каталог, в который `python manage.py collectstatic` собирает файлы с хешем содержимого
+# в имени и их сжатые копии .gz/.br (см. recipes/staticfiles.py).
+STATIC_ROOT = os.getenv('STATIC_ROOT', BASE_DIR / 'staticfiles')
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'recipes.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Отдача собранной статики самим приложением (recipes.middleware.StaticFilesMiddleware).
+# Если статику отдает отдельный веб-сервер (nginx и т.п.), можно отключить.
+STATIC_SERVE = os.getenv('STATIC_SERVE', 'True') == 'True'
+# Время кэширования в браузере (сек): файлов с хешем в имени - год, остальных - час.
+STATIC_IMMUTABLE_MAX_AGE = int(os.getenv('STATIC_IMMUTABLE_MAX_AGE', 60 * 60 * 24 * 365))
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', 60 * 60))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# По умолчанию - локальный кэш в памяти процесса. При нескольких процессах (gunicorn и т.п.)
+# стоит указать общий бэкенд (Redis, Memcached), чтобы версия каталога была единой.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'dieto-log'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    }
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Генератор меню
+# Алгоритм поиска плана питания: 'random' (случайный поиск), 'vectorized' (NumPy),
+# 'exact' (детерминированный поиск методом ветвей и границ) или 'parallel'
+# (случайный поиск с перезапусками в нескольких процессах).
+MEAL_PLAN_ENGINE = os.getenv('MEAL_PLAN_ENGINE', 'random')
+
+# Снимок каталога в памяти процесса (см. recipes/snapshot.py). При отключении кандидаты
+# для генератора загружаются на каждый запрос одним запросом к базе - для больших каталогов,
+# когда держать снимок в каждом процессе слишком дорого по памяти.
+CATALOGUE_SNAPSHOT_ENABLED = os.getenv('CATALOGUE_SNAPSHOT_ENABLED', 'True') == 'True'
+
+# Кэш планов питания: алиас из CACHES, время жизни (сек), шаг "корзины" калорийности (ккал)
+# и количество различных планов, хранимых для одной корзины.
+MEAL_PLAN_CACHE_ALIAS = 'default'
+MEAL_PLAN_CACHE_TIMEOUT = 60 * 60
+MEAL_PLAN_CACHE_BUCKET = 50
+MEAL_PLAN_CACHE_POOL_SIZE = 5
+
+# Каталог рецептов: количество карточек на странице и время хранения
+# количества найденных рецептов в кэше (сек).
+RECIPE_LIST_PAGE_SIZE = 24
+RECIPE_COUNT_CACHE_TIMEOUT = 60 * 60
+
+# Кэш страниц рецепта и каталога (см. recipes/caching.py): время хранения в кэше (сек, 0 - не кэшировать)
+# и max-age для браузеров, после которого страница проверяется условным запросом (ETag / Last-Modified).
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', 60 * 60 * 24))
+PAGE_CACHE_MAX_AGE = int(os.getenv('PAGE_CACHE_MAX_AGE', 0))
+
+# JSON API генератора: число потоков пула, в котором выполняется генератор,
+# максимальное число одновременно обрабатываемых запросов (остальные получают 503)
+# и время ожидания результата (сек), после которого возвращается 504.
+MEAL_PLAN_API_WORKERS = int(os.getenv('MEAL_PLAN_API_WORKERS', 4))
+MEAL_PLAN_API_MAX_CONCURRENCY = int(os.getenv('MEAL_PLAN_API_MAX_CONCURRENCY', 8))
+MEAL_PLAN_API_TIMEOUT = float(os.getenv('MEAL_PLAN_API_TIMEOUT', 10))
+
+# Алгоритм 'parallel' (см. recipes/parallel.py): число процессов, число независимых
+# перезапусков случайного поиска и общее число попыток, которое делится между ними.
+# Результат зависит только от seed, числа перезапусков и попыток, но не от числа процессов.
+MEAL_PLAN_PARALLEL_WORKERS = int(os.getenv('MEAL_PLAN_PARALLEL_WORKERS', min(os.cpu_count() or 1, 4)))
+MEAL_PLAN_PARALLEL_RESTARTS = int(os.getenv('MEAL_PLAN_PARALLEL_RESTARTS', 8))
+MEAL_PLAN_PARALLEL_ATTEMPTS = int(os.getenv('MEAL_PLAN_PARALLEL_ATTEMPTS', 2400))
+
+# Замеры времени этапов запроса (см. recipes/timing.py): JSON-строка в журнал 'recipes.timing'
+# (уровень INFO; по умолчанию выводится только при DEBUG, иначе задайте REQUEST_TIMING_LOG_LEVEL=INFO)
+# и, при REQUEST_TIMING_HEADER, заголовок Server-Timing (по умолчанию - только при DEBUG).
+REQUEST_TIMING_ENABLED = os.getenv('REQUEST_TIMING_ENABLED', 'True') == 'True'
+REQUEST_TIMING_HEADER = os.getenv('REQUEST_TIMING_HEADER', str(DEBUG)) == 'True'
+
+# Выборочное профилирование запросов через cProfile: доля профилируемых запросов
+# (0 - выключено) и каталог для файлов .prof.
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_DIR = os.getenv('PROFILING_DIR', BASE_DIR / 'profiles')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'recipes.timing': {
+            'handlers': ['console'],
+            'level': os.getenv('REQUEST_TIMING_LOG_LEVEL', 'INFO' if DEBUG else 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
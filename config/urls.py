@@ -21,10 +21,19 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from django.templatetags.static import static as static_url
+from django.utils.functional import lazy
+from django.views.decorators.cache import cache_control
 from django.views.generic.base import RedirectView
 
+# Адрес favicon содержит хеш содержимого, поэтому перенаправление не постоянное
+# и кэшируется на STATIC_MAX_AGE: после смены иконки браузер получит новый адрес.
+favicon_view = cache_control(public=True, max_age=settings.STATIC_MAX_AGE)(
+    RedirectView.as_view(url=lazy(static_url, str)('images/favicon.ico'), permanent=False)
+)
+
 urlpatterns = [
-    path('favicon.ico', RedirectView.as_view(url=settings.STATIC_URL + 'images/favicon.ico', permanent=True)),
+    path('favicon.ico', favicon_view),
     path('admin/', admin.site.urls),
     path('', include('recipes.urls')),
 ]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Diet, Ingredient, Recipe, RecipeIngredient
+from .models import Diet, Ingredient, IngredientGroup, Recipe, RecipeIngredient
 
 # ==============================================================================
 # Настройка админ-панели для модели Diet
@@ -7,7 +7,7 @@ from .models import Diet, Ingredient, Recipe, RecipeIngredient
 @admin.register(Diet)
 class DietAdmin(admin.ModelAdmin):
     """Настройки отображения модели Диет в админ-панели."""
-    list_display = ('name', 'default_calories', 'carbs_constraint')
+    list_display = ('name', 'default_calories', 'carbs_constraint', 'snack_count')
     search_fields = ('name',)
 
 # ==============================================================================
@@ -20,6 +20,16 @@ class IngredientAdmin(admin.ModelAdmin):
     search_fields = ('name',)
     list_per_page = 50 # Отображать по 50 ингредиентов на странице
 
+# ==============================================================================
+# Настройка админ-панели для модели IngredientGroup
+# ==============================================================================
+@admin.register(IngredientGroup)
+class IngredientGroupAdmin(admin.ModelAdmin):
+    """Настройки отображения групп ингредиентов (для исключения из меню и каталога)."""
+    list_display = ('name',)
+    search_fields = ('name',)
+    autocomplete_fields = ['ingredients']
+
 # ==============================================================================
 # Настройка админ-панели для модели Recipe
 # ==============================================================================
@@ -0,0 +1,361 @@
+import platform
+import random
+import statistics
+import time
+from decimal import Decimal
+
+import django
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .caching import bump_catalogue_version, get_plan_cache
+from .fixedpoint import NUTRIENTS, SCALE, TOTALS_SCALE, divide_round, to_fixed
+from .generator import DEFAULT_MEAL_LAYOUT, ENGINES, SCORE_SCALE, plan_totals_fixed, score_meal_plan, search_meal_plan
+from .models import Diet, Ingredient, Recipe, RecipeIngredient
+from .snapshot import CatalogueRecipe, CatalogueSnapshot
+
+
+# ==============================================================================
+# Синтетический каталог
+# ==============================================================================
+# Каталог генерируется детерминированно (по seed) в виде простых словарей, из которых
+# можно получить фикстуру в формате initial_data.json, снимок каталога для генератора
+# (без базы) или записи в базе для замеров страниц.
+
+# Диеты каталога. Первая - "целевая": ей принадлежит доля coverage всех рецептов,
+# остальные покрывают случайную треть каталога.
+SYNTHETIC_DIETS = [
+    {'name': "Сбалансированная", 'protein_per_1000_kcal': 45, 'fat_per_1000_kcal': 40,
+     'carb_per_1000_kcal': 110, 'carbs_constraint': 'AT_LEAST'},
+    {'name': "Кето-диета", 'protein_per_1000_kcal': 38, 'fat_per_1000_kcal': 67,
+     'carb_per_1000_kcal': 23, 'carbs_constraint': 'AT_MOST'},
+    {'name': "Высокобелковая", 'protein_per_1000_kcal': 60, 'fat_per_1000_kcal': 30,
+     'carb_per_1000_kcal': 90, 'carbs_constraint': 'AT_LEAST'},
+    {'name': "Вегетарианская", 'protein_per_1000_kcal': 35, 'fat_per_1000_kcal': 35,
+     'carb_per_1000_kcal': 130, 'carbs_constraint': 'AT_LEAST'},
+]
+
+# Профили ингредиентов: диапазоны белков, жиров и углеводов на 100 г.
+INGREDIENT_PROFILES = [
+    ((15, 30), (1, 20), (0, 3)),      # мясо, рыба
+    ((5, 15), (0, 10), (40, 75)),     # крупы, хлеб
+    ((0, 3), (0, 1), (2, 15)),        # овощи, фрукты
+    ((2, 25), (10, 100), (0, 10)),    # масла, сыры, орехи
+    ((3, 10), (1, 10), (3, 10)),      # молочные продукты
+]
+
+SYNTHETIC_INGREDIENT_COUNT = 60
+
+# Доли приемов пищи среди рецептов.
+MEAL_TYPE_WEIGHTS = {'BREAKFAST': 30, 'LUNCH': 35, 'DINNER': 30, 'SNACK': 5}
+
+# Диапазон калорийности одной порции рецепта (ккал).
+SERVING_CALORIES_RANGE = (200, 800)
+
+
+def generate_catalogue(recipe_count, coverage=1.0, seed=0):
+    """
+    Генерирует синтетический каталог.
+
+    Аргументы:
+        recipe_count (int): количество рецептов.
+        coverage (float): доля рецептов, входящих в первую ("целевую") диету.
+        seed (int): зерно генератора случайных чисел.
+
+    Возвращает:
+        dict: {'diets': [...], 'ingredients': [...], 'recipes': [...], 'recipe_ingredients': [...]} -
+        списки словарей с полями моделей и pk (нумерация с 1).
+    """
+    rng = random.Random(seed)
+
+    diets = [dict(fields, pk=index, description="", default_calories=2000)
+             for index, fields in enumerate(SYNTHETIC_DIETS, start=1)]
+
+    ingredients = []
+    for pk in range(1, SYNTHETIC_INGREDIENT_COUNT + 1):
+        proteins, fats, carbs = (Decimal(rng.randint(low * 10, high * 10)) / 10 for low, high in rng.choice(INGREDIENT_PROFILES))
+        calories = proteins * 4 + fats * 9 + carbs * 4
+        ingredients.append({
+            'pk': pk, 'name': f"Ингредиент {pk}",
+            'calories': calories, 'proteins': proteins, 'fats': fats, 'carbs': carbs,
+        })
+
+    meal_types = list(MEAL_TYPE_WEIGHTS)
+    meal_type_weights = list(MEAL_TYPE_WEIGHTS.values())
+    recipes, recipe_ingredients = [], []
+    for pk in range(1, recipe_count + 1):
+        servings = rng.randint(1, 4)
+        chosen = rng.sample(ingredients, rng.randint(2, 5))
+        weights = [rng.randint(20, 250) for _ in chosen]
+        # Масштабируем веса, чтобы калорийность порции попала в SERVING_CALORIES_RANGE.
+        calories = sum(ingredient['calories'] * weight / 100 for ingredient, weight in zip(chosen, weights))
+        factor = Decimal(rng.randint(*SERVING_CALORIES_RANGE) * servings) / max(calories, Decimal(1))
+        weights = [max(1, int(weight * factor)) for weight in weights]
+
+        diet_ids = [diet['pk'] for diet in diets[1:] if rng.random() < 1 / 3]
+        if rng.random() < coverage:
+            diet_ids.insert(0, diets[0]['pk'])
+
+        recipes.append({
+            'pk': pk,
+            'name': f"Рецепт {pk}",
+            'description': f"Синтетический рецепт {pk}",
+            'instructions': "Смешать и подать.",
+            'cooking_time': rng.randint(5, 120),
+            'servings': servings,
+            'meal_type': rng.choices(meal_types, meal_type_weights)[0],
+            'diets': diet_ids,
+        })
+        for ingredient, weight in zip(chosen, weights):
+            recipe_ingredients.append({
+                'pk': len(recipe_ingredients) + 1, 'recipe': pk, 'ingredient': ingredient['pk'],
+                'weight_grams': weight, 'display_amount': str(weight), 'display_unit': "г",
+            })
+
+    return {'diets': diets, 'ingredients': ingredients, 'recipes': recipes, 'recipe_ingredients': recipe_ingredients}
+
+
+def catalogue_to_fixture(catalogue):
+    """Каталог в формате фикстуры Django (как initial_data.json) для `manage.py loaddata`."""
+    def records(model, items):
+        return [
+            {'model': model, 'pk': item['pk'],
+             'fields': {key: str(value) if isinstance(value, Decimal) else value for key, value in item.items() if key != 'pk'}}
+            for item in items
+        ]
+
+    return (
+        records('recipes.diet', catalogue['diets'])
+        + records('recipes.ingredient', catalogue['ingredients'])
+        + records('recipes.recipe', catalogue['recipes'])
+        + records('recipes.recipeingredient', catalogue['recipe_ingredients'])
+    )
+
+
+def catalogue_to_snapshot(catalogue):
+    """Снимок каталога для генератора (snapshot.CatalogueSnapshot), построенный без базы данных."""
+    ingredients = {item['pk']: tuple(to_fixed(item[name]) for name in NUTRIENTS) for item in catalogue['ingredients']}
+    totals = {}
+    for item in catalogue['recipe_ingredients']:
+        recipe_totals = totals.setdefault(item['recipe'], [0, 0, 0, 0])
+        for index, value in enumerate(ingredients[item['ingredient']]):
+            recipe_totals[index] += value * item['weight_grams']
+
+    diet_bits = {diet['pk']: 1 << index for index, diet in enumerate(catalogue['diets'])}
+    divisor = TOTALS_SCALE // SCALE
+    records = []
+    for recipe in catalogue['recipes']:
+        values = tuple(divide_round(value, divisor * recipe['servings']) for value in totals.get(recipe['pk'], (0, 0, 0, 0)))
+        diet_mask = 0
+        for diet_id in recipe['diets']:
+            diet_mask |= diet_bits[diet_id]
+        records.append(CatalogueRecipe(recipe['pk'], recipe['name'], recipe['meal_type'], values, diet_mask))
+
+    return CatalogueSnapshot(version=None, recipes=tuple(records), diet_bits=diet_bits)
+
+
+def load_catalogue(catalogue, batch_size=1000):
+    """
+    Записывает каталог в базу (bulk_create, без сигналов), после чего пересчитывает КБЖУ,
+    поисковые векторы и версию каталога.
+
+    Возвращает:
+        dict: соответствие pk из каталога и pk в базе {'diets': {...}, 'ingredients': {...}, 'recipes': {...}}.
+    """
+    def create(model, items, fields):
+        objects = model.objects.bulk_create([model(**{name: item[name] for name in fields}) for item in items], batch_size=batch_size)
+        return {item['pk']: obj.pk for item, obj in zip(items, objects)}
+
+    with transaction.atomic():
+        diet_ids = create(Diet, catalogue['diets'], [
+            'name', 'description', 'default_calories', 'protein_per_1000_kcal', 'fat_per_1000_kcal',
+            'carb_per_1000_kcal', 'carbs_constraint',
+        ])
+        ingredient_ids = create(Ingredient, catalogue['ingredients'], ['name', 'calories', 'proteins', 'fats', 'carbs'])
+        recipe_ids = create(Recipe, catalogue['recipes'], [
+            'name', 'description', 'instructions', 'cooking_time', 'servings', 'meal_type',
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe_id=recipe_ids[item['recipe']], ingredient_id=ingredient_ids[item['ingredient']],
+                weight_grams=item['weight_grams'], display_amount=item['display_amount'], display_unit=item['display_unit'],
+            )
+            for item in catalogue['recipe_ingredients']
+        ], batch_size=batch_size)
+        Through = Recipe.diets.through
+        Through.objects.bulk_create([
+            Through(recipe_id=recipe_ids[recipe['pk']], diet_id=diet_ids[diet_id])
+            for recipe in catalogue['recipes'] for diet_id in recipe['diets']
+        ], batch_size=batch_size)
+
+    call_command('rebuild_nutrition', verbosity=0, stdout=_NullOutput())
+    call_command('rebuild_search_vectors', verbosity=0, stdout=_NullOutput())
+    bump_catalogue_version()
+    return {'diets': diet_ids, 'ingredients': ingredient_ids, 'recipes': recipe_ids}
+
+
+class _NullOutput:
+    """Поглощает вывод вызываемых management-команд."""
+
+    def write(self, *args, **kwargs):
+        pass
+
+    def flush(self):
+        pass
+
+
+# ==============================================================================
+# Замеры
+# ==============================================================================
+def summarize_latency(seconds):
+    """Статистика времени выполнения (мс): среднее, медиана, 95-й процентиль, максимум."""
+    if not seconds:
+        return None
+    values = sorted(value * 1000 for value in seconds)
+    p95 = values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))]
+    return {
+        'mean': round(statistics.fmean(values), 3),
+        'p50': round(statistics.median(values), 3),
+        'p95': round(p95, 3),
+        'max': round(values[-1], 3),
+    }
+
+
+def diet_targets(diet, target_calories):
+    """Пороги БЖУ для генератора (как на главной странице) по полям диеты из каталога."""
+    calories_factor = Decimal(target_calories) / Decimal(1000)
+    return {
+        'proteins': round(diet['protein_per_1000_kcal'] * calories_factor),
+        'fats': round(diet['fat_per_1000_kcal'] * calories_factor),
+        'carbs': round(diet['carb_per_1000_kcal'] * calories_factor),
+        'carb_constraint_type': diet['carbs_constraint'],
+    }
+
+
+def benchmark_generator(catalogue, engines=ENGINES, runs=20, target_calories=2000, seed=0, layout=DEFAULT_MEAL_LAYOUT):
+    """
+    Замеряет генератор на снимке синтетического каталога для "целевой" диеты
+    (слоты плана - layout, см. generator.build_meal_layout).
+
+    Возвращает:
+        list: по одному словарю на алгоритм: время подготовки кандидатов и поиска,
+        доля успешных запусков, штраф найденных планов (в ккал^2) и отклонение калорийности.
+    """
+    diet = catalogue['diets'][0]
+    targets = diet_targets(diet, target_calories)
+    snapshot = catalogue_to_snapshot(catalogue)
+
+    started = time.perf_counter()
+    candidates = snapshot.candidates_for_diet(diet['pk'])
+    candidates_seconds = time.perf_counter() - started
+
+    results = []
+    for engine in engines:
+        latencies, scores, deviations = [], [], []
+        for run in range(runs):
+            rng = random.Random(seed * 1_000_003 + run)
+            started = time.perf_counter()
+            meal_plan = search_meal_plan(candidates, target_calories, targets, engine, rng=rng, layout=layout)
+            latencies.append(time.perf_counter() - started)
+            if meal_plan is None:
+                continue
+            calories = plan_totals_fixed(meal_plan)[0]
+            target = to_fixed(target_calories)
+            # Штраф в ккал^2 - без целочисленного масштаба score_meal_plan.
+            scores.append(round(score_meal_plan(meal_plan, target_calories, layout) / SCORE_SCALE, 3))
+            deviations.append(abs(calories - target) / target)
+
+        results.append({
+            'engine': engine,
+            'runs': runs,
+            'candidates': {slot: len(items) for slot, items in candidates.items()},
+            'candidates_ms': round(candidates_seconds * 1000, 3),
+            'latency_ms': summarize_latency(latencies),
+            'success_rate': round(len(scores) / runs, 4) if runs else None,
+            'score': {'mean': statistics.fmean(scores), 'best': min(scores)} if scores else None,
+            'calories_deviation': round(statistics.fmean(deviations), 6) if deviations else None,
+        })
+    return results
+
+
+def benchmark_views(catalogue, recipe_ids, runs=20, target_calories=2000, seed=0):
+    """
+    Замеряет страницы на каталоге, уже загруженном в базу (см. load_catalogue):
+    число SQL-запросов и время ответа.
+
+    Для главной страницы, рецепта и каталога отдельно замеряются "холодные" запросы
+    (кэш планов, страниц и снимок каталога строятся заново) и "теплые" повторные запросы.
+
+    Возвращает:
+        list: по одному словарю на страницу.
+    """
+    rng = random.Random(seed)
+    client = Client()
+    diet = Diet.objects.get(name=catalogue['diets'][0]['name'])
+    recipe_pks = list(recipe_ids.values())
+    ingredient_pks = list(Ingredient.objects.values_list('id', flat=True))
+
+    def cold(request):
+        def run():
+            get_plan_cache().clear()
+            return request()
+        return run
+
+    def index():
+        return client.post(reverse('recipes:index'), {'diet': diet.pk, 'calories': target_calories})
+
+    def recipe_detail():
+        return client.get(reverse('recipes:recipe_detail', args=[rng.choice(recipe_pks)]))
+
+    def recipe_list():
+        return client.get(reverse('recipes:recipe_list'))
+
+    def pantry():
+        # Набор продуктов "из холодильника": случайные 8 ингредиентов каталога.
+        ingredients = rng.sample(ingredient_pks, min(8, len(ingredient_pks)))
+        return client.get(reverse('recipes:pantry'), {'ingredients': ingredients, 'max_missing': 2})
+
+    pages = [
+        ('index_cold', cold(index)),
+        ('index', index),
+        ('recipe_detail_cold', cold(recipe_detail)),
+        ('recipe_detail', recipe_detail),
+        ('recipe_list_cold', cold(recipe_list)),
+        ('recipe_list', recipe_list),
+        ('recipe_list_filtered', lambda: client.get(reverse('recipes:recipe_list'), {'diet': diet.pk, 'max_time': 60})),
+        ('pantry', pantry),
+    ]
+
+    results = []
+    for name, request in pages:
+        request()   # прогрев (кроме *_cold, где кэш очищается перед каждым запросом)
+        latencies, query_counts = [], []
+        for _ in range(runs):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = request()
+                latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f"{name}: код ответа {response.status_code}")
+            query_counts.append(len(queries))
+        results.append({
+            'view': name,
+            'runs': runs,
+            'queries': max(query_counts),
+            'latency_ms': summarize_latency(latencies),
+        })
+    return results
+
+
+def environment_info():
+    """Сведения об окружении для сравнения результатов между запусками."""
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+    }
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .generator import (
+    resolve_candidates, search_meal_plan, score_meal_plan, diet_meal_layout,
+    plan_meets_targets, is_plan_acceptable, DEFAULT_MEAL_LAYOUT, ENGINE_EXACT,
+)
+
+# Ключ, под которым хранится "версия" каталога. Любое изменение рецептов, ингредиентов
+# или диет меняет версию, и все ранее сохраненные планы становятся недоступны.
+CATALOGUE_VERSION_KEY = 'recipes:catalogue_version'
+
+# Версия формата сохраняемых планов. Меняется вместе со структурой плана
+# (например, при добавлении целочисленных значений КБЖУ или слотов перекусов), чтобы
+# после обновления не читать из общего кэша планы старого формата.
+MEAL_PLAN_FORMAT_VERSION = 3
+
+
+def get_plan_cache():
+    """Возвращает бэкенд кэша, в котором хранятся планы питания."""
+    return caches[settings.MEAL_PLAN_CACHE_ALIAS]
+
+
+# ==============================================================================
+# Версия каталога
+# ==============================================================================
+def get_catalogue_version():
+    """
+    Возвращает текущую версию каталога.
+    Если версия еще не задана (или была вытеснена из кэша), создает новую.
+    """
+    cache = get_plan_cache()
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOGUE_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOGUE_VERSION_KEY)
+    return version
+
+
+def bump_catalogue_version():
+    """Меняет версию каталога, тем самым инвалидируя все закэшированные планы."""
+    get_plan_cache().set(CATALOGUE_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+# ==============================================================================
+# Кэш планов питания
+# ==============================================================================
+def meal_plan_cache_key(diet_id, target_calories, engine, exclusions=((), ())):
+    """
+    Ключ кэша: версия каталога + диета + алгоритм + "корзина" калорийности
+    (+ исключенные ингредиенты и группы, если они заданы).
+    Калорийность округляется вниз до шага MEAL_PLAN_CACHE_BUCKET, чтобы близкие
+    запросы (например, 2000 и 2030 ккал) использовали один и тот же набор планов.
+    """
+    bucket = int(target_calories) // settings.MEAL_PLAN_CACHE_BUCKET
+    key = f'recipes:meal_plans:{MEAL_PLAN_FORMAT_VERSION}:{get_catalogue_version()}:{diet_id}:{engine}:{bucket}'
+    ingredient_ids, group_ids = exclusions
+    if ingredient_ids or group_ids:
+        raw = json.dumps([sorted(set(ingredient_ids)), sorted(set(group_ids))])
+        key += ':' + hashlib.md5(raw.encode('ascii')).hexdigest()
+    return key
+
+
+def build_meal_plan_pool(possible_recipes, target_calories, nutrition_targets, engine, pool_size,
+                         layout=DEFAULT_MEAL_LAYOUT):
+    """
+    Составляет набор из нескольких лучших различных планов питания.
+    Кандидаты подготавливаются один раз (или берутся готовыми, см. generator.resolve_candidates),
+    после чего поиск запускается несколько раз (для детерминированного алгоритма достаточно
+    одного запуска).
+
+    Возвращает:
+        list: планы в формате find_best_meal_plan, отсортированные по возрастанию штрафа.
+    """
+    candidates = resolve_candidates(possible_recipes)
+    attempts = 1 if engine == ENGINE_EXACT else pool_size * 2
+
+    plans = {}
+    for _ in range(attempts):
+        meal_plan = search_meal_plan(candidates, target_calories, nutrition_targets, engine, layout=layout)
+        if meal_plan is None:
+            continue
+        # Одинаковые планы (те же рецепты и порции) сохраняем один раз.
+        signature = tuple((meal_type, data['recipe_data']['recipe'].pk, data['servings']) for meal_type, data in meal_plan.items())
+        plans[signature] = meal_plan
+
+    pool = sorted(plans.values(), key=lambda meal_plan: score_meal_plan(meal_plan, target_calories, layout))
+    return pool[:pool_size]
+
+
+def get_meal_plan(diet, possible_recipes, target_calories, nutrition_targets, engine, exclusions=((), ()),
+                  layout=None):
+    """
+    Возвращает план питания для диеты, используя кэш. Слоты плана и доли калорий
+    берутся из настроек диеты (generator.diet_meal_layout), если layout не передан;
+    их изменение, как и любое изменение диеты, меняет версию каталога. exclusions - пара (id исключенных
+    ингредиентов, id исключенных групп), по которой уже отобраны possible_recipes:
+    для каждого набора исключений хранится свой набор планов.
+
+    При попадании в кэш выбирается случайный план из сохраненного набора, который
+    подходит под точные ограничения текущего запроса. При промахе (или если ни один
+    план из набора не подходит) набор составляется заново и сохраняется в кэш.
+
+    Возвращает:
+        dict | None: план в формате find_best_meal_plan.
+    """
+    cache = get_plan_cache()
+    key = meal_plan_cache_key(diet.pk, target_calories, engine, exclusions)
+
+    pool = cache.get(key)
+    if pool is not None:
+        if not pool:
+            # Для этой корзины уже выяснено, что составить план невозможно.
+            return None
+        suitable = [
+            meal_plan for meal_plan in pool
+            if plan_meets_targets(meal_plan, nutrition_targets) and is_plan_acceptable(meal_plan, target_calories)
+        ]
+        if suitable:
+            return random.choice(suitable)
+
+    pool = build_meal_plan_pool(
+        possible_recipes, target_calories, nutrition_targets, engine, settings.MEAL_PLAN_CACHE_POOL_SIZE,
+        layout=diet_meal_layout(diet) if layout is None else layout,
+    )
+    cache.set(key, pool, settings.MEAL_PLAN_CACHE_TIMEOUT)
+    return random.choice(pool) if pool else None
+
+
+# ==============================================================================
+# Кэш количества рецептов в каталоге
+# ==============================================================================
+def get_cached_recipe_count(queryset, filters):
+    """
+    Возвращает количество рецептов для комбинации фильтров каталога.
+    Значение хранится в кэше до следующего изменения каталога (версия входит в ключ).
+
+    Аргументы:
+        queryset: отфильтрованный QuerySet рецептов.
+        filters (dict): значения фильтров, однозначно задающие queryset.
+    """
+    digest = hashlib.md5(json.dumps(filters, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+    key = f'recipes:recipe_count:{get_catalogue_version()}:{digest}'
+
+    cache = get_plan_cache()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.RECIPE_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+# ==============================================================================
+# Кэш страниц каталога (ETag / Last-Modified)
+# ==============================================================================
+def page_cache_key(view_name, params, version=None):
+    """Ключ кэша страницы: версия (по умолчанию версия каталога) + view + параметры запроса."""
+    if version is None:
+        version = get_catalogue_version()
+    digest = hashlib.md5(json.dumps(params, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+    return f'recipes:page:{view_name}:{version}:{digest}'
+
+
+def cached_page(request, view_name, params, render_page, version=None):
+    """
+    Отдает страницу из кэша. При промахе страница рендерится через render_page()
+    и сохраняется до следующего изменения каталога (версия входит в ключ), но не
+    дольше PAGE_CACHE_TIMEOUT секунд. Страница, которая зависит только от части
+    каталога (например, одного рецепта), передает свою версию в version - тогда
+    остальные изменения каталога ее не сбрасывают.
+
+    Ответ содержит ETag (хэш содержимого) и Last-Modified; на условные запросы
+    (If-None-Match, If-Modified-Since) при попадании в кэш отвечает 304, не обращаясь к базе.
+
+    Аргументы:
+        view_name (str): имя view (часть ключа).
+        params: параметры запроса, однозначно задающие страницу (сериализуются в JSON).
+        version: версия данных страницы вместо версии каталога.
+        render_page (callable): возвращает (HttpResponse, время изменения в секундах или None).
+            Кэшируются только ответы 200.
+    """
+    cache = get_plan_cache()
+    key = page_cache_key(view_name, params, version)
+    page = cache.get(key)
+    if page is None:
+        response, last_modified = render_page()
+        if response.status_code != 200:
+            return response
+        page = {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'etag': quote_etag(hashlib.md5(response.content).hexdigest()),
+            'last_modified': last_modified,
+        }
+        cache.set(key, page, settings.PAGE_CACHE_TIMEOUT)
+
+    response = HttpResponse(page['content'], content_type=page['content_type'])
+    response['ETag'] = page['etag']
+    if page['last_modified'] is not None:
+        response['Last-Modified'] = http_date(page['last_modified'])
+    # Браузер хранит страницу не дольше PAGE_CACHE_MAX_AGE и затем проверяет ее условным запросом.
+    patch_cache_control(response, max_age=settings.PAGE_CACHE_MAX_AGE)
+    return get_conditional_response(
+        request, etag=page['etag'], last_modified=page['last_modified'], response=response
+    )
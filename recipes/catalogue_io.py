@@ -0,0 +1,332 @@
+import csv
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import DatabaseError, connections, router, transaction
+from django.utils import timezone
+
+from .models import Diet, Ingredient, Recipe, RecipeIngredient
+
+# ==============================================================================
+# Потоковый импорт и экспорт каталога (CSV и JSON Lines)
+# ==============================================================================
+# Файлы читаются и пишутся построчно, строки сохраняются пакетами через bulk_create
+# с обновлением существующих записей, поэтому расход памяти ограничен размером пакета
+# и не зависит от размера каталога. Связи задаются естественными ключами:
+# ингредиент - по названию, рецепт - по id, диеты рецепта - по названиям.
+
+FORMATS = ('csv', 'jsonl')
+
+# Виды данных в порядке зависимостей (при импорте ингредиенты и рецепты загружаются
+# раньше, чем связи между ними) и их поля (столбцы CSV в этом же порядке).
+KINDS = ('ingredients', 'recipes', 'recipe_ingredients')
+FIELDS = {
+    'ingredients': ['name', 'calories', 'proteins', 'fats', 'carbs'],
+    'recipes': [
+        'id', 'name', 'description', 'instructions', 'cooking_time', 'servings', 'meal_type',
+        'is_simple_ingredient', 'diets', 'image',
+    ],
+    'recipe_ingredients': ['recipe', 'ingredient', 'weight_grams', 'display_amount', 'display_unit'],
+}
+
+# Разделитель названий диет в одном столбце CSV.
+LIST_SEPARATOR = '|'
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class RowError(Exception):
+    """Строка файла не прошла проверку и не будет сохранена."""
+
+
+def detect_format(path):
+    """Формат по расширению файла: .csv - CSV, .jsonl и .ndjson - JSON Lines."""
+    suffix = str(path).rsplit('.', 1)[-1].lower()
+    if suffix == 'csv':
+        return 'csv'
+    if suffix in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    raise ValueError(f"Не удалось определить формат файла {path}: ожидается .csv или .jsonl")
+
+
+# ==============================================================================
+# Чтение строк
+# ==============================================================================
+def read_rows(stream, file_format):
+    """
+    Построчно читает файл. Для каждой строки данных возвращает (номер строки, словарь или None,
+    сообщение об ошибке или None). Номера строк считаются с 1, в CSV - с учетом заголовка.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            if None in row:
+                yield reader.line_num, None, "лишние значения в строке"
+            else:
+                yield reader.line_num, row, None
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield line_number, None, f"некорректный JSON: {error}"
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None, "ожидается JSON-объект"
+            else:
+                yield line_number, row, None
+
+
+def _clean(instance, exclude=()):
+    """Проверяет и приводит значения полей модели (без запросов к базе)."""
+    try:
+        instance.clean_fields(exclude=exclude)
+    except ValidationError as error:
+        raise RowError('; '.join(
+            f"{field}: {' '.join(messages)}" for field, messages in error.message_dict.items()
+        ))
+
+
+def _values(row, fields):
+    """Значения полей из строки; отсутствующие (None) не передаются, и модель берет значения по умолчанию."""
+    return {field: row[field] for field in fields if row.get(field) is not None}
+
+
+def _parse_ingredient(row, context):
+    ingredient = Ingredient(**_values(row, FIELDS['ingredients']))
+    _clean(ingredient)
+    return ingredient
+
+
+def _parse_recipe(row, context):
+    diet_names = row.get('diets') or []
+    if isinstance(diet_names, str):
+        diet_names = [name.strip() for name in diet_names.split(LIST_SEPARATOR) if name.strip()]
+    unknown = [name for name in diet_names if name not in context['diets']]
+    if unknown:
+        raise RowError(f"diets: неизвестные диеты: {', '.join(unknown)}")
+
+    values = _values(row, [field for field in FIELDS['recipes'] if field != 'diets'])
+    # Пустые id и флаг в CSV означают "новый рецепт" и "нет".
+    values['id'] = values.get('id') or None
+    values['is_simple_ingredient'] = values.get('is_simple_ingredient') or False
+    recipe = Recipe(**values)
+    _clean(recipe, exclude=['search_vector'])
+    recipe.diet_ids = [context['diets'][name] for name in diet_names]
+    return recipe
+
+
+def _parse_recipe_ingredient(row, context):
+    item = RecipeIngredient(**_values(row, ['weight_grams', 'display_amount', 'display_unit']))
+    # Ссылки проверяются при сохранении пакета (одним запросом на пакет).
+    _clean(item, exclude=['recipe', 'ingredient'])
+    item.recipe_key = row.get('recipe')
+    item.ingredient_name = row.get('ingredient')
+    try:
+        item.recipe_key = int(item.recipe_key)
+    except (TypeError, ValueError):
+        raise RowError(f"recipe: ожидается id рецепта, получено {item.recipe_key!r}")
+    if not item.ingredient_name:
+        raise RowError("ingredient: не указано название ингредиента")
+    return item
+
+
+# ==============================================================================
+# Сохранение пакетов
+# ==============================================================================
+def _deduplicate(items, key):
+    """Оставляет последнюю строку для каждого ключа (повтор ключа в одном пакете недопустим для upsert)."""
+    unique = {}
+    for line_number, item in items:
+        unique[key(item)] = (line_number, item)
+    return list(unique.values())
+
+
+def _save_ingredients(items, context, report_error):
+    items = _deduplicate(items, lambda item: item.name)
+    Ingredient.objects.bulk_create(
+        [item for _, item in items],
+        update_conflicts=True, unique_fields=['name'], update_fields=['calories', 'proteins', 'fats', 'carbs'],
+    )
+    # КБЖУ рецептов с этими ингредиентами могло измениться - обновляем их отметку времени.
+    Recipe.objects.filter(
+        id__in=RecipeIngredient.objects.filter(ingredient__name__in=[item.name for _, item in items]).values('recipe_id')
+    ).update(updated_at=timezone.now())
+    return len(items)
+
+
+def _save_recipes(items, context, report_error):
+    with_id = _deduplicate([(line, item) for line, item in items if item.id is not None], lambda item: item.id)
+    new = [(line, item) for line, item in items if item.id is None]
+    Recipe.objects.bulk_create(
+        [item for _, item in with_id],
+        update_conflicts=True, unique_fields=['id'],
+        update_fields=[field for field in FIELDS['recipes'] if field not in ('id', 'diets')] + ['updated_at'],
+    )
+    Recipe.objects.bulk_create([item for _, item in new])
+    if with_id:
+        context['explicit_ids'] = True
+
+    recipes = [item for _, item in with_id + new]
+    Through = Recipe.diets.through
+    Through.objects.filter(recipe_id__in=[recipe.id for recipe in recipes]).delete()
+    Through.objects.bulk_create([
+        Through(recipe_id=recipe.id, diet_id=diet_id) for recipe in recipes for diet_id in recipe.diet_ids
+    ])
+    return len(recipes)
+
+
+def _save_recipe_ingredients(items, context, report_error):
+    ingredient_ids = dict(
+        Ingredient.objects.filter(name__in={item.ingredient_name for _, item in items}).values_list('name', 'id')
+    )
+    recipe_ids = set(
+        Recipe.objects.filter(id__in={item.recipe_key for _, item in items}).values_list('id', flat=True)
+    )
+    resolved = []
+    for line_number, item in items:
+        if item.recipe_key not in recipe_ids:
+            report_error(line_number, f"recipe: рецепт с id {item.recipe_key} не найден")
+        elif item.ingredient_name not in ingredient_ids:
+            report_error(line_number, f"ingredient: ингредиент {item.ingredient_name!r} не найден")
+        else:
+            item.recipe_id = item.recipe_key
+            item.ingredient_id = ingredient_ids[item.ingredient_name]
+            resolved.append((line_number, item))
+
+    resolved = _deduplicate(resolved, lambda item: (item.recipe_id, item.ingredient_id))
+    RecipeIngredient.objects.bulk_create(
+        [item for _, item in resolved],
+        update_conflicts=True, unique_fields=['recipe', 'ingredient'],
+        update_fields=['weight_grams', 'display_amount', 'display_unit'],
+    )
+    Recipe.objects.filter(id__in={item.recipe_id for _, item in resolved}).update(updated_at=timezone.now())
+    return len(resolved)
+
+
+PARSERS = {
+    'ingredients': _parse_ingredient,
+    'recipes': _parse_recipe,
+    'recipe_ingredients': _parse_recipe_ingredient,
+}
+SAVERS = {
+    'ingredients': _save_ingredients,
+    'recipes': _save_recipes,
+    'recipe_ingredients': _save_recipe_ingredients,
+}
+
+
+def import_rows(kind, rows, report_error, batch_size=DEFAULT_BATCH_SIZE, context=None):
+    """
+    Проверяет и сохраняет строки одного вида данных пакетами по batch_size.
+
+    Аргументы:
+        kind (str): вид данных, одно из KINDS.
+        rows: строки из read_rows.
+        report_error (callable): вызывается как report_error(номер строки, сообщение)
+            для каждой строки, которая не прошла проверку или не была сохранена.
+        context (dict | None): общие данные для нескольких вызовов (см. import_context).
+
+    Возвращает:
+        int: количество сохраненных строк.
+    """
+    if context is None:
+        context = import_context()
+    parse, save = PARSERS[kind], SAVERS[kind]
+    saved = 0
+    batch = []
+
+    def flush():
+        try:
+            with transaction.atomic():
+                return save(batch, context, report_error)
+        except DatabaseError as error:
+            # Пакет откатывается целиком - сообщаем об ошибке для каждой его строки.
+            for line_number, _ in batch:
+                report_error(line_number, f"ошибка сохранения пакета: {error}")
+            return 0
+
+    for line_number, row, error in rows:
+        if error is None:
+            try:
+                batch.append((line_number, parse(row, context)))
+            except RowError as row_error:
+                error = str(row_error)
+        if error is not None:
+            report_error(line_number, error)
+        if len(batch) >= batch_size:
+            saved += flush()
+            batch = []
+    if batch:
+        saved += flush()
+    return saved
+
+
+def import_context():
+    """Общие данные импорта: диеты по названиям."""
+    return {'diets': dict(Diet.objects.values_list('name', 'id')), 'explicit_ids': False}
+
+
+def finish_import(context):
+    """
+    После загрузки рецептов с явными id переводит счетчик первичных ключей
+    (в PostgreSQL - последовательность), чтобы новые рецепты не получили занятые id.
+    Счетчик переводится в основной базе, а не в реплике.
+    """
+    if not context['explicit_ids']:
+        return
+    connection = connections[router.db_for_write(Recipe)]
+    statements = connection.ops.sequence_reset_sql(no_style(), [Recipe])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+# ==============================================================================
+# Экспорт
+# ==============================================================================
+def export_rows(kind, batch_size=DEFAULT_BATCH_SIZE):
+    """Строки каталога одного вида данных (словари с полями FIELDS[kind]), читаются из базы частями."""
+    if kind == 'ingredients':
+        yield from Ingredient.objects.order_by('id').values(*FIELDS['ingredients']).iterator(chunk_size=batch_size)
+    elif kind == 'recipes':
+        diet_names = dict(Diet.objects.values_list('id', 'name'))
+        recipes = Recipe.objects.order_by('id').prefetch_related('diets').iterator(chunk_size=batch_size)
+        for recipe in recipes:
+            row = {field: getattr(recipe, field) for field in FIELDS['recipes'] if field not in ('diets', 'image')}
+            row['diets'] = [diet_names[diet.id] for diet in recipe.diets.all()]
+            row['image'] = recipe.image.name or ''
+            yield row
+    elif kind == 'recipe_ingredients':
+        rows = (
+            RecipeIngredient.objects.order_by('recipe_id', 'id')
+            .values_list('recipe_id', 'ingredient__name', 'weight_grams', 'display_amount', 'display_unit')
+            .iterator(chunk_size=batch_size)
+        )
+        for values in rows:
+            yield dict(zip(FIELDS['recipe_ingredients'], values))
+    else:
+        raise ValueError(f"Неизвестный вид данных: {kind}")
+
+
+def write_rows(stream, kind, rows, file_format):
+    """Записывает строки в файл построчно. Возвращает количество записанных строк."""
+    count = 0
+    if file_format == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=FIELDS[kind])
+        writer.writeheader()
+        for row in rows:
+            if isinstance(row.get('diets'), list):
+                row['diets'] = LIST_SEPARATOR.join(row['diets'])
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(row, ensure_ascii=False, default=str))
+            stream.write('\n')
+            count += 1
+    return count
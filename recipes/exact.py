@@ -0,0 +1,170 @@
+import time
+from bisect import bisect_left
+
+from .fixedpoint import SCALE
+from .generator import (
+    DEFAULT_MEAL_LAYOUT, MAX_SERVINGS, MEAL_BALANCE_PENALTY, same_type_slots, search_meal_plan_random,
+)
+
+# Время (в секундах), после которого точный поиск останавливается и возвращает лучший найденный план.
+EXACT_SEARCH_TIME_BUDGET = 2.0
+
+# Как часто (в просмотренных вариантах) проверяется бюджет времени.
+TIME_CHECK_INTERVAL = 1024
+
+
+class _SearchTimeout(Exception):
+    """Внутренний сигнал об исчерпании бюджета времени."""
+
+
+def _build_options(recipes_with_nutrition, max_servings):
+    """
+    Разворачивает рецепты приема пищи в варианты (рецепт, порции), отсортированные по калорийности.
+    Каждый вариант - кортеж (калории, белки, жиры, углеводы, индекс рецепта, порции).
+    """
+    options = []
+    for index, data in enumerate(recipes_with_nutrition):
+        calories, proteins, fats, carbs = (value / SCALE for value in data['values'])
+        for servings in range(1, max_servings + 1):
+            options.append((calories * servings, proteins * servings, fats * servings, carbs * servings, index, servings))
+    # Сортировка по калориям, при равенстве - по рецепту и порциям: результат не зависит от случая.
+    options.sort(key=lambda option: (option[0], option[4], option[5]))
+    return options
+
+
+def search_meal_plan_exact(candidates, target_calories, nutrition_targets,
+                           max_servings=MAX_SERVINGS, time_budget=EXACT_SEARCH_TIME_BUDGET, rng=None,
+                           layout=DEFAULT_MEAL_LAYOUT):
+    """
+    Точный поиск плана питания методом ветвей и границ.
+
+    Перебирает варианты (рецепт, порции от 1 до max_servings) для каждого слота layout и
+    находит план с минимальным штрафом при соблюдении ограничений по БЖУ. Формула штрафа
+    та же, что и в generator.search_meal_plan_random.
+
+    Отсечения:
+    - нижняя оценка штрафа: для еще не выбранных приемов пищи калорийность считается
+      непрерывной, и минимум квадратичного штрафа берется в явном виде;
+    - варианты каждого приема пищи отсортированы по калориям, поэтому перебор идет от
+      наилучшей калорийности "в обе стороны" и прекращается, как только оценка
+      становится не лучше уже найденного плана;
+    - ветка отбрасывается, если даже максимальные (минимальные) значения БЖУ оставшихся
+      приемов пищи не позволяют выполнить ограничения.
+
+    Слоты одного типа (перекусы) получают разные рецепты, если рецептов этого типа хватает.
+
+    Результат детерминирован. Если поиск не уложился в time_budget секунд, возвращается
+    лучший найденный к этому моменту план, а если такого нет - результат случайного поиска.
+
+    Возвращает:
+        dict | None: план в формате find_best_meal_plan (без финальной проверки отклонения).
+    """
+    slot_count = len(layout)
+    options = [_build_options(candidates[meal_type], max_servings) for _, meal_type, _ in layout]
+    calories_index = [[option[0] for option in slot_options] for slot_options in options]
+
+    target = float(target_calories)
+    penalty = float(MEAL_BALANCE_PENALTY)
+    ideals = [target * percent / 100 for _, _, percent in layout]
+    min_proteins = float(nutrition_targets['proteins'])
+    min_fats = float(nutrition_targets['fats'])
+    carbs_limit = float(nutrition_targets['carbs'])
+    carb_constraint_type = nutrition_targets['carb_constraint_type']
+
+    # Суммы "идеальных" калорий и предельных значений БЖУ для приемов пищи после текущего.
+    rest_ideal = [sum(ideals[depth + 1:]) for depth in range(slot_count)]
+    rest_max_proteins = [sum(max(o[1] for o in opts) for opts in options[depth + 1:]) for depth in range(slot_count)]
+    rest_max_fats = [sum(max(o[2] for o in opts) for opts in options[depth + 1:]) for depth in range(slot_count)]
+    rest_max_carbs = [sum(max(o[3] for o in opts) for opts in options[depth + 1:]) for depth in range(slot_count)]
+    rest_min_carbs = [sum(min(o[3] for o in opts) for opts in options[depth + 1:]) for depth in range(slot_count)]
+
+    # Слоты того же типа, что и предыдущие (перекусы), не повторяют их рецепты, если рецептов хватает.
+    earlier_slots = {
+        depth: others for depth, others in same_type_slots(layout).items()
+        if len(candidates[layout[depth][1]]) > len(others)
+    }
+
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    state = {'best_score': float('inf'), 'best_choice': None, 'visited': 0}
+    chosen = [None] * slot_count
+
+    def is_feasible(depth, proteins, fats, carbs):
+        if proteins + rest_max_proteins[depth] < min_proteins:
+            return False
+        if fats + rest_max_fats[depth] < min_fats:
+            return False
+        if carb_constraint_type == 'AT_MOST' and carbs + rest_min_carbs[depth] > carbs_limit:
+            return False
+        if carb_constraint_type == 'AT_LEAST' and carbs + rest_max_carbs[depth] < carbs_limit:
+            return False
+        return True
+
+    def visit(depth, calories, proteins, fats, carbs, balance):
+        slot_options = options[depth]
+        remaining = slot_count - depth - 1
+        ideal = ideals[depth]
+        # Вес отклонения по общим калориям в нижней оценке (см. docstring):
+        # при оставшихся m приемах пищи минимум равен D^2 * P / (m + P).
+        weight = penalty / (remaining + penalty) if remaining else 1.0
+        offset = calories + rest_ideal[depth] - target
+
+        def bound(option_calories):
+            return balance + penalty * (option_calories - ideal) ** 2 + weight * (offset + option_calories) ** 2
+
+        # Калорийность варианта, при которой оценка минимальна (вершина параболы).
+        best_calories = (penalty * ideal - weight * offset) / (penalty + weight)
+        high = bisect_left(calories_index[depth], best_calories)
+        low = high - 1
+
+        while low >= 0 or high < len(slot_options):
+            low_bound = bound(slot_options[low][0]) if low >= 0 else float('inf')
+            high_bound = bound(slot_options[high][0]) if high < len(slot_options) else float('inf')
+            if low_bound <= high_bound:
+                option, option_bound = slot_options[low], low_bound
+                low -= 1
+            else:
+                option, option_bound = slot_options[high], high_bound
+                high += 1
+
+            # Оценка растет по мере удаления от вершины - дальше лучше не будет.
+            if option_bound >= state['best_score']:
+                return
+
+            state['visited'] += 1
+            if deadline is not None and state['visited'] % TIME_CHECK_INTERVAL == 0 and time.monotonic() > deadline:
+                raise _SearchTimeout
+
+            if depth in earlier_slots and any(chosen[other][4] == option[4] for other in earlier_slots[depth]):
+                continue
+
+            new_proteins = proteins + option[1]
+            new_fats = fats + option[2]
+            new_carbs = carbs + option[3]
+            if not is_feasible(depth, new_proteins, new_fats, new_carbs):
+                continue
+
+            chosen[depth] = option
+            if remaining:
+                visit(depth + 1, calories + option[0], new_proteins, new_fats, new_carbs,
+                      balance + penalty * (option[0] - ideal) ** 2)
+            else:
+                # Для последнего приема пищи оценка совпадает с итоговым штрафом.
+                state['best_score'] = option_bound
+                state['best_choice'] = list(chosen)
+
+    try:
+        visit(0, 0.0, 0.0, 0.0, 0.0, 0.0)
+    except _SearchTimeout:
+        if state['best_choice'] is None:
+            return search_meal_plan_random(candidates, target_calories, nutrition_targets, rng=rng, layout=layout)
+
+    if state['best_choice'] is None:
+        return None
+
+    return {
+        slot: {
+            'recipe_data': candidates[meal_type][option[4]],
+            'servings': option[5],
+        }
+        for (slot, meal_type, _), option in zip(layout, state['best_choice'])
+    }
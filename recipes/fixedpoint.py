@@ -0,0 +1,55 @@
+from decimal import Decimal
+
+# ==============================================================================
+# Целочисленное (с фиксированной точкой) представление КБЖУ
+# ==============================================================================
+# КБЖУ ингредиентов (на 100 г) и рецептов (на порцию) хранятся в базе с 2 знаками
+# после запятой, поэтому в расчетах они представлены целым числом сотых долей
+# (12.34 -> 1234). Сложение, умножение на вес или порции и сравнение целых чисел
+# точны и в разы быстрее операций с Decimal. В Decimal значения переводятся только
+# на границе: при сохранении в базу и выводе пользователю.
+
+# Количество знаков после запятой для значений на 100 г и на порцию (сотые доли).
+DIGITS = 2
+SCALE = 10 ** DIGITS
+
+# Суммы рецепта: значение на 100 г (в сотых) x вес в граммах дает сумму
+# в десятитысячных долях без деления на 100.
+TOTALS_DIGITS = 4
+TOTALS_SCALE = 10 ** TOTALS_DIGITS
+
+# Порядок показателей в кортежах значений.
+NUTRIENTS = ('calories', 'proteins', 'fats', 'carbs')
+
+
+def to_fixed(value, digits=DIGITS):
+    """
+    Переводит число (Decimal, int или строку) в целое число долей 10^-digits.
+    Лишние знаки округляются по правилу банковского округления, как и round() для Decimal.
+    """
+    return int(Decimal(value).scaleb(digits).to_integral_value())
+
+
+def from_fixed(value, digits=DIGITS):
+    """Переводит целое число долей 10^-digits обратно в Decimal (для базы и шаблонов)."""
+    return Decimal(value).scaleb(-digits)
+
+
+def divide_round(numerator, denominator):
+    """
+    Целочисленное деление с банковским округлением (ROUND_HALF_EVEN) -
+    то же правило, что и round(Decimal, 2) в прежних расчетах.
+    """
+    quotient, remainder = divmod(numerator, denominator)
+    doubled = remainder * 2
+    if doubled > denominator or (doubled == denominator and quotient % 2):
+        quotient += 1
+    return quotient
+
+
+def per_serving_values(nutrition):
+    """
+    Кортеж КБЖУ на порцию (калории, белки, жиры, углеводы) в сотых долях
+    из словаря в формате utils.calculate_recipe_nutrition.
+    """
+    return tuple(to_fixed(nutrition[f'{name}_per_serving']) for name in NUTRIENTS)
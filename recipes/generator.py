@@ -1,8 +1,12 @@
 import random
 from decimal import Decimal
-from .utils import calculate_recipe_nutrition
+from .fixedpoint import SCALE, from_fixed, per_serving_values, to_fixed
+from .models import Diet
+from .timing import timed
+from .utils import get_recipe_nutrition
 
-# Задаем "идеальные" пропорции калорий для каждого приема пищи.
+# Задаем "идеальные" пропорции калорий для каждого приема пищи (по умолчанию;
+# для диеты они задаются полями *_percent модели Diet, см. diet_meal_layout).
 # Используется для расчета штрафа за дисбаланс в плане питания.
 IDEAL_MEAL_DISTRIBUTION = {
     'BREAKFAST': Decimal('0.30'),
@@ -10,125 +14,516 @@ IDEAL_MEAL_DISTRIBUTION = {
     'DINNER': Decimal('0.30'),
 }
 
-def find_best_meal_plan(possible_recipes, target_calories, nutrition_targets):
+# Основные приемы пищи в плане (ключи результата find_best_meal_plan).
+MEAL_SLOTS = ('breakfast', 'lunch', 'dinner')
+
+# Перекусы: тип рецептов для них и основные приемы пищи, после которых
+# идут 1-й, 2-й и 3-й перекус (слоты 'snack_1', 'snack_2', ... по порядку в течение дня).
+# Наибольшее количество перекусов задано в модели (Diet.MAX_SNACKS).
+SNACK = 'snack'
+SNACK_POSITIONS = ('lunch', 'breakfast', 'dinner')
+
+# Типы рецептов - ключи словаря кандидатов (см. prepare_meal_candidates).
+MEAL_TYPES = MEAL_SLOTS + (SNACK,)
+
+# Коэффициент штрафа за отклонение калорийности приема пищи от "идеальной".
+MEAL_BALANCE_PENALTY = Decimal('0.3')
+
+# Максимально допустимое отклонение итоговой калорийности плана от цели.
+MAX_CALORIES_DEVIATION = Decimal('0.25')
+
+# Доступные алгоритмы поиска плана.
+ENGINE_RANDOM = 'random'            # Случайный поиск с итерационной подгонкой порций (по умолчанию).
+ENGINE_VECTORIZED = 'vectorized'    # Пакетная оценка комбинаций на NumPy (см. vectorized.py).
+ENGINE_EXACT = 'exact'              # Детерминированный метод ветвей и границ (см. exact.py).
+ENGINE_PARALLEL = 'parallel'        # Случайный поиск с перезапусками в нескольких процессах (см. parallel.py).
+ENGINES = (ENGINE_RANDOM, ENGINE_VECTORIZED, ENGINE_EXACT, ENGINE_PARALLEL)
+
+# Количество попыток случайного поиска за один запуск.
+RANDOM_SEARCH_ATTEMPTS = 300
+
+# Максимальное число порций блюда, которое подбирают алгоритмы поиска при отборе кандидатов.
+MAX_SERVINGS = 4
+
+# Допустимое отклонение калорийности блюда (при лучшем числе порций) от "идеальной"
+# для слота: рецепты за этими пределами не участвуют в случайном поиске (см. prune_slot_candidates).
+SLOT_CALORIES_TOLERANCE = Decimal('0.5')
+
+# Целочисленные версии коэффициентов для расчетов в сотых долях (см. fixedpoint.py):
+# доли калорийности приемов пищи в процентах, штраф и допустимое отклонение - дробями.
+IDEAL_MEAL_PERCENT = {meal: to_fixed(share) for meal, share in IDEAL_MEAL_DISTRIBUTION.items()}
+PENALTY_NUMERATOR, PENALTY_DENOMINATOR = MEAL_BALANCE_PENALTY.as_integer_ratio()
+DEVIATION_NUMERATOR, DEVIATION_DENOMINATOR = MAX_CALORIES_DEVIATION.as_integer_ratio()
+TOLERANCE_NUMERATOR, TOLERANCE_DENOMINATOR = SLOT_CALORIES_TOLERANCE.as_integer_ratio()
+
+# Во сколько раз целочисленный штраф score_meal_plan больше штрафа в ккал^2:
+# калории в сотых (SCALE^2), идеальные калории в процентах (еще SCALE^2)
+# и знаменатель коэффициента MEAL_BALANCE_PENALTY.
+SCORE_SCALE = SCALE ** 4 * PENALTY_DENOMINATOR
+
+
+# ==============================================================================
+# Слоты плана питания
+# ==============================================================================
+def build_meal_layout(breakfast=IDEAL_MEAL_PERCENT['BREAKFAST'], lunch=IDEAL_MEAL_PERCENT['LUNCH'],
+                      dinner=IDEAL_MEAL_PERCENT['DINNER'], snacks=0, snack=0):
+    """
+    Слоты плана питания в порядке приемов пищи в течение дня.
+
+    Аргументы:
+        breakfast, lunch, dinner (int): доли калорий основных приемов пищи, в процентах.
+        snacks (int): количество перекусов (от 0 до Diet.MAX_SNACKS).
+        snack (int): доля калорий каждого перекуса, в процентах.
+
+    Возвращает:
+        tuple: ((слот, тип рецептов, доля в процентах), ...), например
+        (('breakfast', 'breakfast', 25), ('lunch', 'lunch', 35), ('snack_1', 'snack', 10), ...).
+    """
+    if not 0 <= snacks <= Diet.MAX_SNACKS:
+        raise ValueError(f"Количество перекусов должно быть от 0 до {Diet.MAX_SNACKS}")
+    if breakfast + lunch + dinner + snacks * snack != 100:
+        raise ValueError("Сумма долей калорий по приемам пищи должна быть равна 100%")
+
+    snacks_after = SNACK_POSITIONS[:snacks]
+    layout = []
+    snack_number = 0
+    for meal_type, percent in zip(MEAL_SLOTS, (breakfast, lunch, dinner)):
+        layout.append((meal_type, meal_type, percent))
+        if meal_type in snacks_after:
+            snack_number += 1
+            layout.append((f'{SNACK}_{snack_number}', SNACK, snack))
+    return tuple(layout)
+
+
+# Слоты по умолчанию: завтрак, обед и ужин без перекусов.
+DEFAULT_MEAL_LAYOUT = build_meal_layout()
+
+
+def diet_meal_layout(diet):
+    """Слоты плана питания по настройкам диеты (поля *_percent и snack_count модели Diet)."""
+    return build_meal_layout(
+        diet.breakfast_percent, diet.lunch_percent, diet.dinner_percent, diet.snack_count, diet.snack_percent
+    )
+
+
+def layout_meal_types(layout):
+    """Типы рецептов, нужные для слотов layout (без повторов, в порядке слотов)."""
+    return tuple(dict.fromkeys(meal_type for _, meal_type, _ in layout))
+
+
+def meal_type_slot_counts(layout):
+    """Количество слотов layout для каждого типа рецептов (например, {'snack': 2, ...})."""
+    counts = {}
+    for _, meal_type, _ in layout:
+        counts[meal_type] = counts.get(meal_type, 0) + 1
+    return counts
+
+
+def same_type_slots(layout):
+    """
+    Слоты, у которых есть предыдущие слоты с тем же типом рецептов (2-й и 3-й перекус):
+    {индекс слота: (индексы предыдущих слотов того же типа)}. В один день такие слоты
+    должны получать разные рецепты, если рецептов этого типа хватает.
+    """
+    earlier = {}
+    result = {}
+    for index, (_, meal_type, _) in enumerate(layout):
+        previous = earlier.setdefault(meal_type, [])
+        if previous:
+            result[index] = tuple(previous)
+        previous.append(index)
+    return result
+
+
+def prune_slot_candidates(recipes_with_nutrition, ideal_calories, max_servings=MAX_SERVINGS, min_count=1):
+    """
+    Отбирает кандидатов для слота и подбирает для каждого число порций (от 1 до
+    max_servings), при котором калорийность ближе всего к "идеальной" для слота
+    (ideal_calories - в сотых долях x 100, как в search_meal_plan_random).
+
+    Остаются рецепты, отклоняющиеся от идеала не больше чем на SLOT_CALORIES_TOLERANCE;
+    если таких меньше min_count (для перекусов - число слотов, которым нужны разные
+    рецепты), возвращаются все рецепты.
+
+    Возвращает:
+        list: [(кандидат, порции), ...].
+    """
+    suitable, everything = [], []
+    for data in recipes_with_nutrition:
+        calories = data['values'][0] * SCALE
+        servings = min(max((2 * ideal_calories + calories) // (2 * calories), 1), max_servings) if calories > 0 else 1
+        option = (data, servings)
+        everything.append(option)
+        if abs(calories * servings - ideal_calories) * TOLERANCE_DENOMINATOR <= ideal_calories * TOLERANCE_NUMERATOR:
+            suitable.append(option)
+    return suitable if len(suitable) >= min_count else everything
+
+
+def prepare_meal_candidates(possible_recipes):
+    """
+    Рассчитывает КБЖУ рецептов и распределяет их по "корзинам" приемов пищи.
+
+    Возвращает:
+        dict: {'breakfast': [...], 'lunch': [...], 'dinner': [...], 'snack': [...]}, где каждый элемент -
+        словарь {'recipe': Recipe, 'nutrition': dict, 'values': tuple}. 'nutrition' - КБЖУ
+        в Decimal для вывода, 'values' - те же значения на порцию в сотых долях
+        (калории, белки, жиры, углеводы), с которыми работает генератор.
+        Рецепты с нулевой калорийностью исключаются.
+    """
+    candidates = {meal_type: [] for meal_type in MEAL_TYPES}
+    with timed('nutrition'):
+        for recipe in possible_recipes:
+            bucket = candidates.get(recipe.meal_type.lower())
+            if bucket is None:
+                continue
+            # КБЖУ берется из заранее рассчитанной таблицы RecipeNutrition.
+            nutrition_info = get_recipe_nutrition(recipe)
+            # Исключаем рецепты с нулевой калорийностью
+            if nutrition_info['calories_per_serving'] > 0:
+                bucket.append({
+                    'recipe': recipe, 'nutrition': nutrition_info, 'values': per_serving_values(nutrition_info),
+                })
+    return candidates
+
+
+def resolve_candidates(possible_recipes):
+    """
+    Возвращает кандидатов для поиска: рецепты (QuerySet или список) подготавливаются
+    через prepare_meal_candidates, уже готовые кандидаты (словарь по приемам пищи,
+    например из снимка каталога snapshot.get_diet_candidates) возвращаются как есть.
+    """
+    if isinstance(possible_recipes, dict):
+        return possible_recipes
+    return prepare_meal_candidates(possible_recipes)
+
+
+def is_plan_acceptable(meal_plan, target_calories):
+    """
+    Финальная проверка на адекватность: отклонение итоговой калорийности
+    от цели не должно превышать MAX_CALORIES_DEVIATION.
+    """
+    target = to_fixed(target_calories)
+    final_calories = sum(v['recipe_data']['values'][0] * v['servings'] for v in meal_plan.values())
+    if final_calories > 0:
+        if abs(final_calories - target) * DEVIATION_DENOMINATOR > target * DEVIATION_NUMERATOR:
+            return False
+    return True
+
+
+def plan_totals_fixed(meal_plan):
+    """Суммарное КБЖУ плана с учетом количества порций: список [калории, белки, жиры, углеводы] в сотых долях."""
+    totals = [0, 0, 0, 0]
+    for data in meal_plan.values():
+        values = data['recipe_data']['values']
+        servings = data['servings']
+        for index in range(4):
+            totals[index] += values[index] * servings
+    return totals
+
+
+def plan_totals(meal_plan):
+    """Суммарное КБЖУ плана с учетом количества порций (в Decimal, для вывода)."""
+    calories, proteins, fats, carbs = plan_totals_fixed(meal_plan)
+    return {
+        'calories': from_fixed(calories),
+        'proteins': from_fixed(proteins),
+        'fats': from_fixed(fats),
+        'carbs': from_fixed(carbs),
+    }
+
+
+def fixed_targets(nutrition_targets):
+    """Пороги БЖУ в сотых долях: (белки, жиры, углеводы, тип ограничения углеводов)."""
+    return (
+        to_fixed(nutrition_targets['proteins']),
+        to_fixed(nutrition_targets['fats']),
+        to_fixed(nutrition_targets['carbs']),
+        nutrition_targets['carb_constraint_type'],
+    )
+
+
+def meets_fixed_targets(proteins, fats, carbs, targets):
+    """Проверяет суммы БЖУ (в сотых долях) по порогам из fixed_targets."""
+    min_proteins, min_fats, carbs_limit, carb_constraint_type = targets
+    if proteins < min_proteins or fats < min_fats:
+        return False
+    if carb_constraint_type == 'AT_MOST' and carbs > carbs_limit:
+        return False
+    if carb_constraint_type == 'AT_LEAST' and carbs < carbs_limit:
+        return False
+    return True
+
+
+def plan_meets_targets(meal_plan, nutrition_targets):
+    """Проверяет, соответствует ли план жестким ограничениям по БЖУ."""
+    _, proteins, fats, carbs = plan_totals_fixed(meal_plan)
+    return meets_fixed_targets(proteins, fats, carbs, fixed_targets(nutrition_targets))
+
+
+def score_meal_plan(meal_plan, target_calories, layout=DEFAULT_MEAL_LAYOUT):
+    """
+    "Оценка" (штраф) плана: (отклонение по общим калориям)^2 + (штрафы за дисбаланс по приемам пищи).
+    Чем меньше, тем лучше. "Идеальные" доли калорий берутся из слотов layout.
+
+    Считается точно в целых числах и возвращается в единицах, в SCORE_SCALE раз меньших
+    ккал^2 (порядок планов тот же, что и у штрафа в ккал^2).
+    """
+    target = to_fixed(target_calories)
+    percents = {slot: percent for slot, _, percent in layout}
+    total_calories = plan_totals_fixed(meal_plan)[0]
+    score = (total_calories - target) ** 2 * SCALE ** 2 * PENALTY_DENOMINATOR
+    for slot, data in meal_plan.items():
+        # Калории приема пищи и "идеальные" калории, обе величины в сотых долях x 100.
+        current_meal_calories = data['recipe_data']['values'][0] * data['servings'] * SCALE
+        ideal_meal_calories = target * percents[slot]
+        score += (current_meal_calories - ideal_meal_calories) ** 2 * PENALTY_NUMERATOR
+    return score
+
+
+def make_rng(rng=None, seed=None):
+    """
+    Генератор случайных чисел для поиска: переданный rng, новый random.Random(seed)
+    для воспроизводимого результата или None (тогда используется модуль random).
+    """
+    if rng is None and seed is not None:
+        return random.Random(seed)
+    return rng
+
+
+def find_best_meal_plan(possible_recipes, target_calories, nutrition_targets, engine=ENGINE_RANDOM, rng=None, seed=None,
+                        layout=DEFAULT_MEAL_LAYOUT):
     """
     Подбирает наилучший план питания из доступных рецептов.
-    
-    Алгоритм использует метод случайного поиска с итерационной подгонкой:
-    1. На каждой итерации создается случайный базовый план.
+
+    Аргументы:
+        possible_recipes: рецепты (QuerySet или список), подходящие под выбранную диету,
+            или готовые кандидаты (см. resolve_candidates).
+        target_calories (int): целевая калорийность на день.
+        nutrition_targets (dict): пороги БЖУ ('proteins', 'fats', 'carbs', 'carb_constraint_type').
+        engine (str): алгоритм поиска, одно из значений ENGINES.
+        rng (random.Random | None): генератор случайных чисел; при None используется
+            модуль random (общий для всех потоков).
+        seed (int | None): зерно для воспроизводимого результата (если rng не передан):
+            при одинаковых рецептах, параметрах и seed план всегда один и тот же.
+        layout (tuple): слоты плана и доли калорий (см. build_meal_layout, diet_meal_layout).
+
+    Возвращает:
+        dict | None: {'breakfast': {'recipe_data': ..., 'servings': int}, 'lunch': ..., 'dinner': ...}
+        (ключи - слоты layout) или None, если подходящий план составить не удалось.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Неизвестный алгоритм генерации: {engine}")
+
+    candidates = resolve_candidates(possible_recipes)
+    return search_meal_plan(candidates, target_calories, nutrition_targets, engine, rng=make_rng(rng, seed), layout=layout)
+
+
+def find_meal_plans_for_days(possible_recipes, target_calories, nutrition_targets, days, engine=ENGINE_RANDOM,
+                             rng=None, seed=None, layout=DEFAULT_MEAL_LAYOUT):
+    """
+    Подбирает планы питания сразу на несколько дней.
+
+    Кандидаты (КБЖУ рецептов) подготавливаются один раз и используются для всех дней.
+    Чтобы меню не повторялось, рецепты, уже попавшие в план, исключаются из кандидатов
+    на следующие дни; когда рецепты для приема пищи заканчиваются, их список начинается
+    заново. Если без повторов составить план на день не удается, допускаются повторы.
+    Слоты одного типа в один день (перекусы) получают разные рецепты (см. same_type_slots).
+
+    rng, seed и layout - как в find_best_meal_plan.
+
+    Возвращает:
+        list: планы в формате find_best_meal_plan на каждый день (None - если для дня
+        подходящий план составить не удалось).
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Неизвестный алгоритм генерации: {engine}")
+
+    rng = make_rng(rng, seed)
+    candidates = resolve_candidates(possible_recipes)
+    slot_meal_types = {slot: meal_type for slot, meal_type, _ in layout}
+    slot_counts = meal_type_slot_counts(layout)
+    used_recipes = {meal_type: set() for meal_type in candidates}
+    plans = []
+
+    for _ in range(days):
+        day_candidates = {}
+        for meal_type, recipes_data in candidates.items():
+            fresh = [r for r in recipes_data if r['recipe'].pk not in used_recipes[meal_type]]
+            if len(fresh) < slot_counts.get(meal_type, 1):
+                # Неиспользованных рецептов не хватает на все слоты этого типа за день
+                # (для перекусов их нужно несколько разных) - начинаем цикл заново.
+                used_recipes[meal_type].clear()
+                fresh = recipes_data
+            day_candidates[meal_type] = fresh
+
+        meal_plan = search_meal_plan(day_candidates, target_calories, nutrition_targets, engine, rng=rng, layout=layout)
+        if meal_plan is None and day_candidates != candidates:
+            meal_plan = search_meal_plan(candidates, target_calories, nutrition_targets, engine, rng=rng, layout=layout)
+
+        if meal_plan is not None:
+            for slot, data in meal_plan.items():
+                used_recipes[slot_meal_types[slot]].add(data['recipe_data']['recipe'].pk)
+        plans.append(meal_plan)
+
+    return plans
+
+
+def sum_plans_totals(meal_plans):
+    """Суммарное КБЖУ нескольких планов (дни без плана пропускаются)."""
+    totals = [0, 0, 0, 0]
+    for meal_plan in meal_plans:
+        if meal_plan is None:
+            continue
+        for index, value in enumerate(plan_totals_fixed(meal_plan)):
+            totals[index] += value
+    calories, proteins, fats, carbs = totals
+    return {
+        'calories': from_fixed(calories),
+        'proteins': from_fixed(proteins),
+        'fats': from_fixed(fats),
+        'carbs': from_fixed(carbs),
+    }
+
+
+def search_meal_plan(candidates, target_calories, nutrition_targets, engine=ENGINE_RANDOM, rng=None,
+                     layout=DEFAULT_MEAL_LAYOUT):
+    """
+    Запускает выбранный алгоритм поиска на уже подготовленных кандидатах
+    (результат prepare_meal_candidates) для слотов layout и проверяет итоговый план на адекватность.
+    Позволяет переиспользовать кандидатов между несколькими запусками.
+    """
+    # Если для какого-то из слотов нет рецептов, составить план невозможно.
+    if not all(candidates.get(meal_type) for meal_type in layout_meal_types(layout)):
+        return None
+
+    if engine not in ENGINES:
+        raise ValueError(f"Неизвестный алгоритм генерации: {engine}")
+
+    with timed(f'search_{engine}'):
+        if engine == ENGINE_VECTORIZED:
+            from .vectorized import search_meal_plan_vectorized
+            best_combination = search_meal_plan_vectorized(
+                candidates, target_calories, nutrition_targets, rng=rng, layout=layout
+            )
+        elif engine == ENGINE_EXACT:
+            from .exact import search_meal_plan_exact
+            best_combination = search_meal_plan_exact(
+                candidates, target_calories, nutrition_targets, rng=rng, layout=layout
+            )
+        elif engine == ENGINE_PARALLEL:
+            from .parallel import search_meal_plan_parallel
+            best_combination = search_meal_plan_parallel(
+                candidates, target_calories, nutrition_targets, rng=rng, layout=layout
+            )
+        else:
+            best_combination = search_meal_plan_random(
+                candidates, target_calories, nutrition_targets, rng=rng, layout=layout
+            )
+
+    if best_combination and not is_plan_acceptable(best_combination, target_calories):
+        # Если отклонение от цели слишком большое, считаем, что подходящего плана нет.
+        return None
+    return best_combination
+
+
+def search_meal_plan_random(candidates, target_calories, nutrition_targets, rng=None,
+                            number_of_attempts=RANDOM_SEARCH_ATTEMPTS, layout=DEFAULT_MEAL_LAYOUT):
+    """
+    Случайный поиск с итерационной подгонкой:
+    1. На каждой итерации создается случайный базовый план: для каждого слота layout
+       выбирается рецепт из отобранных для слота кандидатов (см. prune_slot_candidates)
+       с подходящим для слота числом порций.
     2. Количество порций в плане итерационно корректируется для приближения к целевой калорийности.
     3. Рассчитывается "штраф" (score) комбинации, учитывающий отклонение от цели по калориям и БЖУ.
-    4. После множества попыток выбирается комбинация с наименьшим штрафом.
+    4. После множества попыток (number_of_attempts) выбирается комбинация с наименьшим штрафом.
     """
-    
-    # 1. Подготовка данных
-    #---------------------------------------------------------------------------
-    all_recipes_with_nutrition = []
-    for recipe in possible_recipes:
-        nutrition_info = calculate_recipe_nutrition(recipe)
-        # Исключаем рецепты с нулевой калорийностью
-        if nutrition_info['calories_per_serving'] > 0:
-            all_recipes_with_nutrition.append({'recipe': recipe, 'nutrition': nutrition_info})
-
-    # Распределяем рецепты по "корзинам" для каждого приема пищи.        
-    breakfasts = [r for r in all_recipes_with_nutrition if r['recipe'].meal_type == 'BREAKFAST']
-    lunches = [r for r in all_recipes_with_nutrition if r['recipe'].meal_type == 'LUNCH']
-    dinners = [r for r in all_recipes_with_nutrition if r['recipe'].meal_type == 'DINNER']
-
-    # Если для какого-то приема пищи нет рецептов, составить план невозможно.
-    if not breakfasts or not lunches or not dinners:
-        return None
+    if rng is None:
+        rng = random
 
     # 2. Инициализация для поиска лучшего решения
     #---------------------------------------------------------------------------
+    # Все расчеты ведутся в целых числах (сотые доли, см. fixedpoint.py).
     best_combination = None
     best_score = float('inf') 
-    target_calories_decimal = Decimal(target_calories)
-    number_of_attempts = 300 # Количество попыток найти лучший план.
+    target = to_fixed(target_calories)
+    targets = fixed_targets(nutrition_targets)
+    # "Идеальные" калории приемов пищи - в сотых долях x 100, чтобы остаться в целых числах.
+    ideal_calories = {slot: target * percent for slot, _, percent in layout}
+    # Отбор кандидатов для каждого слота: случайный выбор идет только среди рецептов,
+    # которые подходят слоту по калорийности, а не по всему произведению списков.
+    slot_counts = meal_type_slot_counts(layout)
+    slot_options = {
+        slot: prune_slot_candidates(candidates[meal_type], ideal_calories[slot], min_count=slot_counts[meal_type])
+        for slot, meal_type, _ in layout
+    }
+    # Предыдущие слоты того же типа (перекусы): их рецепты не повторяются в этом слоте.
+    slot_names = [slot for slot, _, _ in layout]
+    earlier_slots = {
+        slot_names[index]: [slot_names[other] for other in others] for index, others in same_type_slots(layout).items()
+    }
 
     # Шаг 3: Основной цикл поиска.
     #---------------------------------------------------------------------------
     for _ in range(number_of_attempts):
         
-        # 3.1. Выбираем случайную базовую комбинацию из трех блюд.
-        base_plan_data = {
-            'breakfast': random.choice(breakfasts),
-            'lunch': random.choice(lunches),
-            'dinner': random.choice(dinners)
-        }
-        
-        # Инициализируем порции
-        servings = {'breakfast': 1, 'lunch': 1, 'dinner': 1}
+        # 3.1. Выбираем случайную базовую комбинацию блюд (по одному на слот)
+        # и начальное количество порций.
+        base_plan_data = {}
+        servings = {}
+        for slot, options in slot_options.items():
+            if slot in earlier_slots:
+                taken = [base_plan_data[other] for other in earlier_slots[slot]]
+                options = [option for option in options if not any(option[0] is data for data in taken)] or options
+            base_plan_data[slot], servings[slot] = rng.choice(options)
         
         # 3.2. Итерационная подгонка порций: пытаемся приблизиться к цели,
         # увеличивая или уменьшая количество порций в течение нескольких шагов.
         for i in range(5):
-            current_calories = sum(base_plan_data[mt]['nutrition']['calories_per_serving'] * s for mt, s in servings.items())
+            current_calories = sum(base_plan_data[mt]['values'][0] * s for mt, s in servings.items())
 
             # Если мы уже достаточно близко к цели (в пределах 20%), прекращаем подгонку.    
-            if abs(current_calories - target_calories_decimal) / target_calories_decimal <= 0.20:
+            if abs(current_calories - target) * 5 <= target:
                 break
             
             # Если калорий не хватает, увеличиваем порцию у самого "дефицитного" блюда.
-            if current_calories < target_calories_decimal:
+            if current_calories < target:
                 deficits = {}
                 for meal_type, data in base_plan_data.items():
-                    ideal_calories = target_calories_decimal * IDEAL_MEAL_DISTRIBUTION[meal_type.upper()]
-                    actual_calories = data['nutrition']['calories_per_serving'] * servings[meal_type]
-                    deficits[meal_type] = ideal_calories - actual_calories
+                    actual_calories = data['values'][0] * servings[meal_type] * SCALE
+                    deficits[meal_type] = ideal_calories[meal_type] - actual_calories
                 
                 if any(v > 0 for v in deficits.values()):
                     meal_to_increase = max(deficits, key=deficits.get)
                     servings[meal_to_increase] += 1
             # Если калорий слишком много, уменьшаем порцию у самого калорийного блюда.
-            elif current_calories > target_calories_decimal:
-                meal_calories = {mt: data['nutrition']['calories_per_serving'] * servings[mt] for mt, data in base_plan_data.items()}
+            elif current_calories > target:
+                meal_calories = {mt: data['values'][0] * servings[mt] for mt, data in base_plan_data.items()}
                 meal_to_decrease = max(meal_calories, key=meal_calories.get)
                 if servings[meal_to_decrease] > 1:
                     servings[meal_to_decrease] -= 1
         
         # 3.3. Расчет итоговых показателей и проверка.
-        total_calories = sum(base_plan_data[mt]['nutrition']['calories_per_serving'] * s for mt, s in servings.items())
-        total_proteins = sum(base_plan_data[mt]['nutrition']['proteins_per_serving'] * s for mt, s in servings.items())
-        total_fats = sum(base_plan_data[mt]['nutrition']['fats_per_serving'] * s for mt, s in servings.items())
-        total_carbs = sum(base_plan_data[mt]['nutrition']['carbs_per_serving'] * s for mt, s in servings.items())
+        total_calories = sum(base_plan_data[mt]['values'][0] * s for mt, s in servings.items())
+        total_proteins = sum(base_plan_data[mt]['values'][1] * s for mt, s in servings.items())
+        total_fats = sum(base_plan_data[mt]['values'][2] * s for mt, s in servings.items())
+        total_carbs = sum(base_plan_data[mt]['values'][3] * s for mt, s in servings.items())
 
         # Проверяем, соответствует ли план жестким ограничениям по БЖУ.
-        is_valid = True
-        if total_proteins < nutrition_targets['proteins'] or total_fats < nutrition_targets['fats']:
-            is_valid = False
-        if nutrition_targets['carb_constraint_type'] == 'AT_MOST' and total_carbs > nutrition_targets['carbs']:
-            is_valid = False
-        if nutrition_targets['carb_constraint_type'] == 'AT_LEAST' and total_carbs < nutrition_targets['carbs']:
-            is_valid = False
-        
-        if not is_valid:
+        if not meets_fixed_targets(total_proteins, total_fats, total_carbs, targets):
             continue    # Если план невалиден, переходим к следующей попытке.
 
-        # 3.4. Расчет "оценки" (штрафа) для валидной комбинации.
+        # 3.4. Расчет "оценки" (штрафа) для валидной комбинации - как в score_meal_plan.
         # Штраф = (отклонение по общим калориям)^2 + (штрафы за дисбаланс по приемам пищи).
-        score = (total_calories - target_calories_decimal) ** 2
+        score = (total_calories - target) ** 2 * SCALE ** 2 * PENALTY_DENOMINATOR
         for meal_type, data in base_plan_data.items():
-            ideal_meal_calories = target_calories_decimal * IDEAL_MEAL_DISTRIBUTION[meal_type.upper()]
-            current_meal_calories = data['nutrition']['calories_per_serving'] * servings[meal_type]
-            score += (current_meal_calories - ideal_meal_calories) ** 2 * Decimal('0.3')    # Коэффициент для штрафа
+            current_meal_calories = data['values'][0] * servings[meal_type] * SCALE
+            score += (current_meal_calories - ideal_calories[meal_type]) ** 2 * PENALTY_NUMERATOR
 
         # 3.5. Сохранение лучшей комбинации
         if score < best_score:
             best_score = score
             best_combination = {
-                'breakfast': {'recipe_data': base_plan_data['breakfast'], 'servings': servings['breakfast']},
-                'lunch': {'recipe_data': base_plan_data['lunch'], 'servings': servings['lunch']},
-                'dinner': {'recipe_data': base_plan_data['dinner'], 'servings': servings['dinner']},
+                slot: {'recipe_data': base_plan_data[slot], 'servings': servings[slot]} for slot in base_plan_data
             }
 
-    # 4. Финальная проверка на адекватность
-    if best_combination:
-        final_calories = sum(v['recipe_data']['nutrition']['calories_per_serving'] * v['servings'] for v in best_combination.values())
-        if final_calories > 0:
-            # Если отклонение от цели слишком большое (более 25%), считаем, что подходящего плана нет.
-            deviation_percent = abs(final_calories - target_calories_decimal) / target_calories_decimal
-            if deviation_percent > Decimal('0.25'):
-                return None
-    
-    return best_combination
\ No newline at end of file
+    return best_combination
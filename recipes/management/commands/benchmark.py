@@ -0,0 +1,122 @@
+import json
+import time
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from recipes.benchmarks import (
+    benchmark_generator, benchmark_views, catalogue_to_fixture, environment_info, generate_catalogue, load_catalogue,
+)
+from recipes.generator import ENGINES
+
+
+def int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def float_list(value):
+    return [float(item) for item in value.split(',') if item]
+
+
+class Command(BaseCommand):
+    """
+    Замеры генератора меню и страниц на синтетических каталогах разного размера.
+
+    Генератор замеряется на снимке каталога в памяти (без базы). Страницы замеряются
+    во временной тестовой базе (как при `manage.py test`), рабочая база не изменяется.
+    Результаты сохраняются в JSON для сравнения между версиями.
+    """
+    help = "Замеряет скорость и качество генератора меню и скорость страниц на синтетических каталогах."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int_list, default=[100, 1000, 10000, 100000],
+                            help="Размеры каталогов (через запятую) для замеров генератора.")
+        parser.add_argument('--coverages', type=float_list, default=[0.1, 0.5, 1.0],
+                            help="Доли каталога (через запятую), входящие в замеряемую диету.")
+        parser.add_argument('--engines', type=lambda value: value.split(','), default=list(ENGINES),
+                            help="Алгоритмы генератора (через запятую).")
+        parser.add_argument('--runs', type=int, default=20, help="Количество запусков на каждый замер.")
+        parser.add_argument('--calories', type=int, default=2000, help="Целевая калорийность.")
+        parser.add_argument('--seed', type=int, default=0, help="Зерно для генерации каталогов и запусков.")
+        parser.add_argument('--view-sizes', type=int_list, default=[100, 1000],
+                            help="Размеры каталогов для замеров страниц (пустая строка - без замеров страниц).")
+        parser.add_argument('--fixtures-dir', type=Path, default=None,
+                            help="Каталог, куда сохранить фикстуры сгенерированных каталогов (catalogue_<размер>.json).")
+        parser.add_argument('--output', type=Path, default=Path('benchmark_results.json'),
+                            help="Файл с результатами в формате JSON.")
+
+    def handle(self, *args, **options):
+        unknown = set(options['engines']) - set(ENGINES)
+        if unknown:
+            raise CommandError(f"Неизвестные алгоритмы: {', '.join(sorted(unknown))}")
+
+        results = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'environment': environment_info(),
+            'parameters': {
+                key: options[key] for key in ('sizes', 'coverages', 'engines', 'runs', 'calories', 'seed', 'view_sizes')
+            },
+            'generator': [],
+            'views': [],
+        }
+
+        for size in options['sizes']:
+            for coverage in options['coverages']:
+                catalogue = generate_catalogue(size, coverage, options['seed'])
+                self.save_fixture(options['fixtures_dir'], catalogue, f'catalogue_{size}_{coverage:g}.json')
+                for row in benchmark_generator(
+                    catalogue, options['engines'], options['runs'], options['calories'], options['seed']
+                ):
+                    results['generator'].append(dict(recipes=size, coverage=coverage, **row))
+                    self.report(f"генератор: {size} рецептов, покрытие {coverage:g}", row)
+
+        if options['view_sizes']:
+            results['views'] = self.benchmark_views(options)
+
+        options['output'].write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
+
+    def benchmark_views(self, options):
+        """
+        Замеры страниц во временной тестовой базе: для каждого размера каталог загружается заново.
+
+        Создается только тестовая основная база, поэтому чтение из реплики на время замеров
+        отключено: иначе страницы читали бы из настоящей реплики, а не из тестовой базы.
+        """
+        rows = []
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            with override_settings(DATABASE_REPLICA_ALIAS=None):
+                for size in options['view_sizes']:
+                    call_command('flush', interactive=False, verbosity=0)
+                    catalogue = generate_catalogue(size, 1.0, options['seed'])
+                    self.save_fixture(options['fixtures_dir'], catalogue, f'catalogue_{size}_1.json')
+                    ids = load_catalogue(catalogue)
+                    for row in benchmark_views(
+                        catalogue, ids['recipes'], options['runs'], options['calories'], options['seed']
+                    ):
+                        rows.append(dict(recipes=size, **row))
+                        self.report(f"страницы: {size} рецептов", row)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+        return rows
+
+    def save_fixture(self, directory, catalogue, name):
+        if directory is None:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / name
+        if not path.exists():
+            path.write_text(json.dumps(catalogue_to_fixture(catalogue), ensure_ascii=False), encoding='utf-8')
+
+    def report(self, title, row):
+        latency = row['latency_ms'] or {}
+        name = row.get('engine') or row.get('view')
+        extra = f", успех {row['success_rate']:.0%}" if 'success_rate' in row else f", запросов {row['queries']}"
+        self.stdout.write(f"{title} | {name}: p50 {latency.get('p50')} мс, p95 {latency.get('p95')} мс{extra}")
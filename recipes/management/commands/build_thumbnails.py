@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import Diet, Recipe
+from recipes.thumbnails import DIET_ICON_PRESETS, RECIPE_IMAGE_PRESETS, ensure_thumbnails
+
+
+class Command(BaseCommand):
+    """
+    Создает уменьшенные копии (см. recipes/thumbnails.py) для всех уже загруженных
+    изображений рецептов и иконок диет. Изображения обрабатываются параллельно
+    в нескольких потоках: Pillow отпускает GIL при декодировании, масштабировании
+    и сжатии, поэтому потоки загружают все ядра.
+    """
+    help = "Создает уменьшенные копии изображений рецептов и иконок диет."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Количество потоков обработки изображений.")
+        parser.add_argument('--force', action='store_true',
+                            help="Пересоздать уже существующие копии.")
+
+    def handle(self, *args, **options):
+        jobs = [
+            (name, RECIPE_IMAGE_PRESETS)
+            for name in Recipe.objects.exclude(image='').exclude(image=None).values_list('image', flat=True).distinct()
+        ] + [
+            (name, DIET_ICON_PRESETS)
+            for name in Diet.objects.exclude(icon='').exclude(icon=None).values_list('icon', flat=True).distinct()
+        ]
+
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            futures = {
+                executor.submit(ensure_thumbnails, name, presets, options['force']): name for name, presets in jobs
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f"{futures[future]}: {error}")
+                else:
+                    done += 1
+
+        if failed:
+            raise CommandError(f"Обработано изображений: {done}, с ошибками: {failed}.")
+        self.stdout.write(self.style.SUCCESS(f"Обработано изображений: {done}."))
@@ -0,0 +1,37 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.catalogue_io import DEFAULT_BATCH_SIZE, FORMATS, KINDS, export_rows, write_rows
+
+
+class Command(BaseCommand):
+    """
+    Потоковый экспорт каталога в файлы CSV или JSON Lines (по файлу на вид данных:
+    ingredients, recipes, recipe_ingredients), которые затем можно загрузить командой
+    import_catalogue. Данные читаются из базы частями, поэтому расход памяти не зависит
+    от размера каталога.
+    """
+    help = "Экспортирует ингредиенты, рецепты и ингредиенты рецептов в CSV или JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', type=Path, help="Каталог, в который сохраняются файлы.")
+        parser.add_argument('--format', choices=FORMATS, default='jsonl', help="Формат файлов.")
+        parser.add_argument('--kinds', type=lambda value: value.split(','), default=list(KINDS),
+                            help="Виды данных через запятую (по умолчанию - все).")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Количество строк, читаемых из базы за один раз.")
+
+    def handle(self, *args, **options):
+        unknown = set(options['kinds']) - set(KINDS)
+        if unknown:
+            raise CommandError(f"Неизвестные виды данных: {', '.join(sorted(unknown))}")
+
+        directory = options['directory']
+        directory.mkdir(parents=True, exist_ok=True)
+        for kind in options['kinds']:
+            path = directory / f"{kind}.{options['format']}"
+            with path.open('w', encoding='utf-8', newline='') as stream:
+                count = write_rows(stream, kind, export_rows(kind, options['batch_size']), options['format'])
+            self.stdout.write(f"{path}: записано строк: {count}")
+        self.stdout.write(self.style.SUCCESS("Экспорт завершен."))
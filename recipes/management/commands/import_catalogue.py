@@ -0,0 +1,70 @@
+import sys
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.caching import bump_catalogue_version
+from recipes.catalogue_io import (
+    DEFAULT_BATCH_SIZE, FORMATS, KINDS, detect_format, finish_import, import_context, import_rows, read_rows,
+)
+
+
+class Command(BaseCommand):
+    """
+    Потоковый импорт каталога из файлов CSV или JSON Lines (см. recipes/catalogue_io.py).
+
+    Файлы читаются построчно и сохраняются пакетами (существующие ингредиенты - по названию,
+    рецепты - по id, ингредиенты рецептов - по паре рецепт/ингредиент - обновляются),
+    поэтому расход памяти не зависит от размера файлов. Строки с ошибками пропускаются,
+    а ошибки выводятся с номерами строк. В отличие от loaddata, после импорта КБЖУ и
+    поисковые векторы рецептов пересчитываются автоматически.
+    """
+    help = "Импортирует ингредиенты, рецепты и ингредиенты рецептов из CSV или JSON Lines."
+
+    def add_arguments(self, parser):
+        for kind in KINDS:
+            parser.add_argument(f"--{kind.replace('_', '-')}", dest=kind, metavar='FILE',
+                                help=f"Файл с данными вида {kind} ('-' - стандартный ввод).")
+        parser.add_argument('--format', choices=FORMATS,
+                            help="Формат файлов (по умолчанию определяется по расширению: .csv, .jsonl).")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Количество строк, сохраняемых за один раз.")
+        parser.add_argument('--max-errors', type=int, default=100,
+                            help="Сколько ошибок вывести (остальные только подсчитываются).")
+
+    def handle(self, *args, **options):
+        files = [(kind, options[kind]) for kind in KINDS if options[kind]]
+        if not files:
+            raise CommandError("Укажите хотя бы один файл: --ingredients, --recipes или --recipe-ingredients.")
+
+        context = import_context()
+        errors = 0
+        for kind, path in files:
+            try:
+                file_format = options['format'] or detect_format(path)
+            except ValueError as error:
+                raise CommandError(str(error))
+
+            def report_error(line_number, message, path=path):
+                nonlocal errors
+                errors += 1
+                if errors <= options['max_errors']:
+                    self.stderr.write(f"{path}:{line_number}: {message}")
+
+            if path == '-':
+                saved = import_rows(kind, read_rows(sys.stdin, file_format), report_error, options['batch_size'], context)
+            else:
+                # utf-8-sig: CSV, сохраненные в Excel, начинаются с метки порядка байтов.
+                with Path(path).open(encoding='utf-8-sig', newline='') as stream:
+                    saved = import_rows(kind, read_rows(stream, file_format), report_error, options['batch_size'], context)
+            self.stdout.write(f"{path}: сохранено строк: {saved}")
+
+        finish_import(context)
+        call_command('rebuild_nutrition', verbosity=0, stdout=self.stdout)
+        call_command('rebuild_search_vectors', verbosity=0, stdout=self.stdout)
+        bump_catalogue_version()
+
+        if errors:
+            raise CommandError(f"Импорт завершен, строк с ошибками: {errors}.")
+        self.stdout.write(self.style.SUCCESS("Импорт завершен без ошибок."))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.caching import bump_catalogue_version
+from recipes.models import Recipe, RecipeNutrition
+from recipes.utils import recipe_nutrition_fields
+
+# Поля, которые перезаписываются у уже существующих строк RecipeNutrition.
+NUTRITION_FIELDS = [
+    'total_calories', 'total_proteins', 'total_fats', 'total_carbs',
+    'calories_per_serving', 'proteins_per_serving', 'fats_per_serving', 'carbs_per_serving',
+]
+
+
+class Command(BaseCommand):
+    """
+    Полностью пересобирает таблицу RecipeNutrition.
+    Нужна после загрузки фикстур (loaddata не вызывает сигналы) или массового импорта.
+    """
+    help = "Пересчитывает сохраненное КБЖУ для всех рецептов."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Количество рецептов, обрабатываемых и сохраняемых за один раз.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        recipe_ids = list(Recipe.objects.order_by('pk').values_list('pk', flat=True))
+        total = 0
+
+        for start in range(0, len(recipe_ids), batch_size):
+            batch_ids = recipe_ids[start:start + batch_size]
+            recipes = Recipe.objects.filter(pk__in=batch_ids).prefetch_related('recipeingredient_set__ingredient')
+            rows = [RecipeNutrition(recipe=recipe, **recipe_nutrition_fields(recipe)) for recipe in recipes]
+
+            with transaction.atomic():
+                RecipeNutrition.objects.bulk_create(
+                    rows,
+                    update_conflicts=True,
+                    unique_fields=['recipe'],
+                    update_fields=NUTRITION_FIELDS,
+                )
+            total += len(rows)
+
+        # bulk_create не вызывает сигналы: сбрасываем снимок каталога и кэши планов и страниц.
+        bump_catalogue_version()
+
+        self.stdout.write(self.style.SUCCESS(f"КБЖУ пересчитано для {total} рецептов."))
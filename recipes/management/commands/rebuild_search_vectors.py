@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import router
+
+from recipes.search import is_postgresql, update_search_vectors
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Пересобирает поисковые векторы всех рецептов одним запросом.
+    Нужна после загрузки фикстур (loaddata не вызывает сигналы) или массового импорта.
+    """
+    help = "Пересчитывает поисковый вектор (полнотекстовый поиск) для всех рецептов."
+
+    def handle(self, *args, **options):
+        if not is_postgresql(router.db_for_write(Recipe)):
+            self.stdout.write("Полнотекстовый поиск доступен только в PostgreSQL, пересчет не требуется.")
+            return
+
+        update_search_vectors()
+        self.stdout.write(self.style.SUCCESS("Поисковые векторы рецептов пересчитаны."))
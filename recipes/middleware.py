@@ -0,0 +1,262 @@
+import cProfile
+import json
+import logging
+import mimetypes
+import os
+import random
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.db import connections
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from .routers import (
+    SAFE_METHODS, STICKY_COOKIE, get_db_routing, replica_alias, replica_is_current, start_db_routing, stop_db_routing,
+)
+from .staticfiles import ENCODINGS
+from .timing import start_request_timings, stop_request_timings
+
+logger = logging.getLogger('recipes.timing')
+
+
+# ==============================================================================
+# Замеры времени запроса: журнал и заголовок Server-Timing
+# ==============================================================================
+class RequestTimingMiddleware:
+    """
+    Ведет замеры этапов запроса (см. timing.py) и время SQL-запросов ко всем базам,
+    пишет их одной JSON-строкой в журнал 'recipes.timing' и, если включено
+    REQUEST_TIMING_HEADER, добавляет заголовок Server-Timing.
+    Отключается настройкой REQUEST_TIMING_ENABLED = False.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timings, token = start_request_timings()
+        try:
+            with _DatabaseTimer(timings):
+                response = self.get_response(request)
+        finally:
+            stop_request_timings(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings, token = start_request_timings()
+        try:
+            # Запросы к базе в асинхронных view выполняются в других потоках
+            # (sync_to_async), поэтому время SQL здесь не учитывается.
+            response = await self.get_response(request)
+        finally:
+            stop_request_timings(token)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        total = timings.total()
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 3),
+            'stages': timings.as_dict(),
+        }, ensure_ascii=False))
+        if settings.REQUEST_TIMING_HEADER:
+            response['Server-Timing'] = timings.server_timing_header(total)
+        return response
+
+
+class _DatabaseTimer:
+    """Суммирует время SQL-запросов текущего потока в этап 'db' (через execute_wrapper)."""
+
+    def __init__(self, timings):
+        self.timings = timings
+        self.wrappers = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.timings.add('db', time.perf_counter() - started)
+
+    def __enter__(self):
+        for connection in connections.all():
+            wrapper = connection.execute_wrapper(self)
+            wrapper.__enter__()
+            self.wrappers.append(wrapper)
+        return self
+
+    def __exit__(self, *exc_info):
+        while self.wrappers:
+            self.wrappers.pop().__exit__(*exc_info)
+
+
+# ==============================================================================
+# Выборочное профилирование запросов (cProfile)
+# ==============================================================================
+class ProfilingMiddleware:
+    """
+    Профилирует долю PROFILING_SAMPLE_RATE запросов через cProfile и сохраняет профили
+    в каталог PROFILING_DIR (файлы .prof, открываются pstats, snakeviz и т.п.).
+    По умолчанию (PROFILING_SAMPLE_RATE = 0) отключена.
+    """
+
+    def __init__(self, get_response):
+        if settings.PROFILING_SAMPLE_RATE <= 0:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.directory = Path(settings.PROFILING_DIR)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def __call__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        # Время с микросекундами в имени файла - чтобы профили не перезаписывали друг друга.
+        name = '{time}.{micro:06d}-{method}-{path}.prof'.format(
+            time=time.strftime('%Y%m%d-%H%M%S'),
+            micro=time.time_ns() // 1000 % 10 ** 6,
+            method=request.method,
+            path=request.path.strip('/').replace('/', '_') or 'index',
+        )
+        profiler.dump_stats(self.directory / name)
+        return response
+
+
+# ==============================================================================
+# Отдача статических файлов из STATIC_ROOT (после collectstatic)
+# ==============================================================================
+class StaticFilesMiddleware:
+    """
+    Отдает файлы из STATIC_ROOT, если перед сайтом нет отдельного веб-сервера для статики.
+    Если браузер поддерживает сжатие, отдается заранее сжатая копия .br или .gz
+    (см. staticfiles.py). Файлы с хешем содержимого в имени кэшируются браузером
+    на STATIC_IMMUTABLE_MAX_AGE с пометкой immutable, остальные - на STATIC_MAX_AGE.
+    Отключается настройкой STATIC_SERVE = False.
+    """
+
+    def __init__(self, get_response):
+        if not settings.STATIC_SERVE or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        self.root = str(settings.STATIC_ROOT)
+
+    def __call__(self, request):
+        if request.path.startswith(self.prefix) and request.method in ('GET', 'HEAD'):
+            response = self.serve(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        stat = os.stat(path)
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+            response = HttpResponseNotModified()
+        else:
+            content_type, _ = mimetypes.guess_type(path)
+            encoding, served_path = self.select_encoding(request, path)
+            response = FileResponse(open(served_path, 'rb'), content_type=content_type or 'application/octet-stream')
+            if encoding:
+                response['Content-Encoding'] = encoding
+            response['Last-Modified'] = http_date(stat.st_mtime)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if self.is_immutable(name):
+            patch_cache_control(response, public=True, max_age=settings.STATIC_IMMUTABLE_MAX_AGE, immutable=True)
+        else:
+            patch_cache_control(response, public=True, max_age=settings.STATIC_MAX_AGE)
+        return response
+
+    def select_encoding(self, request, path):
+        """Сжатая копия файла, которую поддерживает браузер (сначала brotli), или сам файл."""
+        accepted = {
+            item.split(';')[0].strip().lower() for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')
+        }
+        for encoding, suffix in ENCODINGS.items():
+            if encoding in accepted and os.path.isfile(path + suffix):
+                return encoding, path + suffix
+        return None, path
+
+    def is_immutable(self, name):
+        """Файл с хешем содержимого в имени (есть среди значений манифеста collectstatic)."""
+        hashed_files = getattr(staticfiles_storage, 'hashed_files', None)
+        if not hashed_files:
+            return False
+        if getattr(self, '_hashed_names_source', None) is not hashed_files:
+            self._hashed_names = set(hashed_files.values())
+            self._hashed_names_source = hashed_files
+        return name in self._hashed_names
+
+
+# ==============================================================================
+# Чтение из реплики базы данных (см. routers.py)
+# ==============================================================================
+class ReplicaRoutingMiddleware:
+    """
+    Направляет чтение view, отмеченных декоратором replica_reads, в реплику, если
+    клиент недавно ничего не изменял (нет cookie STICKY_COOKIE) и каталог не менялся
+    последние DATABASE_REPLICA_STICKY_SECONDS секунд. Если запрос изменяет данные
+    (не GET, HEAD, OPTIONS, TRACE) и во время него была запись в базу, ставит клиенту
+    cookie на DATABASE_REPLICA_STICKY_SECONDS секунд.
+    Не используется, если реплика не настроена.
+    """
+
+    def __init__(self, get_response):
+        self.replica = replica_alias()
+        if self.replica is None:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routing, token = start_db_routing(track_writes=request.method not in SAFE_METHODS)
+        try:
+            response = self.get_response(request)
+        finally:
+            stop_db_routing(token)
+        if routing.wrote:
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=settings.DATABASE_REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            getattr(view_func, 'replica_reads', False)
+            and request.method in ('GET', 'HEAD')
+            and STICKY_COOKIE not in request.COOKIES
+            and replica_is_current()
+        ):
+            get_db_routing().read_alias = self.replica
+
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_is_simple_ingredient'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeNutrition',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='nutrition', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('total_calories', models.DecimalField(decimal_places=4, default=0, max_digits=14, verbose_name='Калории (всего)')),
+                ('total_proteins', models.DecimalField(decimal_places=4, default=0, max_digits=14, verbose_name='Белки (всего)')),
+                ('total_fats', models.DecimalField(decimal_places=4, default=0, max_digits=14, verbose_name='Жиры (всего)')),
+                ('total_carbs', models.DecimalField(decimal_places=4, default=0, max_digits=14, verbose_name='Углеводы (всего)')),
+                ('calories_per_serving', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Калории (на порцию)')),
+                ('proteins_per_serving', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Белки (на порцию)')),
+                ('fats_per_serving', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Жиры (на порцию)')),
+                ('carbs_per_serving', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Углеводы (на порцию)')),
+            ],
+            options={
+                'verbose_name': 'КБЖУ рецепта',
+                'verbose_name_plural': 'КБЖУ рецептов',
+            },
+        ),
+    ]
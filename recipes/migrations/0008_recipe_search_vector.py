@@ -0,0 +1,73 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:58
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# GIN-индексы и расширение pg_trgm существуют только в PostgreSQL,
+# поэтому создаются вручную и пропускаются на других СУБД (SQLite в тестах).
+# Триграммный индекс создается, только если расширение pg_trgm доступно на сервере.
+SEARCH_VECTOR_INDEX_SQL = (
+    "CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_gin ON recipes_recipe USING gin (search_vector)"
+)
+
+TRIGRAM_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS recipes_recipe_name_trgm ON recipes_recipe USING gin (name gin_trgm_ops)",
+]
+
+DROP_SQL = [
+    "DROP INDEX IF EXISTS recipes_recipe_name_trgm",
+    "DROP INDEX IF EXISTS recipes_recipe_search_vector_gin",
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(SEARCH_VECTOR_INDEX_SQL)
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        trigram_available = cursor.fetchone() is not None
+    if trigram_available:
+        for sql in TRIGRAM_SQL:
+            schema_editor.execute(sql)
+
+    # Заполняем поисковый вектор для уже существующих рецептов.
+    schema_editor.execute(
+        """
+        UPDATE recipes_recipe AS r SET search_vector =
+            setweight(to_tsvector('russian', coalesce(r.name, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(r.description, '')), 'B') ||
+            setweight(to_tsvector('russian', coalesce((
+                SELECT string_agg(i.name, ' ')
+                FROM recipes_recipeingredient AS ri
+                JOIN recipes_ingredient AS i ON i.id = ri.ingredient_id
+                WHERE ri.recipe_id = r.id
+            ), '')), 'C')
+        """
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipenutrition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:16
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipeingredient_ingredient_recipe_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diet',
+            name='breakfast_percent',
+            field=models.PositiveSmallIntegerField(default=30, validators=[django.core.validators.MaxValueValidator(100)], verbose_name='Завтрак (% калорий)'),
+        ),
+        migrations.AddField(
+            model_name='diet',
+            name='dinner_percent',
+            field=models.PositiveSmallIntegerField(default=30, validators=[django.core.validators.MaxValueValidator(100)], verbose_name='Ужин (% калорий)'),
+        ),
+        migrations.AddField(
+            model_name='diet',
+            name='lunch_percent',
+            field=models.PositiveSmallIntegerField(default=40, validators=[django.core.validators.MaxValueValidator(100)], verbose_name='Обед (% калорий)'),
+        ),
+        migrations.AddField(
+            model_name='diet',
+            name='snack_count',
+            field=models.PositiveSmallIntegerField(default=0, validators=[django.core.validators.MaxValueValidator(3)], verbose_name='Количество перекусов'),
+        ),
+        migrations.AddField(
+            model_name='diet',
+            name='snack_percent',
+            field=models.PositiveSmallIntegerField(default=0, validators=[django.core.validators.MaxValueValidator(100)], verbose_name='Перекус (% калорий на каждый)'),
+        ),
+    ]
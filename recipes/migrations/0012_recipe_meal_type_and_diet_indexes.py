@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+# Индекс (diet, recipe) по промежуточной таблице Recipe.diets: уникальный индекс
+# (recipe, diet) уже есть, а для выборки рецептов диеты нужен обратный порядок,
+# чтобы id рецептов читались прямо из индекса.
+DIET_RECIPE_INDEX = models.Index(fields=['diet', 'recipe'], name='recipe_diets_diet_recipe')
+
+
+def _diet_links_model(apps):
+    return apps.get_model('recipes', 'Recipe')._meta.get_field('diets').remote_field.through
+
+
+def add_diet_links_index(apps, schema_editor):
+    schema_editor.add_index(_diet_links_model(apps), DIET_RECIPE_INDEX)
+
+
+def remove_diet_links_index(apps, schema_editor):
+    schema_editor.remove_index(_diet_links_model(apps), DIET_RECIPE_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['meal_type', 'is_simple_ingredient'], name='recipe_mealtype_simple'),
+        ),
+        migrations.RunPython(add_diet_links_index, remove_diet_links_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_meal_type_and_diet_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['calories_per_serving'], name='nutrition_calories_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['proteins_per_serving'], name='nutrition_proteins_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['fats_per_serving'], name='nutrition_fats_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['carbs_per_serving'], name='nutrition_carbs_idx'),
+        ),
+    ]
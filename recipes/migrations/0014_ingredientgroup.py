@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipenutrition_per_serving_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Название группы')),
+                ('ingredients', models.ManyToManyField(blank=True, related_name='groups', to='recipes.ingredient', verbose_name='Ингредиенты')),
+            ],
+            options={
+                'verbose_name': 'Группа ингредиентов',
+                'verbose_name_plural': 'Группы ингредиентов',
+                'ordering': ['name'],
+            },
+        ),
+    ]
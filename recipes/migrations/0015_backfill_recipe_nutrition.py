@@ -0,0 +1,60 @@
+from decimal import ROUND_HALF_EVEN, Decimal
+
+from django.db import migrations
+
+# Количество рецептов, рассчитываемых и сохраняемых за один раз.
+BATCH_SIZE = 500
+
+# Расчет не использует модули приложения (recipes.fixedpoint, recipes.utils): их
+# дальнейшие изменения не должны менять то, что делает уже выпущенная миграция.
+NUTRIENTS = ('calories', 'proteins', 'fats', 'carbs')
+PER_SERVING_QUANTUM = Decimal('0.01')
+
+
+def backfill_recipe_nutrition(apps, schema_editor):
+    """
+    Создает строки RecipeNutrition для рецептов, у которых их еще нет (база, созданная
+    до появления таблицы, или загрузка фикстур). Расчет тот же, что в utils.recipe_nutrition_fields,
+    но по историческим моделям: суммы без округления (значения на 100 г с двумя знаками x целый
+    вес дают точную сумму), значения на порцию - с банковским округлением до сотых.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    RecipeNutrition = apps.get_model('recipes', 'RecipeNutrition')
+    db_alias = schema_editor.connection.alias
+
+    missing = list(
+        Recipe.objects.using(db_alias).filter(nutrition__isnull=True).order_by('pk').values_list('pk', 'servings')
+    )
+    value_fields = [f'ingredient__{name}' for name in NUTRIENTS]
+
+    for start in range(0, len(missing), BATCH_SIZE):
+        servings = dict(missing[start:start + BATCH_SIZE])
+        totals = {recipe_id: [Decimal(0)] * len(NUTRIENTS) for recipe_id in servings}
+        links = RecipeIngredient.objects.using(db_alias).filter(recipe_id__in=servings)
+        for recipe_id, weight, *values in links.values_list('recipe_id', 'weight_grams', *value_fields):
+            for index, value in enumerate(values):
+                # Значение на 100 г, как и в базе, - с двумя знаками после запятой.
+                value = Decimal(value).quantize(PER_SERVING_QUANTUM, rounding=ROUND_HALF_EVEN)
+                totals[recipe_id][index] += value * weight / 100
+
+        rows = []
+        for recipe_id, recipe_totals in totals.items():
+            fields = {}
+            for name, value in zip(NUTRIENTS, recipe_totals):
+                fields[f'total_{name}'] = value
+                per_serving = value / servings[recipe_id] if servings[recipe_id] > 0 else Decimal(0)
+                fields[f'{name}_per_serving'] = per_serving.quantize(PER_SERVING_QUANTUM, rounding=ROUND_HALF_EVEN)
+            rows.append(RecipeNutrition(recipe_id=recipe_id, **fields))
+        RecipeNutrition.objects.using(db_alias).bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_ingredientgroup'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_recipe_nutrition, migrations.RunPython.noop),
+    ]
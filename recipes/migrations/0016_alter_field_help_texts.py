@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_backfill_recipe_nutrition'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='diet',
+            name='default_calories',
+            field=models.PositiveIntegerField(default=2000, help_text='Рекомендуемая калорийность для этой диеты, если пользователь не указал свою.', verbose_name='Калории по умолчанию'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='is_simple_ingredient',
+            field=models.BooleanField(default=False, help_text="Отметьте, если это базовый продукт (например, 'Банан'), чтобы не показывать его в общем каталоге.", verbose_name='Это простой продукт (не показывать в каталоге)'),
+        ),
+        migrations.AlterField(
+            model_name='recipeingredient',
+            name='display_amount',
+            field=models.CharField(help_text="Например: '1', '0.5', '2-3'", max_length=50, verbose_name='Количество (отображаемое)'),
+        ),
+        migrations.AlterField(
+            model_name='recipeingredient',
+            name='display_unit',
+            field=models.CharField(help_text="Например: 'шт.', 'стакан', 'ст.л.'", max_length=50, verbose_name='Единица изм. (отображаемая)'),
+        ),
+    ]
@@ -1,5 +1,10 @@
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator
 from django.db import models
 
+from .fixedpoint import NUTRIENTS
+
 # ==============================================================================
 # Модель 1: Диета (Кето, Веган и т.д.)
 # ==============================================================================
@@ -33,9 +38,36 @@ class Diet(models.Model):
         verbose_name="Ограничение на углеводы"
     )
 
+    # Распределение калорий по приемам пищи (в процентах от дневной калорийности, в сумме 100).
+    # Перекусов может быть от 0 до MAX_SNACKS (после обеда, завтрака и ужина, см. generator.SNACK_POSITIONS),
+    # каждый получает snack_percent процентов.
+    MAX_SNACKS = 3
+    breakfast_percent = models.PositiveSmallIntegerField(
+        default=30, validators=[MaxValueValidator(100)], verbose_name="Завтрак (% калорий)"
+    )
+    lunch_percent = models.PositiveSmallIntegerField(
+        default=40, validators=[MaxValueValidator(100)], verbose_name="Обед (% калорий)"
+    )
+    dinner_percent = models.PositiveSmallIntegerField(
+        default=30, validators=[MaxValueValidator(100)], verbose_name="Ужин (% калорий)"
+    )
+    snack_count = models.PositiveSmallIntegerField(
+        default=0, validators=[MaxValueValidator(MAX_SNACKS)], verbose_name="Количество перекусов"
+    )
+    snack_percent = models.PositiveSmallIntegerField(
+        default=0, validators=[MaxValueValidator(100)], verbose_name="Перекус (% калорий на каждый)"
+    )
+
     def __str__(self):
         return self.name
 
+    def clean(self):
+        total = self.breakfast_percent + self.lunch_percent + self.dinner_percent + self.snack_count * self.snack_percent
+        if total != 100:
+            raise ValidationError(
+                f"Сумма долей калорий по приемам пищи должна быть равна 100% (сейчас {total}%)."
+            )
+
     class Meta:
         verbose_name = "Диета"
         verbose_name_plural = "Диеты"
@@ -64,6 +96,113 @@ class Ingredient(models.Model):
         ordering = ['name']
 
 
+class IngredientGroup(models.Model):
+    """
+    Группа ингредиентов (орехи, молочные продукты и т.д.), которую пользователь может
+    исключить из меню и каталога целиком, не перечисляя каждый ингредиент.
+    """
+    name = models.CharField(max_length=100, unique=True, verbose_name="Название группы")
+    ingredients = models.ManyToManyField(
+        Ingredient, related_name='groups', blank=True, verbose_name="Ингредиенты"
+    )
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = "Группа ингредиентов"
+        verbose_name_plural = "Группы ингредиентов"
+        ordering = ['name']
+
+
+# ==============================================================================
+# Наборы запросов для рецептов
+# ==============================================================================
+class RecipeQuerySet(models.QuerySet):
+    """
+    Готовые варианты выборки рецептов под конкретные страницы.
+    Каждый из них выполняет фиксированное число запросов, не зависящее от размера каталога.
+    """
+
+    def with_nutrition_data(self):
+        """
+        Для генератора меню: КБЖУ подтягивается из RecipeNutrition тем же запросом (JOIN),
+        длинные текстовые поля не загружаются.
+        """
+        return self.select_related('nutrition').defer('description', 'instructions')
+
+    def with_nutrition_columns(self):
+        """
+        КБЖУ на порцию из RecipeNutrition как поля рецепта (calories, proteins, fats, carbs) -
+        для сортировки и постраничного вывода по ним в базе. Рецепты без рассчитанного КБЖУ
+        (до rebuild_nutrition) не попадают в выборку, чтобы NULL не нарушал порядок.
+        """
+        return self.filter(nutrition__isnull=False).annotate(**{
+            nutrient: models.F(f'nutrition__{nutrient}_per_serving') for nutrient in NUTRIENTS
+        })
+
+    def with_nutrition_in_ranges(self, ranges):
+        """
+        Рецепты, у которых КБЖУ на порцию входит в диапазоны:
+        ranges - {показатель: (от, до)}, любая из границ может быть None (без ограничения).
+        Фильтр выполняется в базе по индексированным столбцам RecipeNutrition.
+        """
+        conditions = {}
+        for nutrient, (low, high) in ranges.items():
+            if low is not None:
+                conditions[f'nutrition__{nutrient}_per_serving__gte'] = low
+            if high is not None:
+                conditions[f'nutrition__{nutrient}_per_serving__lte'] = high
+        return self.filter(**conditions) if conditions else self
+
+    def for_catalogue_card(self):
+        """Для карточек каталога: только поля, которые выводятся в карточке."""
+        return self.only('id', 'name', 'description', 'cooking_time', 'servings', 'image')
+
+    def with_all_ingredients(self, ingredient_ids):
+        """
+        Рецепты, содержащие КАЖДЫЙ из ингредиентов.
+        Один подзапрос с группировкой (количество совпавших ингредиентов = N)
+        вместо отдельного JOIN-а на каждый ингредиент.
+        """
+        ingredient_ids = set(ingredient_ids)
+        if not ingredient_ids:
+            return self
+        matching = (
+            RecipeIngredient.objects.filter(ingredient_id__in=ingredient_ids)
+            .values('recipe_id')
+            .annotate(matched=models.Count('ingredient_id', distinct=True))
+            .filter(matched=len(ingredient_ids))
+            .values('recipe_id')
+        )
+        return self.filter(id__in=matching)
+
+    def with_any_ingredients(self, ingredient_ids):
+        """Рецепты, содержащие ХОТЯ БЫ ОДИН из ингредиентов."""
+        ingredient_ids = set(ingredient_ids)
+        if not ingredient_ids:
+            return self
+        matching = RecipeIngredient.objects.filter(ingredient_id__in=ingredient_ids).values('recipe_id')
+        return self.filter(id__in=matching)
+
+    def without_ingredients(self, ingredient_ids):
+        """Рецепты, НЕ содержащие ни одного из ингредиентов."""
+        ingredient_ids = set(ingredient_ids)
+        if not ingredient_ids:
+            return self
+        matching = RecipeIngredient.objects.filter(ingredient_id__in=ingredient_ids).values('recipe_id')
+        return self.exclude(id__in=matching)
+
+    def for_detail(self):
+        """Для детальной страницы: КБЖУ и ингредиенты (вместе с их названиями) заранее."""
+        return self.select_related('nutrition').prefetch_related(
+            models.Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related('ingredient').order_by('id'),
+            )
+        )
+
+
 # ==============================================================================
 # Модель 3: Рецепт (основная сущность)
 # ==============================================================================
@@ -98,12 +237,28 @@ class Recipe(models.Model):
     
     image = models.ImageField(upload_to='recipe_images/', blank=True, null=True, verbose_name="Изображение")
 
+    # Поисковый вектор (название, описание, ингредиенты) для полнотекстового поиска в PostgreSQL.
+    # Заполняется сигналами (см. search.py), GIN-индекс создается миграцией только в PostgreSQL.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Время последнего изменения рецепта или его ингредиентов (см. signals.py);
+    # используется в заголовках Last-Modified страницы рецепта.
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Изменен")
+
+    objects = RecipeQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
+        indexes = [
+            # Фильтры каталога и выборка кандидатов генератора по приему пищи.
+            # Индекс по связям с диетами (diet, recipe) создается миграцией 0012:
+            # промежуточная таблица M2M создается Django автоматически и не имеет своей Meta.
+            models.Index(fields=['meal_type', 'is_simple_ingredient'], name='recipe_mealtype_simple'),
+        ]
 
 # ==============================================================================
 # Модель 4: Связующая таблица для Рецептов и Ингредиентов
@@ -135,3 +290,60 @@ class RecipeIngredient(models.Model):
         verbose_name = "Ингредиент в рецепте"
         verbose_name_plural = "Ингредиенты в рецептах"
         unique_together = ('recipe', 'ingredient')
+        indexes = [
+            # Индекс (recipe, ingredient) уже создан ограничением unique_together;
+            # обратный порядок нужен для фильтров каталога "по ингредиентам".
+            models.Index(fields=['ingredient', 'recipe'], name='recipeingr_ingredient_recipe'),
+        ]
+
+
+# ==============================================================================
+# Модель 5: Рассчитанная пищевая ценность рецепта
+# ==============================================================================
+class RecipeNutrition(models.Model):
+    """
+    Хранит заранее рассчитанную пищевую ценность рецепта (всего и на одну порцию),
+    чтобы генератор и страницы не пересчитывали КБЖУ по ингредиентам на каждый запрос.
+    Поддерживается в актуальном состоянии сигналами (см. signals.py).
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='nutrition',
+        verbose_name="Рецепт"
+    )
+
+    # Суммы по всем ингредиентам хранятся без потери точности (вес в граммах / 100 * значение на 100г),
+    # поэтому при изменении числа порций значения на порцию можно пересчитать без обхода ингредиентов.
+    total_calories = models.DecimalField(max_digits=14, decimal_places=4, default=0, verbose_name="Калории (всего)")
+    total_proteins = models.DecimalField(max_digits=14, decimal_places=4, default=0, verbose_name="Белки (всего)")
+    total_fats = models.DecimalField(max_digits=14, decimal_places=4, default=0, verbose_name="Жиры (всего)")
+    total_carbs = models.DecimalField(max_digits=14, decimal_places=4, default=0, verbose_name="Углеводы (всего)")
+
+    calories_per_serving = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Калории (на порцию)")
+    proteins_per_serving = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Белки (на порцию)")
+    fats_per_serving = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Жиры (на порцию)")
+    carbs_per_serving = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Углеводы (на порцию)")
+
+    def __str__(self):
+        return f"КБЖУ: {self.recipe_id}"
+
+    def as_dict(self):
+        """Возвращает значения в том же формате, что и utils.calculate_recipe_nutrition."""
+        return {
+            'total_calories': round(self.total_calories, 2),
+            'calories_per_serving': self.calories_per_serving,
+            'proteins_per_serving': self.proteins_per_serving,
+            'fats_per_serving': self.fats_per_serving,
+            'carbs_per_serving': self.carbs_per_serving,
+        }
+
+    class Meta:
+        verbose_name = "КБЖУ рецепта"
+        verbose_name_plural = "КБЖУ рецептов"
+        # Фильтры и сортировка каталога по КБЖУ на порцию (см. RecipeQuerySet.with_nutrition_in_ranges).
+        indexes = [
+            models.Index(fields=[f'{nutrient}_per_serving'], name=f'nutrition_{nutrient}_idx')
+            for nutrient in NUTRIENTS
+        ]
@@ -0,0 +1,77 @@
+import base64
+import binascii
+import json
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import models
+
+
+# ==============================================================================
+# Постраничный вывод по ключу (keyset/cursor pagination)
+# ==============================================================================
+# Вместо OFFSET, который заставляет базу пропускать все предыдущие строки,
+# следующая страница выбирается условием "после последней показанной записи":
+# (поле сортировки, id) > (значение, id последней записи). Поле id используется
+# для однозначного порядка записей с одинаковым значением поля сортировки.
+
+def encode_cursor(value, pk):
+    """Упаковывает значение поля сортировки и id последней записи в строку для URL."""
+    if isinstance(value, Decimal):
+        # КБЖУ (Decimal) передается строкой, чтобы не терять точность при сравнении.
+        value = str(value)
+    raw = json.dumps([value, pk], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Распаковывает курсор. Возвращает пару (значение, id) или None,
+    если курсор отсутствует или поврежден (тогда выводится первая страница).
+    """
+    if not cursor:
+        return None
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError, binascii.Error, UnicodeError):
+        return None
+    if not isinstance(pk, int) or not isinstance(value, (str, int, float)):
+        return None
+    return value, pk
+
+
+def paginate_by_keyset(queryset, sort_by, cursor, page_size):
+    """
+    Возвращает одну страницу queryset, отсортированного по полю sort_by
+    (с "-" для убывания) с дополнительной сортировкой по id.
+
+    Возвращает:
+        tuple: (список объектов страницы, курсор следующей страницы или None).
+    """
+    field = sort_by.lstrip('-')
+    descending = sort_by.startswith('-')
+    lookup = 'lt' if descending else 'gt'
+
+    queryset = queryset.order_by(sort_by, '-id' if descending else 'id')
+
+    position = decode_cursor(cursor)
+    if position is not None:
+        value, pk = position
+        try:
+            queryset = queryset.filter(
+                models.Q(**{f'{field}__{lookup}': value}) |
+                models.Q(**{field: value, f'id__{lookup}': pk})
+            )
+        except (ValueError, TypeError, ValidationError):
+            # Значение курсора не подходит к полю сортировки (например, курсор от другой
+            # сортировки) - показываем первую страницу.
+            pass
+
+    # Берем на одну запись больше, чтобы узнать, есть ли следующая страница.
+    items = list(queryset[:page_size + 1])
+    if len(items) <= page_size:
+        return items, None
+
+    items = items[:page_size]
+    last = items[-1]
+    return items, encode_cursor(getattr(last, field), last.pk)
@@ -0,0 +1,254 @@
+import threading
+from datetime import timedelta
+
+from django.db import router
+
+from .caching import get_catalogue_version
+from .models import Recipe, RecipeIngredient
+from .timing import timed
+
+
+# ==============================================================================
+# Поиск рецептов по имеющимся продуктам ("что приготовить из того, что есть")
+# ==============================================================================
+# Состав рецептов каталога хранится в памяти процесса в виде обратного индекса
+# {ингредиент: рецепты}. Для набора продуктов пользователя по индексу считается,
+# сколько ингредиентов каждого рецепта есть в наличии, без обхода всего каталога
+# и без запросов к базе.
+#
+# При смене версии каталога индекс не загружается заново, а обновляется только
+# для измененных рецептов: новых (id нет в индексе), удаленных (id нет в базе) и
+# измененных с момента загрузки (Recipe.updated_at, см. signals.touch_recipes).
+# Обновление строит новый объект индекса, а ссылка на него подменяется одним
+# присваиванием, поэтому поиск в других потоках не блокируется.
+#
+# updated_at проставляется при записи, а видна строка становится только после
+# фиксации транзакции, поэтому рецепт может попасть в базу с отметкой раньше
+# last_updated уже загруженного индекса. Такие рецепты не теряются: при обновлении
+# заново загружаются все рецепты, измененные не раньше last_updated - UPDATED_AT_MARGIN.
+# Индекс хранится до следующего изменения каталога, поэтому, как и снимок каталога,
+# загружается из основной базы, а не из реплики.
+
+# Запас для отметок времени, зафиксированных позже загрузки индекса (длиннее самой долгой транзакции).
+UPDATED_AT_MARGIN = timedelta(minutes=5)
+
+class PantryMatch:
+    """Рецепт в результатах поиска: сколько его ингредиентов есть и каких не хватает."""
+
+    __slots__ = ('recipe_id', 'matched', 'missing')
+
+    def __init__(self, recipe_id, matched, missing):
+        self.recipe_id = recipe_id
+        self.matched = matched
+        # frozenset id недостающих ингредиентов.
+        self.missing = missing
+
+    @property
+    def total(self):
+        return self.matched + len(self.missing)
+
+    def __repr__(self):
+        return f'<PantryMatch {self.recipe_id}: {self.matched}/{self.total}>'
+
+
+class PantryIndex:
+    """
+    Неизменяемый обратный индекс состава рецептов каталога.
+
+    Атрибуты:
+        version: версия каталога, которой соответствует индекс.
+        last_updated: наибольшее Recipe.updated_at среди загруженных рецептов.
+        recipe_ingredients (dict): {id рецепта: frozenset id ингредиентов}.
+        recipes_by_ingredient (dict): {id ингредиента: frozenset id рецептов}.
+        recipes_by_size (dict): {число ингредиентов: frozenset id рецептов}.
+    """
+
+    def __init__(self, version, last_updated, recipe_ingredients, recipes_by_ingredient, recipes_by_size):
+        self.version = version
+        self.last_updated = last_updated
+        self.recipe_ingredients = recipe_ingredients
+        self.recipes_by_ingredient = recipes_by_ingredient
+        self.recipes_by_size = recipes_by_size
+
+    @classmethod
+    def from_recipes(cls, version, last_updated, recipe_ingredients):
+        """Строит индекс по составу рецептов {id рецепта: frozenset id ингредиентов}."""
+        recipes_by_ingredient = {}
+        recipes_by_size = {}
+        for recipe_id, ingredient_ids in recipe_ingredients.items():
+            recipes_by_size.setdefault(len(ingredient_ids), set()).add(recipe_id)
+            for ingredient_id in ingredient_ids:
+                recipes_by_ingredient.setdefault(ingredient_id, set()).add(recipe_id)
+        return cls(
+            version, last_updated, recipe_ingredients,
+            {key: frozenset(value) for key, value in recipes_by_ingredient.items()},
+            {key: frozenset(value) for key, value in recipes_by_size.items()},
+        )
+
+    def search(self, ingredient_ids, max_missing=0):
+        """
+        Рецепты, которые можно приготовить из ингредиентов ingredient_ids,
+        докупив не более max_missing ингредиентов.
+
+        Возвращает:
+            list: PantryMatch, сначала рецепты с меньшим числом недостающих ингредиентов,
+            при равенстве - с большим числом имеющихся.
+        """
+        pantry = frozenset(ingredient_ids)
+        counts = {}
+        for ingredient_id in pantry:
+            for recipe_id in self.recipes_by_ingredient.get(ingredient_id, ()):
+                counts[recipe_id] = counts.get(recipe_id, 0) + 1
+
+        ranked = []
+        for recipe_id, matched in counts.items():
+            missing = len(self.recipe_ingredients[recipe_id]) - matched
+            if missing <= max_missing:
+                ranked.append((missing, -matched, recipe_id))
+        # Рецепты, в которых нет ни одного имеющегося ингредиента, но всего их не больше max_missing.
+        for size in range(1, max_missing + 1):
+            for recipe_id in self.recipes_by_size.get(size, ()):
+                if recipe_id not in counts:
+                    ranked.append((size, 0, recipe_id))
+        ranked.sort()
+
+        return [
+            PantryMatch(recipe_id, -negative_matched, self.recipe_ingredients[recipe_id] - pantry)
+            for _, negative_matched, recipe_id in ranked
+        ]
+
+    def refreshed(self, version):
+        """
+        Новый индекс для версии каталога version: заново загружается состав только новых
+        и измененных рецептов (с запасом UPDATED_AT_MARGIN), удаленные рецепты убираются
+        (не больше четырех запросов).
+        Множества обратного индекса пересобираются только для затронутых ингредиентов.
+        """
+        current_ids = set(_catalogue_recipes().values_list('id', flat=True))
+        changed_ids = current_ids - self.recipe_ingredients.keys()
+        if self.last_updated is not None:
+            changed_ids |= set(
+                _catalogue_recipes()
+                .filter(updated_at__gte=self.last_updated - UPDATED_AT_MARGIN)
+                .values_list('id', flat=True)
+            )
+        removed_ids = (self.recipe_ingredients.keys() - current_ids) | (changed_ids & self.recipe_ingredients.keys())
+
+        loaded, last_updated = _load_recipe_ingredients(changed_ids) if changed_ids else ({}, None)
+        if self.last_updated is not None and (last_updated is None or self.last_updated > last_updated):
+            last_updated = self.last_updated
+
+        recipe_ingredients = dict(self.recipe_ingredients)
+        by_ingredient = _IndexUpdate(self.recipes_by_ingredient)
+        by_size = _IndexUpdate(self.recipes_by_size)
+        for recipe_id in removed_ids:
+            ingredient_ids = recipe_ingredients.pop(recipe_id)
+            by_size.discard(len(ingredient_ids), recipe_id)
+            for ingredient_id in ingredient_ids:
+                by_ingredient.discard(ingredient_id, recipe_id)
+        for recipe_id, ingredient_ids in loaded.items():
+            recipe_ingredients[recipe_id] = ingredient_ids
+            by_size.add(len(ingredient_ids), recipe_id)
+            for ingredient_id in ingredient_ids:
+                by_ingredient.add(ingredient_id, recipe_id)
+
+        return PantryIndex(version, last_updated, recipe_ingredients, by_ingredient.result(), by_size.result())
+
+
+class _IndexUpdate:
+    """Копия словаря {ключ: frozenset}, в которой изменяются только затронутые множества."""
+
+    def __init__(self, mapping):
+        self.mapping = mapping
+        self.touched = {}
+
+    def _bucket(self, key):
+        bucket = self.touched.get(key)
+        if bucket is None:
+            bucket = self.touched[key] = set(self.mapping.get(key, ()))
+        return bucket
+
+    def add(self, key, value):
+        self._bucket(key).add(value)
+
+    def discard(self, key, value):
+        self._bucket(key).discard(value)
+
+    def result(self):
+        if not self.touched:
+            return self.mapping
+        mapping = dict(self.mapping)
+        for key, bucket in self.touched.items():
+            if bucket:
+                mapping[key] = frozenset(bucket)
+            else:
+                mapping.pop(key, None)
+        return mapping
+
+
+def _catalogue_recipes():
+    """Рецепты (из основной базы), участвующие в поиске: как и в каталоге, без "простых ингредиентов"."""
+    return Recipe.objects.using(router.db_for_write(Recipe)).filter(is_simple_ingredient=False)
+
+
+def _load_recipe_ingredients(recipe_ids=None):
+    """
+    Состав рецептов (всех рецептов каталога или только recipe_ids).
+
+    Возвращает:
+        tuple: ({id рецепта: frozenset id ингредиентов}, наибольшее updated_at или None).
+    """
+    recipes = _catalogue_recipes()
+    links = RecipeIngredient.objects.using(recipes.db).filter(recipe__is_simple_ingredient=False)
+    if recipe_ids is not None:
+        recipes = recipes.filter(id__in=recipe_ids)
+        links = links.filter(recipe_id__in=recipe_ids)
+
+    recipe_ingredients = {}
+    last_updated = None
+    for recipe_id, updated_at in recipes.values_list('id', 'updated_at'):
+        recipe_ingredients[recipe_id] = set()
+        if last_updated is None or updated_at > last_updated:
+            last_updated = updated_at
+
+    for recipe_id, ingredient_id in links.values_list('recipe_id', 'ingredient_id'):
+        recipe_ingredients.setdefault(recipe_id, set()).add(ingredient_id)
+    return {key: frozenset(value) for key, value in recipe_ingredients.items()}, last_updated
+
+
+def build_pantry_index(version=None):
+    """Загружает индекс состава всех рецептов каталога (два запроса)."""
+    if version is None:
+        version = get_catalogue_version()
+    recipe_ingredients, last_updated = _load_recipe_ingredients()
+    return PantryIndex.from_recipes(version, last_updated, recipe_ingredients)
+
+
+_lock = threading.Lock()
+_index = None
+
+
+def get_pantry_index():
+    """
+    Возвращает индекс состава рецептов текущей версии каталога: при первом обращении
+    он загружается целиком, а при смене версии обновляется только по измененным рецептам.
+    """
+    global _index
+    version = get_catalogue_version()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+
+    with _lock:
+        if _index is None:
+            with timed('pantry_index'):
+                _index = build_pantry_index(version)
+        elif _index.version != version:
+            with timed('pantry_index'):
+                _index = _index.refreshed(version)
+        return _index
+
+
+def search_pantry(ingredient_ids, max_missing=0):
+    """Поиск рецептов по имеющимся ингредиентам (см. PantryIndex.search)."""
+    return get_pantry_index().search(ingredient_ids, max_missing)
@@ -0,0 +1,90 @@
+import random
+
+from django.conf import settings
+
+from .generator import DEFAULT_MEAL_LAYOUT, layout_meal_types, score_meal_plan, search_meal_plan_random
+from .workers import get_process_pool
+
+
+# ==============================================================================
+# Случайный поиск с перезапусками в нескольких процессах
+# ==============================================================================
+# Общее число попыток делится между независимыми перезапусками случайного поиска
+# (generator.search_meal_plan_random), у каждого - свое зерно, полученное из rng.
+# Перезапуски распределяются по процессам, и из их результатов выбирается план с
+# наименьшим штрафом (при равенстве - перезапуск с меньшим номером). Поэтому при
+# одинаковом seed результат не зависит от числа процессов.
+# В процессы передаются только КБЖУ рецептов (кортежи целых чисел), а не сами рецепты.
+
+def _run_restarts(values, target_calories, nutrition_targets, layout, restarts):
+    """
+    Выполняет перезапуски поиска в текущем процессе.
+
+    Параметры:
+        values (dict): {тип рецептов: [КБЖУ рецепта в сотых долях, ...]}.
+        restarts (list): [(номер перезапуска, зерно, число попыток), ...].
+
+    Возвращает:
+        list: [(штраф, номер перезапуска, {слот: (индекс рецепта, порции)}), ...]
+        для перезапусков, нашедших план.
+    """
+    candidates = {
+        meal_type: [{'index': index, 'values': recipe_values} for index, recipe_values in enumerate(meal_values)]
+        for meal_type, meal_values in values.items()
+    }
+    results = []
+    for number, seed, attempts in restarts:
+        meal_plan = search_meal_plan_random(
+            candidates, target_calories, nutrition_targets, rng=random.Random(seed), number_of_attempts=attempts,
+            layout=layout,
+        )
+        if meal_plan:
+            choice = {slot: (data['recipe_data']['index'], data['servings']) for slot, data in meal_plan.items()}
+            results.append((score_meal_plan(meal_plan, target_calories, layout), number, choice))
+    return results
+
+
+def search_meal_plan_parallel(candidates, target_calories, nutrition_targets, rng=None,
+                              restarts=None, attempts=None, workers=None, layout=DEFAULT_MEAL_LAYOUT):
+    """
+    Случайный поиск для слотов layout с restarts независимыми перезапусками, между которыми
+    делятся attempts попыток, в workers процессах (по умолчанию - настройки MEAL_PLAN_PARALLEL_*).
+    При workers = 1 перезапуски выполняются в текущем процессе.
+
+    Возвращает:
+        dict | None: план в формате find_best_meal_plan (без финальной проверки отклонения).
+    """
+    if rng is None:
+        rng = random
+    restarts = max(1, restarts or settings.MEAL_PLAN_PARALLEL_RESTARTS)
+    attempts = attempts or settings.MEAL_PLAN_PARALLEL_ATTEMPTS
+    workers = max(1, min(workers or settings.MEAL_PLAN_PARALLEL_WORKERS, restarts))
+
+    meal_types = layout_meal_types(layout)
+    if not all(candidates[meal_type] for meal_type in meal_types):
+        return None
+
+    # Зерна перезапусков берутся из rng до распределения по процессам.
+    jobs = [
+        (number, rng.getrandbits(64), attempts // restarts + (number < attempts % restarts))
+        for number in range(restarts)
+    ]
+    values = {meal_type: [data['values'] for data in candidates[meal_type]] for meal_type in meal_types}
+
+    if workers == 1:
+        results = _run_restarts(values, target_calories, nutrition_targets, layout, jobs)
+    else:
+        pool = get_process_pool()
+        futures = [
+            pool.submit(_run_restarts, values, target_calories, nutrition_targets, layout, jobs[worker::workers])
+            for worker in range(workers)
+        ]
+        results = [result for future in futures for result in future.result()]
+
+    if not results:
+        return None
+    _, _, choice = min(results, key=lambda result: result[:2])
+    return {
+        slot: {'recipe_data': candidates[meal_type][choice[slot][0]], 'servings': choice[slot][1]}
+        for slot, meal_type, _ in layout
+    }
@@ -0,0 +1,106 @@
+import contextvars
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .caching import get_catalogue_version
+
+
+# ==============================================================================
+# Чтение из реплики базы данных
+# ==============================================================================
+# Если в DATABASES задана реплика (алиас DATABASE_REPLICA_ALIAS), view, отмеченные
+# декоратором replica_reads, читают из нее, а запись всегда идет в основную базу.
+# Решение принимает ReplicaRoutingMiddleware (см. middleware.py) для каждого запроса;
+# вне запросов (команды, фоновые задачи) и в остальных view все запросы идут в основную базу.
+#
+# Реплика отстает от основной базы, поэтому чтение из нее отключается на
+# DATABASE_REPLICA_STICKY_SECONDS секунд:
+#   - для клиента, который сам что-то изменил (например, в админке): middleware ставит
+#     cookie, и клиент сразу видит свои изменения ("read-your-writes"). Учитываются только
+#     запросы, которые изменяют данные (POST, PUT, PATCH, DELETE): попутные записи при
+#     чтении (например, сохранение сессии) не отключают реплику для клиента;
+#   - для всех, если изменился каталог (версия каталога - время изменения, см. caching.py):
+#     страницы и снимок каталога, которые кэшируются до следующего изменения, строятся
+#     по основной базе, а не по отставшей реплике.
+
+# Cookie клиента, который недавно изменял данные и читает из основной базы.
+STICKY_COOKIE = 'db_primary'
+# Методы, которые не изменяют данные: запись во время таких запросов не ставит cookie.
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_current_routing = contextvars.ContextVar('recipes_db_routing', default=None)
+
+
+class DatabaseRouting:
+    """Состояние маршрутизации запроса: база для чтения, учитывать ли запись и была ли она."""
+
+    __slots__ = ('read_alias', 'track_writes', 'wrote')
+
+    def __init__(self, track_writes=True):
+        self.read_alias = None
+        self.track_writes = track_writes
+        self.wrote = False
+
+
+def start_db_routing(track_writes=True):
+    """
+    Начинает маршрутизацию для текущего запроса. Возвращает состояние и токен для stop_db_routing.
+
+    Аргументы:
+        track_writes (bool): отмечать запись в состоянии (запрос изменяет данные).
+    """
+    routing = DatabaseRouting(track_writes)
+    return routing, _current_routing.set(routing)
+
+
+def stop_db_routing(token):
+    _current_routing.reset(token)
+
+
+def get_db_routing():
+    """Состояние маршрутизации текущего запроса или None (вне запроса)."""
+    return _current_routing.get()
+
+
+def replica_alias():
+    """Алиас реплики или None, если реплика не настроена."""
+    alias = settings.DATABASE_REPLICA_ALIAS
+    return alias if alias and alias in settings.DATABASES else None
+
+
+def replica_is_current():
+    """Каталог не менялся последние DATABASE_REPLICA_STICKY_SECONDS секунд (реплика успела догнать)."""
+    return time.time_ns() - get_catalogue_version() >= settings.DATABASE_REPLICA_STICKY_SECONDS * 10 ** 9
+
+
+def replica_reads(view):
+    """Разрешает view читать из реплики (запросы GET и HEAD, см. ReplicaRoutingMiddleware)."""
+    view.replica_reads = True
+    return view
+
+
+class ReplicaRouter:
+    """
+    Чтение - из базы, выбранной для текущего запроса (по умолчанию основной),
+    запись - всегда в основную базу. Запись в запросе, который изменяет данные,
+    отмечается в состоянии запроса, чтобы включить для клиента чтение из основной базы.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = _current_routing.get()
+        return routing.read_alias if routing is not None else None
+
+    def db_for_write(self, model, **hints):
+        routing = _current_routing.get()
+        if routing is not None and routing.track_writes:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика содержит те же данные, что и основная база.
+        databases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,101 @@
+from functools import lru_cache
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connections, models, router
+from django.db.models.functions import Cast
+
+from .models import Recipe
+
+# Конфигурация полнотекстового поиска PostgreSQL (стемминг для русского языка).
+SEARCH_CONFIG = 'russian'
+
+
+def is_postgresql(using='default'):
+    """Проверяет, что база данных поддерживает полнотекстовый поиск PostgreSQL."""
+    return connections[using].vendor == 'postgresql'
+
+
+@lru_cache(maxsize=None)
+def has_trigram_extension(using='default'):
+    """
+    Проверяет (один раз на процесс), установлено ли расширение pg_trgm.
+    Без него поиск работает только по поисковому вектору, без учета опечаток.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+# ==============================================================================
+# Поддержка поискового вектора в актуальном состоянии
+# ==============================================================================
+# Вектор строится одним запросом: название (вес A), описание (вес B)
+# и названия всех ингредиентов рецепта (вес C).
+UPDATE_SEARCH_VECTOR_SQL = """
+    UPDATE recipes_recipe AS r SET search_vector =
+        setweight(to_tsvector(%(config)s, coalesce(r.name, '')), 'A') ||
+        setweight(to_tsvector(%(config)s, coalesce(r.description, '')), 'B') ||
+        setweight(to_tsvector(%(config)s, coalesce((
+            SELECT string_agg(i.name, ' ')
+            FROM recipes_recipeingredient AS ri
+            JOIN recipes_ingredient AS i ON i.id = ri.ingredient_id
+            WHERE ri.recipe_id = r.id
+        ), '')), 'C')
+"""
+
+
+def update_search_vectors(recipe_ids=None):
+    """
+    Пересчитывает поле Recipe.search_vector для указанных рецептов (None - для всех).
+    На других СУБД (SQLite в тестах) ничего не делает - там используется запасной поиск.
+    Запись идет в основную базу, даже если текущий запрос читает из реплики.
+    """
+    using = router.db_for_write(Recipe)
+    if not is_postgresql(using):
+        return
+
+    sql = UPDATE_SEARCH_VECTOR_SQL
+    params = {'config': SEARCH_CONFIG}
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+        sql += " WHERE r.id = ANY(%(ids)s)"
+        params['ids'] = recipe_ids
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+# ==============================================================================
+# Поиск рецептов
+# ==============================================================================
+def search_recipes(queryset, query):
+    """
+    Фильтрует рецепты по поисковой строке и добавляет аннотацию rank (релевантность).
+
+    PostgreSQL: совпадение по поисковому вектору (GIN-индекс) или триграммная схожесть
+    названия для запросов с опечатками (индекс pg_trgm, порог pg_trgm.similarity_threshold,
+    если расширение установлено) - без JOIN-ов и DISTINCT.
+    Релевантность - сумма ts_rank и схожести названия.
+    Другие СУБД: поиск подстроки в названии, описании и ингредиентах, релевантность одинакова.
+    """
+    if is_postgresql(queryset.db):
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        rank = SearchRank(models.F('search_vector'), search_query)
+        condition = models.Q(search_vector=search_query)
+        if has_trigram_extension(queryset.db):
+            rank = rank + TrigramSimilarity('name', query)
+            condition |= models.Q(name__trigram_similar=query)
+        # ts_rank возвращает real; приводим к double precision, чтобы значение в курсоре
+        # постраничного вывода совпадало со значением в базе без потери точности.
+        return queryset.annotate(rank=Cast(rank, models.FloatField())).filter(condition)
+
+    matching_ids = Recipe.objects.filter(
+        models.Q(name__icontains=query) |
+        models.Q(description__icontains=query) |
+        models.Q(ingredients__name__icontains=query)
+    ).values('id')
+    return queryset.filter(id__in=matching_ids).annotate(
+        rank=models.Value(1.0, output_field=models.FloatField())
+    )
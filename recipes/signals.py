@@ -0,0 +1,192 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .caching import bump_catalogue_version
+from .models import Diet, Ingredient, IngredientGroup, Recipe, RecipeIngredient, RecipeNutrition
+from .search import update_search_vectors
+from .thumbnails import DIET_ICON_PRESETS, RECIPE_IMAGE_PRESETS, ensure_thumbnails
+from .utils import update_recipe_nutrition
+
+
+# ==============================================================================
+# Поддержка таблицы RecipeNutrition в актуальном состоянии
+# ==============================================================================
+# При загрузке фикстур (raw=True) сигналы пропускаются: после loaddata
+# таблицу нужно пересобрать командой `python manage.py rebuild_nutrition`.
+
+def _is_recipe_deletion(origin):
+    """Проверяет, что удаление началось с самого рецепта (его КБЖУ удаляется каскадом)."""
+    if isinstance(origin, Recipe):
+        return True
+    return isinstance(origin, QuerySet) and origin.model is Recipe
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(sender, instance, raw=False, **kwargs):
+    """Ингредиент добавлен в рецепт или изменен его вес - пересчитываем рецепт."""
+    if raw:
+        return
+    update_recipe_nutrition(instance.recipe)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(sender, instance, origin=None, **kwargs):
+    """Ингредиент убран из рецепта - пересчитываем рецепт, если он сам не удаляется."""
+    if _is_recipe_deletion(origin):
+        return
+    update_recipe_nutrition(instance.recipe)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created=False, raw=False, **kwargs):
+    """Изменилось КБЖУ ингредиента - пересчитываем только рецепты, в которые он входит."""
+    if raw or created:
+        return
+    for recipe in Recipe.objects.filter(ingredients=instance).prefetch_related('recipeingredient_set__ingredient'):
+        update_recipe_nutrition(recipe)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    """
+    Изменилось количество порций - пересчитываем значения на порцию по сохраненным суммам,
+    не обходя ингредиенты заново.
+    """
+    if raw:
+        return
+    if update_fields is not None and 'servings' not in update_fields:
+        return
+
+    recipe_nutrition = None if created else RecipeNutrition.objects.filter(recipe=instance).first()
+    if recipe_nutrition is None:
+        update_recipe_nutrition(instance)
+        return
+
+    totals = {
+        'total_calories': recipe_nutrition.total_calories,
+        'total_proteins': recipe_nutrition.total_proteins,
+        'total_fats': recipe_nutrition.total_fats,
+        'total_carbs': recipe_nutrition.total_carbs,
+    }
+    update_recipe_nutrition(instance, totals=totals)
+
+
+# ==============================================================================
+# Поддержка поискового вектора Recipe.search_vector
+# ==============================================================================
+# После loaddata вектор пересобирается командой `python manage.py rebuild_search_vectors`.
+
+@receiver(post_save, sender=Recipe)
+def recipe_search_fields_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not {'name', 'description'} & set(update_fields):
+        return
+    update_search_vectors([instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_search_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    update_search_vectors([instance.recipe_id])
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_search_deleted(sender, instance, origin=None, **kwargs):
+    if _is_recipe_deletion(origin):
+        return
+    update_search_vectors([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_search_saved(sender, instance, created=False, raw=False, **kwargs):
+    """Переименование ингредиента меняет вектор всех рецептов, в которые он входит."""
+    if raw or created:
+        return
+    update_search_vectors(RecipeIngredient.objects.filter(ingredient=instance).values_list('recipe_id', flat=True))
+
+
+# ==============================================================================
+# Отметка времени изменения рецепта (Recipe.updated_at)
+# ==============================================================================
+# Сам рецепт обновляет отметку при сохранении (auto_now), а изменения его
+# ингредиентов (состав, вес, КБЖУ ингредиента) проставляют ее отдельным запросом.
+
+def touch_recipes(recipe_ids):
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_touch_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    touch_recipes([instance.recipe_id])
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_touch_deleted(sender, instance, origin=None, **kwargs):
+    if _is_recipe_deletion(origin):
+        return
+    touch_recipes([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_touch_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    touch_recipes(RecipeIngredient.objects.filter(ingredient=instance).values('recipe_id'))
+
+
+# ==============================================================================
+# Уменьшенные копии изображений (см. thumbnails.py)
+# ==============================================================================
+# Копии создаются сразу после загрузки изображения; уже созданные не пересоздаются.
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    ensure_thumbnails(instance.image.name, RECIPE_IMAGE_PRESETS, storage=instance.image.storage)
+
+
+@receiver(post_save, sender=Diet)
+def diet_icon_saved(sender, instance, raw=False, **kwargs):
+    if raw or not instance.icon:
+        return
+    ensure_thumbnails(instance.icon.name, DIET_ICON_PRESETS, storage=instance.icon.storage)
+
+
+# ==============================================================================
+# Инвалидация кэша планов питания
+# ==============================================================================
+# Любое изменение каталога (в том числе при загрузке фикстур) меняет его версию,
+# после чего ранее составленные планы больше не используются.
+#
+# Версия меняется после фиксации транзакции, а не при сохранении: иначе запрос,
+# пришедший до фиксации, построил бы планы, счетчики и страницы по старым данным и
+# сохранил их в кэш под новой версией - до следующего изменения каталога.
+# При откате транзакции версия не меняется.
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Diet)
+@receiver(post_delete, sender=Diet)
+@receiver(post_save, sender=IngredientGroup)
+@receiver(post_delete, sender=IngredientGroup)
+def catalogue_changed(sender, using=None, **kwargs):
+    transaction.on_commit(bump_catalogue_version, using=using)
+
+
+@receiver(m2m_changed, sender=Recipe.diets.through)
+@receiver(m2m_changed, sender=IngredientGroup.ingredients.through)
+def catalogue_links_changed(sender, action, using=None, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(bump_catalogue_version, using=using)
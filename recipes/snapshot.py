@@ -0,0 +1,314 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.db import router
+
+from .caching import get_catalogue_version
+from .fixedpoint import NUTRIENTS, to_fixed
+from .generator import MEAL_TYPES
+from .models import IngredientGroup, Recipe, RecipeIngredient
+from .timing import timed
+
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# Снимок каталога в памяти процесса
+# ==============================================================================
+# Для генератора из каталога нужны только id, прием пищи, КБЖУ на порцию и диеты
+# рецепта. Эти данные один раз на процесс загружаются в компактные записи, и
+# генератор подбирает кандидатов для диеты по битовой маске без обращений к базе.
+# Снимок неизменяем: при смене версии каталога (см. caching.py) строится новый
+# снимок, и ссылка на него подменяется одним присваиванием.
+#
+# Снимок хранится до следующего изменения каталога, поэтому строится по основной
+# базе (router.db_for_write), а не по реплике: отставшая реплика закрепила бы
+# старые данные за новой версией каталога.
+
+class CatalogueRecipe:
+    """Компактная запись о рецепте в снимке каталога."""
+
+    __slots__ = ('id', 'name', 'meal_type', 'values', 'diet_mask')
+
+    def __init__(self, id, name, meal_type, values, diet_mask):
+        self.id = id
+        self.name = name
+        self.meal_type = meal_type
+        # КБЖУ на порцию в сотых долях: (калории, белки, жиры, углеводы), см. fixedpoint.py.
+        self.values = values
+        self.diet_mask = diet_mask
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __repr__(self):
+        return f'<CatalogueRecipe {self.id}: {self.name}>'
+
+
+class CatalogueSnapshot:
+    """
+    Неизменяемый снимок каталога для генератора.
+
+    Атрибуты:
+        version: версия каталога, по которой построен снимок.
+        recipes (tuple): записи CatalogueRecipe.
+        diet_bits (dict): {id диеты: бит в маске diet_mask}.
+    """
+
+    def __init__(self, version, recipes, diet_bits):
+        self.version = version
+        self.recipes = recipes
+        self.diet_bits = diet_bits
+        self._diet_candidates = {}
+        self._ingredient_index = None
+        self._ingredient_index_lock = threading.Lock()
+
+    def ingredient_index(self):
+        """
+        Обратный индекс состава рецептов (см. IngredientIndex). Нужен только для исключения
+        ингредиентов, поэтому загружается при первом обращении, а не вместе со снимком.
+        """
+        if self._ingredient_index is None:
+            with self._ingredient_index_lock:
+                if self._ingredient_index is None:
+                    self._ingredient_index = build_ingredient_index()
+        return self._ingredient_index
+
+    def candidates_for_diet(self, diet_id):
+        """
+        Кандидаты для генератора (в формате generator.prepare_meal_candidates, без Decimal-поля
+        'nutrition') из рецептов диеты. Результат запоминается для каждой диеты.
+        """
+        candidates = self._diet_candidates.get(diet_id)
+        if candidates is None:
+            bit = self.diet_bits.get(diet_id, 0)
+            candidates = {meal_type: [] for meal_type in MEAL_TYPES}
+            for record in self.recipes:
+                if record.diet_mask & bit and record.values[0] > 0:
+                    meal_type = record.meal_type.lower()
+                    if meal_type in candidates:
+                        candidates[meal_type].append({'recipe': record, 'values': record.values})
+            self._diet_candidates[diet_id] = candidates
+        return candidates
+
+
+def build_catalogue_snapshot(version=None):
+    """Загружает снимок каталога из основной базы (два запроса). Рецепты без рассчитанного КБЖУ пропускаются."""
+    if version is None:
+        version = get_catalogue_version()
+
+    using = router.db_for_write(Recipe)
+    diet_links = list(Recipe.diets.through.objects.using(using).values_list('recipe_id', 'diet_id'))
+    diet_bits = {diet_id: 1 << index for index, diet_id in enumerate(sorted({diet_id for _, diet_id in diet_links}))}
+    masks = {}
+    for recipe_id, diet_id in diet_links:
+        masks[recipe_id] = masks.get(recipe_id, 0) | diet_bits[diet_id]
+
+    value_fields = [f'nutrition__{name}_per_serving' for name in NUTRIENTS]
+    recipes = []
+    skipped = 0
+    rows = Recipe.objects.using(using).values_list('id', 'name', 'meal_type', *value_fields)
+    for recipe_id, name, meal_type, *values in rows:
+        if values[0] is None:
+            # КБЖУ еще не рассчитано (например, после loaddata без rebuild_nutrition). Снимок
+            # строится во время чтения страниц, поэтому не пересчитывает его сам, а пропускает рецепт.
+            skipped += 1
+            continue
+        recipes.append(CatalogueRecipe(
+            recipe_id, name, meal_type, tuple(to_fixed(value) for value in values), masks.get(recipe_id, 0)
+        ))
+
+    if skipped:
+        logger.warning(
+            "Рецептов без рассчитанного КБЖУ: %d, в снимок каталога они не вошли "
+            "(выполните `python manage.py rebuild_nutrition`).", skipped,
+        )
+    return CatalogueSnapshot(version, tuple(recipes), diet_bits)
+
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+def get_catalogue_snapshot():
+    """
+    Возвращает снимок каталога текущей версии. Снимок строится при первом обращении
+    и перестраивается (одним потоком), когда версия каталога меняется.
+    """
+    global _snapshot
+    version = get_catalogue_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            with timed('snapshot'):
+                _snapshot = build_catalogue_snapshot(version)
+        return _snapshot
+
+
+# ==============================================================================
+# Исключение ингредиентов и групп ингредиентов
+# ==============================================================================
+class IngredientIndex:
+    """
+    Обратный индекс состава рецептов: для каждого ингредиента - множество рецептов,
+    в которые он входит, для каждой группы - множество ее ингредиентов. Рецепты,
+    содержащие исключенные ингредиенты, находятся объединением множеств, без
+    отдельного JOIN на каждый ингредиент или группу.
+    """
+
+    def __init__(self, recipes_by_ingredient, ingredients_by_group):
+        self.recipes_by_ingredient = recipes_by_ingredient
+        self.ingredients_by_group = ingredients_by_group
+
+    def expand(self, ingredient_ids=(), group_ids=()):
+        """Исключенные ингредиенты вместе с ингредиентами исключенных групп."""
+        ingredients = set(ingredient_ids)
+        for group_id in group_ids:
+            ingredients |= self.ingredients_by_group.get(group_id, frozenset())
+        return ingredients
+
+    def recipes_containing(self, ingredient_ids=(), group_ids=()):
+        """id рецептов, содержащих хотя бы один из ингредиентов или ингредиент из групп."""
+        recipe_ids = set()
+        for ingredient_id in self.expand(ingredient_ids, group_ids):
+            recipe_ids |= self.recipes_by_ingredient.get(ingredient_id, frozenset())
+        return recipe_ids
+
+
+def build_ingredient_index():
+    """Загружает из основной базы обратный индекс состава рецептов и групп ингредиентов (два запроса)."""
+    using = router.db_for_write(RecipeIngredient)
+    recipes_by_ingredient = {}
+    for ingredient_id, recipe_id in RecipeIngredient.objects.using(using).values_list('ingredient_id', 'recipe_id'):
+        recipes_by_ingredient.setdefault(ingredient_id, set()).add(recipe_id)
+
+    ingredients_by_group = {}
+    memberships = (
+        IngredientGroup.ingredients.through.objects.using(using).values_list('ingredientgroup_id', 'ingredient_id')
+    )
+    for group_id, ingredient_id in memberships:
+        ingredients_by_group.setdefault(group_id, set()).add(ingredient_id)
+
+    return IngredientIndex(
+        {key: frozenset(value) for key, value in recipes_by_ingredient.items()},
+        {key: frozenset(value) for key, value in ingredients_by_group.items()},
+    )
+
+
+def expand_excluded_ingredients(ingredient_ids=(), group_ids=()):
+    """
+    Исключенные ингредиенты вместе с ингредиентами исключенных групп - для фильтра каталога
+    (RecipeQuerySet.without_ingredients). Без снимка каталога группы раскрываются одним запросом.
+    """
+    if not group_ids:
+        return set(ingredient_ids)
+    if settings.CATALOGUE_SNAPSHOT_ENABLED:
+        return get_catalogue_snapshot().ingredient_index().expand(ingredient_ids, group_ids)
+    memberships = IngredientGroup.ingredients.through.objects.filter(ingredientgroup_id__in=group_ids)
+    return set(ingredient_ids) | set(memberships.values_list('ingredient_id', flat=True))
+
+
+def exclude_candidates(candidates, recipe_ids):
+    """Кандидаты без рецептов recipe_ids (множество id); исходный словарь не изменяется."""
+    if not recipe_ids:
+        return candidates
+    return {
+        meal_type: [candidate for candidate in items if candidate['recipe'].pk not in recipe_ids]
+        for meal_type, items in candidates.items()
+    }
+
+
+# ==============================================================================
+# Кандидаты для генератора
+# ==============================================================================
+def load_diet_candidates(diet_id):
+    """
+    Кандидаты для генератора по рецептам диеты одним запросом к базе, без снимка каталога.
+
+    Рецепты выбираются через индекс (diet, recipe) промежуточной таблицы диет, КБЖУ берется
+    из таблицы RecipeNutrition в том же запросе, а строки приходят упорядоченными по приему
+    пищи и раскладываются по "корзинам" за один проход. Рецепты без рассчитанного КБЖУ
+    (например, после loaddata без rebuild_nutrition) и с нулевой калорийностью пропускаются.
+    """
+    value_fields = [f'nutrition__{name}_per_serving' for name in NUTRIENTS]
+    rows = (
+        Recipe.objects
+        .filter(diets=diet_id, nutrition__calories_per_serving__gt=0)
+        .order_by('meal_type', 'id')
+        .values_list('id', 'name', 'meal_type', *value_fields)
+    )
+    candidates = {meal_type: [] for meal_type in MEAL_TYPES}
+    for recipe_id, name, meal_type, *values in rows:
+        bucket = candidates.get(meal_type.lower())
+        if bucket is not None:
+            values = tuple(to_fixed(value) for value in values)
+            bucket.append({'recipe': CatalogueRecipe(recipe_id, name, meal_type, values, 0), 'values': values})
+    return candidates
+
+
+def get_diet_candidates(diet_id, excluded_ingredients=(), excluded_groups=()):
+    """
+    Кандидаты для генератора по рецептам диеты: из снимка каталога (без запросов к базе)
+    или, если снимок отключен настройкой CATALOGUE_SNAPSHOT_ENABLED, одним запросом к базе.
+    Рецепты с исключенными ингредиентами (или ингредиентами исключенных групп) отбрасываются.
+    """
+    excluding = bool(excluded_ingredients or excluded_groups)
+    if not settings.CATALOGUE_SNAPSHOT_ENABLED:
+        candidates = load_diet_candidates(diet_id)
+        if excluding:
+            excluded = set(
+                RecipeIngredient.objects.filter(
+                    ingredient_id__in=expand_excluded_ingredients(excluded_ingredients, excluded_groups)
+                ).values_list('recipe_id', flat=True)
+            )
+            candidates = exclude_candidates(candidates, excluded)
+        return candidates
+
+    snapshot = get_catalogue_snapshot()
+    candidates = snapshot.candidates_for_diet(diet_id)
+    if excluding:
+        with timed('exclusions'):
+            excluded = snapshot.ingredient_index().recipes_containing(excluded_ingredients, excluded_groups)
+            candidates = exclude_candidates(candidates, excluded)
+    return candidates
+
+
+# ==============================================================================
+# Подстановка рецептов в план
+# ==============================================================================
+def hydrate_meal_plans(meal_plans):
+    """
+    Заменяет записи снимка в планах на объекты Recipe (одним запросом на все планы),
+    чтобы шаблоны могли использовать изображения и другие поля модели.
+    Планы, уже содержащие объекты Recipe, и None остаются без изменений.
+
+    Возвращает:
+        list: новые планы в том же порядке.
+    """
+    recipe_ids = {
+        data['recipe_data']['recipe'].pk
+        for meal_plan in meal_plans if meal_plan
+        for data in meal_plan.values()
+        if not isinstance(data['recipe_data']['recipe'], Recipe)
+    }
+    if not recipe_ids:
+        return list(meal_plans)
+
+    recipes = Recipe.objects.only('id', 'name', 'meal_type', 'image').in_bulk(recipe_ids)
+
+    hydrated = []
+    for meal_plan in meal_plans:
+        if meal_plan:
+            meal_plan = {
+                meal_type: dict(data, recipe_data=dict(
+                    data['recipe_data'], recipe=recipes.get(data['recipe_data']['recipe'].pk, data['recipe_data']['recipe'])
+                ))
+                for meal_type, data in meal_plan.items()
+            }
+        hydrated.append(meal_plan)
+    return hydrated
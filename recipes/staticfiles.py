@@ -0,0 +1,110 @@
+import gzip
+import logging
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # без пакета brotli (см. requirements.txt) создаются только копии .gz
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# Статические файлы: имена с хешем содержимого и заранее сжатые копии
+# ==============================================================================
+# collectstatic копирует файлы в STATIC_ROOT под именами с хешем содержимого
+# (custom.css -> custom.3f2a9c1b7d4e.css) и сохраняет рядом сжатые копии .gz и .br.
+# Имя файла меняется вместе с содержимым, поэтому такие файлы отдаются с заголовком
+# Cache-Control: immutable (см. middleware.StaticFilesMiddleware), а сжатие не
+# выполняется при каждом запросе.
+
+# Расширения файлов, которые имеет смысл сжимать (изображения PNG/JPEG/WebP уже сжаты).
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.ico', '.json', '.txt', '.map', '.xml', '.html')
+# Файлы меньше этого размера (байт) не сжимаются: выигрыш меньше накладных расходов.
+MIN_COMPRESS_SIZE = 256
+# Сжатая копия сохраняется, только если она меньше исходного файла хотя бы на 5%.
+MIN_COMPRESS_RATIO = 0.95
+
+ENCODINGS = {
+    'br': '.br',
+    'gzip': '.gz',
+}
+
+
+def compress_file(path):
+    """
+    Создает рядом с файлом сжатые копии path.gz и (если установлен brotli) path.br.
+
+    Возвращает:
+        list: пути созданных копий.
+    """
+    with open(path, 'rb') as file:
+        content = file.read()
+    if len(content) < MIN_COMPRESS_SIZE:
+        return []
+
+    variants = [(path + ENCODINGS['gzip'], gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((path + ENCODINGS['br'], brotli.compress(content, quality=11)))
+
+    created = []
+    for target, compressed in variants:
+        if len(compressed) <= len(content) * MIN_COMPRESS_RATIO:
+            with open(target, 'wb') as file:
+                file.write(compressed)
+            created.append(target)
+    return created
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage, который после collectstatic создает сжатые копии файлов
+    (и с хешем в имени, и без него).
+
+    До collectstatic (разработка, тесты) манифеста нет: вместо ошибки {% static %}
+    возвращает исходное имя файла и предупреждает об этом в логе. То же при DEBUG,
+    если файла нет в манифесте. В остальных случаях (манифест есть, но устарел)
+    ошибка не скрывается: иначе страницы ссылались бы на файлы без хеша в имени.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._manifest_warning_logged = False
+        self._unhashed_names = set()
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            manifest_missing = not self.manifest_storage.exists(self.manifest_name)
+            if not (settings.DEBUG or manifest_missing):
+                raise
+            if manifest_missing:
+                if not self._manifest_warning_logged:
+                    self._manifest_warning_logged = True
+                    logger.warning(
+                        "Манифест статических файлов %s не найден (выполните `python manage.py collectstatic`): "
+                        "ссылки на статические файлы не содержат хеша.", self.manifest_name,
+                    )
+            elif name not in self._unhashed_names:
+                self._unhashed_names.add(name)
+                logger.warning("Файла %s нет в манифесте статических файлов, ссылка не содержит хеша.", name)
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        if brotli is None:
+            logger.warning("Пакет brotli не установлен: сжатые копии .br не создаются, только .gz.")
+
+        names = set(paths)
+        names.update(self.hashed_files.get(self.hash_key(self.clean_name(name)), name) for name in paths)
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS and self.exists(name):
+                for compressed in compress_file(self.path(name)):
+                    yield name, os.path.relpath(compressed, self.location), True
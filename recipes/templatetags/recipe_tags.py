@@ -1,5 +1,8 @@
 # recipes/templatetags/recipe_tags.py
 from django import template
+from django.utils.html import format_html
+
+from recipes.thumbnails import PRESETS, get_thumbnails, srcset, thumbnail_name
 
 register = template.Library()
 
@@ -8,14 +11,46 @@ def url_transform(context, **kwargs):
     """
     Создает URL-строку с обновленными GET-параметрами.
     Сохраняет все текущие параметры и добавляет/изменяет те, что переданы в тег.
+    Параметр с пустым значением удаляется (например, cursor='' при смене сортировки).
     """
     query = context['request'].GET.copy()
     for key, value in kwargs.items():
-        query[key] = value
+        if value in ('', None):
+            query.pop(key, None)
+        else:
+            query[key] = value
     return query.urlencode()
 
 
 @register.filter
 def get_item(dictionary, key):
     """ Позволяет получать значение из словаря по ключу в шаблоне. """
-    return dictionary.get(key)
\ No newline at end of file
+    return dictionary.get(key)
+
+
+@register.simple_tag
+def responsive_image(image, preset, alt='', css_class='', lazy=True):
+    """
+    Выводит изображение (поле ImageField/FileField) уменьшенными копиями для варианта
+    preset (см. thumbnails.PRESETS): <picture> с WebP и запасным форматом в srcset.
+    Если копий нет (например, для SVG), выводится исходный файл.
+    """
+    loading = 'lazy' if lazy else 'eager'
+    manifest = get_thumbnails(image.name, preset, image.storage)
+    if not manifest['widths']:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">', image.url, alt, css_class, loading,
+        )
+
+    widths, fallback = manifest['widths'], manifest['fallback']
+    sizes = PRESETS[preset]['sizes']
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="{}" decoding="async">'
+        '</picture>',
+        srcset(image.name, preset, 'webp', widths, image.storage), sizes,
+        image.storage.url(thumbnail_name(image.name, preset, widths[0], fallback)),
+        srcset(image.name, preset, fallback, widths, image.storage), sizes,
+        alt, css_class, loading,
+    )
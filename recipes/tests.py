@@ -1,3 +1,1572 @@
-from django.test import TestCase
+import base64
+import gzip
+import json
+import random
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .models import Diet, Ingredient, Recipe, RecipeIngredient
+
+
+def create_recipe(name, meal_type, diet, ingredients, servings=1):
+    """Создает рецепт с ингредиентами: ingredients - список пар (Ingredient, вес в граммах)."""
+    recipe = Recipe.objects.create(
+        name=name,
+        description=f"Описание: {name}",
+        instructions="Смешать и подать.",
+        cooking_time=15,
+        servings=servings,
+        meal_type=meal_type,
+    )
+    recipe.diets.add(diet)
+    for ingredient, weight in ingredients:
+        RecipeIngredient.objects.create(
+            recipe=recipe,
+            ingredient=ingredient,
+            weight_grams=weight,
+            display_amount=str(weight),
+            display_unit="г",
+        )
+    return recipe
+
+
+class CatalogueTestCase(TestCase):
+    """Небольшой каталог: одна диета и по несколько рецептов на каждый прием пищи."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.diet = Diet.objects.create(name="Сбалансированная", default_calories=2000)
+        cls.oats = Ingredient.objects.create(
+            name="Овсянка", calories=Decimal('350'), proteins=Decimal('12'), fats=Decimal('6'), carbs=Decimal('60'))
+        cls.chicken = Ingredient.objects.create(
+            name="Курица", calories=Decimal('165'), proteins=Decimal('31'), fats=Decimal('3.6'), carbs=Decimal('0'))
+        cls.rice = Ingredient.objects.create(
+            name="Рис", calories=Decimal('130'), proteins=Decimal('2.7'), fats=Decimal('0.3'), carbs=Decimal('28'))
+        cls.oil = Ingredient.objects.create(
+            name="Масло оливковое", calories=Decimal('884'), proteins=Decimal('0'), fats=Decimal('100'), carbs=Decimal('0'))
+
+        cls.recipes = []
+        for index in range(3):
+            cls.recipes.append(create_recipe(
+                f"Каша {index}", 'BREAKFAST', cls.diet, [(cls.oats, 100 + index * 10), (cls.oil, 10)]))
+            cls.recipes.append(create_recipe(
+                f"Курица с рисом {index}", 'LUNCH', cls.diet, [(cls.chicken, 200), (cls.rice, 200 + index * 20)]))
+            cls.recipes.append(create_recipe(
+                f"Курица с маслом {index}", 'DINNER', cls.diet, [(cls.chicken, 180 + index * 10), (cls.oil, 15)]))
+
+    def setUp(self):
+        # Кэш планов общий для всех тестов - очищаем, чтобы каждый тест запускал генератор.
+        cache.clear()
+
+    def add_more_recipes(self, count):
+        """Увеличивает каталог, чтобы проверить, что число запросов от него не зависит."""
+        for index in range(count):
+            create_recipe(f"Дополнительный рецепт {index}", 'LUNCH', self.diet, [(self.chicken, 150), (self.rice, 150)])
+
+
+class QueryCountTests(CatalogueTestCase):
+    """Число SQL-запросов на страницах не должно расти вместе с каталогом."""
+
+    def assert_constant_queries(self, expected, request):
+        with self.assertNumQueries(expected):
+            request()
+        self.add_more_recipes(10)
+        cache.clear()
+        with self.assertNumQueries(expected):
+            request()
+
+    def test_index_generation(self):
+        # Сбалансированная диета, остальные диеты, выбранная диета, построение снимка каталога
+        # (рецепты с КБЖУ, диеты рецептов) - кэш очищен, поэтому снимок строится заново -
+        # и группы ингредиентов для формы исключений.
+        url = reverse('recipes:index')
+        self.assert_constant_queries(6, lambda: self.client.post(url, {'diet': self.diet.id, 'calories': 2000}))
+
+    def test_recipe_detail(self):
+        # Время изменения рецепта (ключ кэша), рецепт вместе с КБЖУ, ингредиенты вместе с названиями.
+        url = reverse('recipes:recipe_detail', args=[self.recipes[0].id])
+        self.assert_constant_queries(3, lambda: self.client.get(url))
+
+    def test_recipe_list(self):
+        # Диеты, количество найденных рецептов, страница рецептов, группы ингредиентов.
+        url = reverse('recipes:recipe_list')
+        self.assert_constant_queries(4, lambda: self.client.get(url))
+
+    def test_generator_candidates(self):
+        from .generator import prepare_meal_candidates
+
+        with self.assertNumQueries(1):
+            candidates = prepare_meal_candidates(Recipe.objects.filter(diets=self.diet).with_nutrition_data())
+        self.assertEqual(len(candidates['breakfast']), 3)
+
+
+class RecipeListPaginationTests(CatalogueTestCase):
+    """Постраничный вывод каталога по курсору."""
+
+    def collect_pages(self, params):
+        url = reverse('recipes:recipe_list')
+        names, cursor = [], None
+        while True:
+            query = dict(params, cursor=cursor) if cursor else params
+            response = self.client.get(url, query)
+            names.extend(recipe.name for recipe in response.context['recipes'])
+            cursor = response.context['next_cursor']
+            if not cursor:
+                return names, response.context['total_count']
+
+    def test_pages_cover_catalogue_without_duplicates(self):
+        with self.settings(RECIPE_LIST_PAGE_SIZE=2):
+            for sort in ('name', '-name', 'cooking_time', '-servings'):
+                names, total = self.collect_pages({'sort': sort})
+                self.assertEqual(len(names), len(self.recipes))
+                self.assertEqual(len(set(names)), len(self.recipes))
+                self.assertEqual(total, len(self.recipes))
+
+    def test_order_matches_full_sort(self):
+        with self.settings(RECIPE_LIST_PAGE_SIZE=4):
+            names, _ = self.collect_pages({'sort': '-name'})
+        expected = list(Recipe.objects.order_by('-name', '-id').values_list('name', flat=True))
+        self.assertEqual(names, expected)
+
+    def test_broken_cursor_shows_first_page(self):
+        response = self.client.get(reverse('recipes:recipe_list'), {'sort': 'cooking_time', 'cursor': 'мусор'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['recipes']), len(self.recipes))
+
+    def test_ingredient_autocomplete(self):
+        response = self.client.get(reverse('recipes:ingredient_autocomplete'), {'q': 'Кур'})
+        self.assertEqual(response.json()['results'], [{'id': self.chicken.id, 'name': self.chicken.name}])
+
+
+class RecipeSearchTests(CatalogueTestCase):
+    """Поиск в каталоге (на SQLite работает запасной вариант без полнотекстового индекса)."""
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('recipes:recipe_list'), dict(params, q=query))
+        return [recipe.name for recipe in response.context['recipes']]
+
+    def test_search_by_ingredient_name_has_no_duplicates(self):
+        names = self.search('Масло')
+        self.assertEqual(sorted(names), sorted(r.name for r in self.recipes if r.name.startswith(('Каша', 'Курица с маслом'))))
+
+    def test_search_pages_by_relevance(self):
+        with self.settings(RECIPE_LIST_PAGE_SIZE=2):
+            response = self.client.get(reverse('recipes:recipe_list'), {'q': 'Курица'})
+            self.assertEqual(response.context['current_sort'], '-rank')
+            self.assertEqual(response.context['total_count'], 6)
+            self.assertIsNotNone(response.context['next_cursor'])
+
+    def test_search_vectors_are_written_to_primary(self):
+        from unittest import mock
+
+        from .routers import start_db_routing, stop_db_routing
+        from .search import update_search_vectors
+
+        # Запрос читает из реплики - вектор все равно пересчитывается в основной базе.
+        routing, token = start_db_routing()
+        routing.read_alias = 'replica'
+        try:
+            with mock.patch('recipes.search.is_postgresql', return_value=False) as is_postgresql:
+                update_search_vectors([self.recipes[0].pk])
+        finally:
+            stop_db_routing(token)
+        is_postgresql.assert_called_once_with('default')
+
+
+class IngredientFilterTests(CatalogueTestCase):
+    """Фильтры каталога по ингредиентам: все выбранные, хотя бы один, исключение."""
+
+    def filter_names(self, **params):
+        response = self.client.get(reverse('recipes:recipe_list'), params)
+        return sorted(recipe.name for recipe in response.context['recipes'])
+
+    def expected(self, predicate):
+        return sorted(recipe.name for recipe in self.recipes if predicate(set(recipe.ingredients.all())))
+
+    def test_all_ingredients(self):
+        self.assertEqual(
+            self.filter_names(ingredients=[self.chicken.id, self.oil.id]),
+            self.expected(lambda items: {self.chicken, self.oil} <= items),
+        )
+
+    def test_any_ingredients(self):
+        self.assertEqual(
+            self.filter_names(ingredients=[self.rice.id, self.oats.id], ingredients_mode='any'),
+            self.expected(lambda items: bool({self.rice, self.oats} & items)),
+        )
+
+    def test_exclude_ingredients(self):
+        self.assertEqual(
+            self.filter_names(ingredients=[self.chicken.id], exclude_ingredients=[self.oil.id]),
+            self.expected(lambda items: self.chicken in items and self.oil not in items),
+        )
+
+    def test_single_query_for_many_ingredients(self):
+        ingredient_ids = [self.chicken.id, self.oil.id, self.rice.id, self.oats.id]
+        # Диеты, количество, страница, выбранные ингредиенты, группы - независимо от их числа.
+        with self.assertNumQueries(5):
+            self.client.get(reverse('recipes:recipe_list'), {'ingredients': ingredient_ids})
+
+
+class NutritionFilterTests(CatalogueTestCase):
+    """Фильтры и сортировка каталога по КБЖУ на порцию (в базе, по столбцам RecipeNutrition)."""
+
+    collect_pages = RecipeListPaginationTests.collect_pages
+
+    def per_serving(self, recipe, nutrient):
+        return getattr(recipe.nutrition, f'{nutrient}_per_serving')
+
+    def test_ranges(self):
+        names, total = self.collect_pages({'max_calories': '500', 'min_proteins': '30,5'})
+        expected = [
+            recipe.name for recipe in Recipe.objects.select_related('nutrition').order_by('name', 'id')
+            if recipe.nutrition.calories_per_serving <= 500 and recipe.nutrition.proteins_per_serving >= Decimal('30.5')
+        ]
+        self.assertTrue(expected)
+        self.assertEqual(names, expected)
+        self.assertEqual(total, len(expected))
+
+    def test_invalid_bounds_are_ignored(self):
+        names, _ = self.collect_pages({'max_calories': 'abc', 'min_fats': '-5', 'max_carbs': 'NaN'})
+        self.assertEqual(len(names), len(self.recipes))
+
+    def test_sort_pages_by_nutrient(self):
+        recipes = list(Recipe.objects.select_related('nutrition'))
+        with self.settings(RECIPE_LIST_PAGE_SIZE=2):
+            for sort in ('calories', '-calories', 'proteins', '-carbs'):
+                nutrient, descending = sort.lstrip('-'), sort.startswith('-')
+                names, _ = self.collect_pages({'sort': sort})
+                expected = sorted(recipes, key=lambda r: (self.per_serving(r, nutrient), r.pk), reverse=descending)
+                self.assertEqual(names, [recipe.name for recipe in expected])
+
+    def test_broken_cursor_on_nutrient_shows_first_page(self):
+        # Значение курсора не приводится к Decimal: ValidationError, а не ошибка сервера.
+        cursor = base64.urlsafe_b64encode(json.dumps(['abc', 1]).encode()).decode()
+        with self.settings(RECIPE_LIST_PAGE_SIZE=2):
+            for sort in ('calories', '-calories'):
+                first_page = self.client.get(reverse('recipes:recipe_list'), {'sort': sort})
+                response = self.client.get(reverse('recipes:recipe_list'), {'sort': sort, 'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [recipe.name for recipe in response.context['recipes']],
+                    [recipe.name for recipe in first_page.context['recipes']],
+                )
+
+
+class ExclusionTests(CatalogueTestCase):
+    """Исключение ингредиентов и групп ингредиентов: кандидаты генератора и каталог."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        from .models import IngredientGroup
+
+        cls.fats_group = IngredientGroup.objects.create(name="Масла и жиры")
+        cls.fats_group.ingredients.add(cls.oil)
+
+    def candidate_counts(self, *exclusions):
+        from .snapshot import get_diet_candidates
+
+        candidates = get_diet_candidates(self.diet.pk, *exclusions)
+        return {meal_type: len(items) for meal_type, items in candidates.items()}
+
+    def test_candidates_without_group_and_ingredient(self):
+        expected = {'breakfast': 0, 'lunch': 3, 'dinner': 0, 'snack': 0}
+        self.assertEqual(self.candidate_counts((), (self.fats_group.id,)), expected)
+        self.assertEqual(self.candidate_counts((self.oil.id,), ()), expected)
+        self.assertEqual(self.candidate_counts((self.rice.id,), ())['lunch'], 0)
+        # Исключения не изменяют кандидатов диеты в снимке.
+        self.assertEqual(self.candidate_counts()['breakfast'], 3)
+
+    def test_group_changes_rebuild_index(self):
+        self.assertEqual(self.candidate_counts((), (self.fats_group.id,))['lunch'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fats_group.ingredients.add(self.rice)
+        self.assertEqual(self.candidate_counts((), (self.fats_group.id,))['lunch'], 0)
+
+    @override_settings(CATALOGUE_SNAPSHOT_ENABLED=False)
+    def test_candidates_without_snapshot(self):
+        self.assertEqual(
+            self.candidate_counts((self.chicken.id,), (self.fats_group.id,)),
+            {'breakfast': 0, 'lunch': 0, 'dinner': 0, 'snack': 0},
+        )
+
+    def test_recipe_list_excludes_group(self):
+        response = self.client.get(reverse('recipes:recipe_list'), {'exclude_groups': [self.fats_group.id]})
+        self.assertEqual(
+            sorted(recipe.name for recipe in response.context['recipes']),
+            sorted(recipe.name for recipe in self.recipes if recipe.name.startswith("Курица с рисом")),
+        )
+        self.assertContains(response, f'name="exclude_groups" value="{self.fats_group.id}" checked')
+
+    def test_index_form_keeps_exclusions(self):
+        response = self.client.post(reverse('recipes:index'), {
+            'diet': self.diet.id, 'calories': 2000, 'exclude_groups': [self.fats_group.id],
+        })
+        self.assertEqual(response.context['excluded_groups'], [self.fats_group.id])
+        self.assertIsNone(response.context['meal_plan'])
+
+
+class PantrySearchTests(CatalogueTestCase):
+    """Поиск рецептов по имеющимся продуктам и инкрементальное обновление индекса."""
+
+    def setUp(self):
+        super().setUp()
+        from . import pantry
+
+        # Индекс общий для процесса - каждый тест начинает с загрузки из своей базы.
+        pantry._index = None
+
+    def names(self, matches):
+        recipes = Recipe.objects.in_bulk([match.recipe_id for match in matches])
+        return [recipes[match.recipe_id].name for match in matches]
+
+    def assert_index_matches_database(self, index):
+        from .pantry import build_pantry_index
+
+        expected = build_pantry_index(index.version)
+        self.assertEqual(index.recipe_ingredients, expected.recipe_ingredients)
+        self.assertEqual(index.recipes_by_ingredient, expected.recipes_by_ingredient)
+        self.assertEqual(index.recipes_by_size, expected.recipes_by_size)
+
+    def test_search_ranks_by_missing_ingredients(self):
+        from .pantry import search_pantry
+
+        matches = search_pantry([self.chicken.id, self.rice.id])
+        self.assertEqual(sorted(self.names(matches)), [f"Курица с рисом {index}" for index in range(3)])
+        self.assertTrue(all(match.matched == 2 and not match.missing for match in matches))
+
+        matches = search_pantry([self.chicken.id], max_missing=1)
+        self.assertEqual(len(matches), 6)
+        self.assertEqual({ingredient for match in matches for ingredient in match.missing}, {self.rice.id, self.oil.id})
+        self.assertEqual(search_pantry([self.oats.id], max_missing=0), [])
+
+    def test_index_is_updated_incrementally(self):
+        from .pantry import get_pantry_index
+
+        index = get_pantry_index()
+        lunch = self.recipes[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.create(recipe=lunch, ingredient=self.oil, weight_grams=5)
+            self.recipes[0].delete()
+            added = create_recipe("Рис с маслом", 'DINNER', self.diet, [(self.rice, 200), (self.oil, 10)])
+
+        # Список рецептов, измененные рецепты, их состав и время изменения - без полной загрузки.
+        with self.assertNumQueries(4):
+            refreshed = get_pantry_index()
+        self.assertIsNot(refreshed, index)
+        self.assertIn(lunch.id, refreshed.recipes_by_ingredient[self.oil.id])
+        self.assertNotIn(self.recipes[0].id, refreshed.recipe_ingredients)
+        self.assertEqual(refreshed.recipe_ingredients[added.id], {self.rice.id, self.oil.id})
+        self.assert_index_matches_database(refreshed)
+
+        with self.assertNumQueries(0):
+            self.assertIs(get_pantry_index(), refreshed)
+
+    def test_refresh_picks_up_rows_committed_late(self):
+        from .caching import bump_catalogue_version
+        from .pantry import get_pantry_index
+
+        index = get_pantry_index()
+        lunch = self.recipes[1]
+        # Изменение с отметкой раньше last_updated индекса, зафиксированное после его загрузки.
+        RecipeIngredient.objects.bulk_create([RecipeIngredient(recipe=lunch, ingredient=self.oil, weight_grams=5)])
+        Recipe.objects.filter(pk=lunch.pk).update(updated_at=index.last_updated - timedelta(seconds=1))
+        bump_catalogue_version()
+
+        refreshed = get_pantry_index()
+        self.assertIn(lunch.id, refreshed.recipes_by_ingredient[self.oil.id])
+        self.assert_index_matches_database(refreshed)
+
+    def test_pantry_page(self):
+        response = self.client.get(
+            reverse('recipes:pantry'), {'ingredients': [self.chicken.id, self.oil.id, 'x'], 'max_missing': 1}
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.context['results']
+        # Курица с маслом - все есть; курица с рисом и каша - не хватает одного ингредиента.
+        self.assertEqual(response.context['total_count'], 9)
+        self.assertEqual([result['missing'] for result in results[:3]], [[], [], []])
+        self.assertEqual({name for result in results[3:] for name in result['missing']}, {self.rice.name, self.oats.name})
+        self.assertContains(response, "Не хватает: Рис")
+
+
+class ThumbnailTests(CatalogueTestCase):
+    """Уменьшенные копии изображений: создание при загрузке, вывод через srcset, команда."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def image_file(self, name, size, mode='RGB'):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new(mode, size, (200, 100, 50, 128) if mode == 'RGBA' else (200, 100, 50)).save(
+            buffer, 'PNG' if mode == 'RGBA' else 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def open_thumbnail(self, name, preset, width, fmt):
+        from django.core.files.storage import default_storage
+        from PIL import Image
+
+        from .thumbnails import thumbnail_name
+
+        with default_storage.open(thumbnail_name(name, preset, width, fmt)) as file:
+            return Image.open(file).size
+
+    def test_recipe_image_thumbnails(self):
+        recipe = self.recipes[1]
+        recipe.image = self.image_file('dish.jpg', (1000, 600))
+        recipe.save()
+
+        self.assertEqual(self.open_thumbnail(recipe.image.name, 'card', 360, 'webp'), (360, 216))
+        self.assertEqual(self.open_thumbnail(recipe.image.name, 'card', 720, 'jpeg'), (720, 432))
+        # Шире исходного изображения копии не создаются.
+        from .thumbnails import get_thumbnails
+        self.assertEqual(get_thumbnails(recipe.image.name, 'detail')['widths'], [640, 960])
+
+        response = self.client.get(reverse('recipes:recipe_list'))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, '/card/720w.webp 720w')
+        self.assertNotContains(response, f'src="{recipe.image.url}"')
+
+    def test_diet_icons(self):
+        self.diet.icon = self.image_file('icon.png', (64, 64), mode='RGBA')
+        self.diet.save()
+        self.assertEqual(self.open_thumbnail(self.diet.icon.name, 'icon', 48, 'png'), (48, 48))
+
+        from django.core.files.base import ContentFile
+        svg_diet = Diet.objects.create(name="Вектор")
+        svg_diet.icon.save('icon.svg', ContentFile(b'<svg xmlns="http://www.w3.org/2000/svg"/>'))
+        response = self.client.get(reverse('recipes:index'))
+        self.assertContains(response, '/icon/48w.png 48w')
+        self.assertContains(response, f'<img src="{svg_diet.icon.url}"')
+
+    def test_backfill_command(self):
+        from django.core.files.storage import default_storage
+
+        recipe = self.recipes[0]
+        recipe.image = self.image_file('old.jpg', (800, 800))
+        recipe.save()
+        shutil.rmtree(Path(self.media_root) / 'thumbnails')
+        cache.clear()
+
+        call_command('build_thumbnails', workers=2, stdout=StringIO())
+        self.assertTrue(default_storage.exists(f'thumbnails/{recipe.image.name}/plan/400w.webp'))
+
+
+class StaticFilesTests(TestCase):
+    """collectstatic: имена с хешем и сжатые копии; отдача с заголовками кэширования."""
+
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root, ignore_errors=True)
+        static = self.settings(STATIC_ROOT=self.static_root, STATIC_SERVE=True)
+        static.enable()
+        self.addCleanup(static.disable)
+        self.collectstatic()
+
+    def collectstatic(self):
+        """collectstatic; без пакета brotli он предупреждает, что копии .br не создаются."""
+        from . import staticfiles
+
+        if staticfiles.brotli is None:
+            with self.assertLogs('recipes.staticfiles', 'WARNING'):
+                call_command('collectstatic', interactive=False, verbosity=0)
+        else:
+            with self.assertNoLogs('recipes.staticfiles', 'WARNING'):
+                call_command('collectstatic', interactive=False, verbosity=0)
+
+    def hashed_url(self, name):
+        from django.templatetags.static import static
+
+        url = static(name)
+        self.assertNotEqual(url, settings.STATIC_URL + name)
+        return url
+
+    def test_hashed_file_is_immutable_and_compressed(self):
+        url = self.hashed_url('css/custom.css')
+        self.assertTrue(Path(self.static_root, url[len(settings.STATIC_URL):] + '.gz').exists())
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn(f'max-age={settings.STATIC_IMMUTABLE_MAX_AGE}', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)),
+                         Path(settings.BASE_DIR, 'static', 'css', 'custom.css').read_bytes())
+
+    def test_plain_file_without_compression(self):
+        response = self.client.get(settings.STATIC_URL + 'css/custom.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn(f'max-age={settings.STATIC_MAX_AGE}', response['Cache-Control'])
+
+        not_modified = self.client.get(settings.STATIC_URL + 'css/custom.css',
+                                       HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_favicon_redirects_to_hashed_url(self):
+        response = self.client.get('/favicon.ico')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], self.hashed_url('images/favicon.ico'))
+        self.assertIn(f'max-age={settings.STATIC_MAX_AGE}', response['Cache-Control'])
+
+    def test_pages_reference_hashed_files(self):
+        response = self.client.get(reverse('recipes:recipe_list'))
+        self.assertContains(response, self.hashed_url('css/custom.css'))
+
+    def test_missing_manifest_entry_is_an_error(self):
+        from django.contrib.staticfiles.storage import staticfiles_storage
+
+        with self.assertRaises(ValueError):
+            staticfiles_storage.stored_name('css/missing.css')
+        with self.settings(DEBUG=True), self.assertLogs('recipes.staticfiles', 'WARNING'):
+            self.assertEqual(staticfiles_storage.stored_name('css/missing.css'), 'css/missing.css')
+
+    def test_without_manifest_names_are_not_hashed(self):
+        from .staticfiles import CompressedManifestStaticFilesStorage
+
+        storage = CompressedManifestStaticFilesStorage(location=tempfile.mkdtemp(dir=self.static_root))
+        with self.assertLogs('recipes.staticfiles', 'WARNING') as logs:
+            self.assertEqual(storage.stored_name('css/custom.css'), 'css/custom.css')
+            self.assertEqual(storage.stored_name('js/ingredient_search.js'), 'js/ingredient_search.js')
+        self.assertEqual(len(logs.records), 1)
+
+
+@skipUnless(settings.DATABASE_REPLICA_ALIAS in settings.DATABASES,
+            "Реплика не настроена (например, DB_ENGINE=django.db.backends.sqlite3 DB_REPLICA_NAME=replica.sqlite3).")
+class ReplicaRoutingTests(CatalogueTestCase):
+    """
+    Чтение из реплики. Тестовая реплика - отдельная пустая база, поэтому по содержимому
+    страницы видно, из какой базы она построена.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        super().setUp()
+        self.replica = connections[settings.DATABASE_REPLICA_ALIAS]
+
+    def age_catalogue(self):
+        """Каталог изменен давно - реплика считается догнавшей основную базу."""
+        from .caching import CATALOGUE_VERSION_KEY
+
+        cache.set(CATALOGUE_VERSION_KEY, time.time_ns() - (settings.DATABASE_REPLICA_STICKY_SECONDS + 1) * 10 ** 9,
+                  timeout=None)
+
+    def test_read_only_views_read_from_replica(self):
+        self.age_catalogue()
+        with CaptureQueriesContext(self.replica) as queries:
+            response = self.client.get(reverse('recipes:recipe_list'))
+        self.assertGreater(len(queries), 0)
+        self.assertNotContains(response, self.recipes[0].name)
+
+    def test_recent_catalogue_change_reads_from_primary(self):
+        with CaptureQueriesContext(self.replica) as queries:
+            response = self.client.get(reverse('recipes:recipe_detail', args=[self.recipes[0].id]))
+        self.assertEqual(len(queries), 0)
+        self.assertContains(response, self.recipes[0].name)
+
+    def test_sticky_cookie_reads_from_primary(self):
+        from .routers import STICKY_COOKIE
+
+        self.age_catalogue()
+        self.client.cookies[STICKY_COOKIE] = '1'
+        with CaptureQueriesContext(self.replica) as queries:
+            response = self.client.get(reverse('recipes:recipe_list'))
+        self.assertEqual(len(queries), 0)
+        self.assertContains(response, self.recipes[0].name)
+
+    def test_write_sets_sticky_cookie(self):
+        from django.contrib.auth.models import User
+
+        from .routers import STICKY_COOKIE
+
+        User.objects.create_superuser('admin', password='secret')
+        self.age_catalogue()
+        response = self.client.post(reverse('admin:login'), {'username': 'admin', 'password': 'secret'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], settings.DATABASE_REPLICA_STICKY_SECONDS)
+
+        # Без записи cookie не ставится.
+        response = self.client.get(reverse('recipes:recipe_list'))
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_snapshot_is_built_from_primary(self):
+        from .routers import start_db_routing, stop_db_routing
+        from .snapshot import build_catalogue_snapshot
+
+        routing, token = start_db_routing()
+        routing.read_alias = settings.DATABASE_REPLICA_ALIAS
+        try:
+            with CaptureQueriesContext(self.replica) as queries:
+                snapshot = build_catalogue_snapshot()
+                index = snapshot.ingredient_index()
+        finally:
+            stop_db_routing(token)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(len(snapshot.recipes), len(self.recipes))
+        self.assertIn(self.recipes[0].id, index.recipes_containing([self.oats.id]))
+
+    def test_incidental_write_on_get_keeps_replica(self):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+
+        from .middleware import ReplicaRoutingMiddleware
+        from .routers import STICKY_COOKIE
+
+        def view(request):
+            # Попутная запись (как сохранение сессии) в основную базу.
+            Diet.objects.filter(pk=self.diet.pk).update(name=self.diet.name)
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        for method, sticky in (('get', False), ('head', False), ('post', True), ('delete', True)):
+            with self.subTest(method=method):
+                response = middleware(getattr(RequestFactory(), method)('/'))
+                self.assertEqual(STICKY_COOKIE in response.cookies, sticky)
+
+
+class MultiDayPlanTests(CatalogueTestCase):
+    """Генерация меню сразу на несколько дней."""
+
+    def targets(self):
+        return {'proteins': 0, 'fats': 0, 'carbs': 1000, 'carb_constraint_type': 'AT_MOST'}
+
+    def test_days_do_not_repeat_recipes_while_possible(self):
+        from .generator import find_meal_plans_for_days
+
+        with self.assertNumQueries(1):
+            plans = find_meal_plans_for_days(
+                Recipe.objects.filter(diets=self.diet).with_nutrition_data(), 1500, self.targets(), days=3)
+        self.assertEqual(len(plans), 3)
+        for meal_type in ('breakfast', 'lunch', 'dinner'):
+            recipe_ids = [plan[meal_type]['recipe_data']['recipe'].pk for plan in plans if plan]
+            self.assertEqual(len(recipe_ids), len(set(recipe_ids)))
+
+    def test_view_renders_period_totals(self):
+        # Пороги по умолчанию недостижимы для маленького тестового каталога - смягчаем их.
+        Diet.objects.filter(pk=self.diet.pk).update(
+            protein_per_1000_kcal=20, fat_per_1000_kcal=20, carbs_constraint='AT_MOST')
+        response = self.client.post(reverse('recipes:meal_plan_days'), {'diet': self.diet.id, 'calories': 1500, 'days': 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['day_plans']), 4)
+        self.assertIsNotNone(response.context['period_nutrition'])
+
+    def test_view_rejects_too_many_days(self):
+        response = self.client.post(reverse('recipes:meal_plan_days'), {'diet': self.diet.id, 'calories': 1500, 'days': 100})
+        self.assertIsNotNone(response.context['error_message'])
+
+
+class MealLayoutTests(CatalogueTestCase):
+    """Слоты плана питания: перекусы и доли калорий из настроек диеты."""
+
+    def targets(self):
+        return {'proteins': 0, 'fats': 0, 'carbs': 1000, 'carb_constraint_type': 'AT_MOST'}
+
+    def test_layout_places_snacks_between_meals(self):
+        from .generator import DEFAULT_MEAL_LAYOUT, build_meal_layout, diet_meal_layout
+
+        self.assertEqual(diet_meal_layout(self.diet), DEFAULT_MEAL_LAYOUT)
+        layout = build_meal_layout(25, 35, 20, snacks=2, snack=10)
+        self.assertEqual([slot for slot, _, _ in layout], ['breakfast', 'snack_1', 'lunch', 'snack_2', 'dinner'])
+        self.assertEqual(sum(percent for _, _, percent in layout), 100)
+        with self.assertRaises(ValueError):
+            build_meal_layout(30, 40, 30, snacks=1, snack=10)
+
+    def test_diet_validates_distribution(self):
+        from django.core.exceptions import ValidationError
+
+        self.diet.snack_count, self.diet.snack_percent = 2, 10
+        with self.assertRaises(ValidationError):
+            self.diet.full_clean()
+        self.diet.lunch_percent = 20
+        self.diet.full_clean()
+
+    @override_settings(MEAL_PLAN_PARALLEL_WORKERS=1)
+    def test_every_engine_fills_snack_slots(self):
+        from .generator import ENGINES, build_meal_layout, find_best_meal_plan, score_meal_plan
+
+        for index in range(2):
+            create_recipe(f"Овсяное печенье {index}", 'SNACK', self.diet, [(self.oats, 60 + index * 10)])
+        candidates = Recipe.objects.filter(diets=self.diet).with_nutrition_data()
+        layout = build_meal_layout(25, 35, 25, snacks=1, snack=15)
+
+        for engine in ENGINES:
+            meal_plan = find_best_meal_plan(candidates, 1800, self.targets(), engine=engine, seed=1, layout=layout)
+            self.assertIsNotNone(meal_plan, engine)
+            self.assertEqual(list(meal_plan), [slot for slot, _, _ in layout])
+            self.assertEqual(meal_plan['snack_1']['recipe_data']['recipe'].meal_type, 'SNACK')
+            self.assertGreaterEqual(score_meal_plan(meal_plan, 1800, layout), 0)
+
+    @override_settings(MEAL_PLAN_PARALLEL_WORKERS=1)
+    def test_snack_slots_get_different_recipes(self):
+        from .generator import ENGINES, build_meal_layout, find_best_meal_plan, find_meal_plans_for_days
+
+        for index in range(3):
+            create_recipe(f"Овсяное печенье {index}", 'SNACK', self.diet, [(self.oats, 40 + index * 5)])
+        candidates = Recipe.objects.filter(diets=self.diet).with_nutrition_data()
+        layout = build_meal_layout(25, 30, 21, snacks=3, snack=8)
+        snack_slots = [slot for slot, meal_type, _ in layout if meal_type == 'snack']
+
+        for engine in ENGINES:
+            meal_plan = find_best_meal_plan(candidates, 1800, self.targets(), engine=engine, seed=1, layout=layout)
+            self.assertIsNotNone(meal_plan, engine)
+            snacks = {meal_plan[slot]['recipe_data']['recipe'].pk for slot in snack_slots}
+            self.assertEqual(len(snacks), 3, engine)
+
+        for meal_plan in find_meal_plans_for_days(candidates, 1800, self.targets(), 3, seed=1, layout=layout):
+            self.assertEqual(len({meal_plan[slot]['recipe_data']['recipe'].pk for slot in snack_slots}), 3)
+
+        # Если рецептов на все слоты не хватает, повторы допускаются.
+        Recipe.objects.filter(meal_type='SNACK').exclude(name="Овсяное печенье 0").delete()
+        candidates = Recipe.objects.filter(diets=self.diet).with_nutrition_data()
+        for engine in ENGINES:
+            self.assertIsNotNone(
+                find_best_meal_plan(candidates, 1800, self.targets(), engine=engine, seed=1, layout=layout), engine)
+
+    def test_vectorized_snack_layout_checks_every_combination(self):
+        from itertools import product
+
+        from .benchmarks import catalogue_to_snapshot, diet_targets, generate_catalogue
+        from .fixedpoint import to_fixed
+        from .generator import (
+            build_meal_layout, meal_type_slot_counts, plan_meets_targets, prune_slot_candidates, score_meal_plan,
+        )
+        from .vectorized import search_meal_plan_vectorized
+
+        catalogue = generate_catalogue(80, seed=3)
+        diet = catalogue['diets'][0]
+        candidates = {
+            meal_type: recipes[:4]
+            for meal_type, recipes in catalogue_to_snapshot(catalogue).candidates_for_diet(diet['pk']).items()
+        }
+        targets = diet_targets(diet, 2000)
+        layout = build_meal_layout(25, 30, 21, snacks=3, snack=8)
+
+        # Все комбинации рецептов (не больше number_of_samples) с подобранными порциями
+        # оцениваются, поэтому результат не хуже лучшей из них.
+        slot_counts = meal_type_slot_counts(layout)
+        slot_options = [
+            prune_slot_candidates(candidates[meal_type], to_fixed(2000) * percent, min_count=slot_counts[meal_type])
+            for _, meal_type, percent in layout
+        ]
+        best = None
+        for combination in product(*slot_options):
+            snacks = [data['recipe'].pk for (data, _), (_, meal_type, _) in zip(combination, layout)
+                      if meal_type == 'snack']
+            meal_plan = {
+                slot: {'recipe_data': data, 'servings': servings}
+                for (slot, _, _), (data, servings) in zip(layout, combination)
+            }
+            if len(set(snacks)) == len(snacks) and plan_meets_targets(meal_plan, targets):
+                score = score_meal_plan(meal_plan, 2000, layout)
+                best = score if best is None else min(best, score)
+        self.assertIsNotNone(best)
+
+        meal_plan = search_meal_plan_vectorized(candidates, 2000, targets, rng=random.Random(1), layout=layout)
+        self.assertIsNotNone(meal_plan)
+        self.assertLessEqual(score_meal_plan(meal_plan, 2000, layout), best)
+
+    def test_snack_slots_without_snack_recipes_give_no_plan(self):
+        from .generator import build_meal_layout, find_best_meal_plan
+
+        layout = build_meal_layout(25, 35, 25, snacks=1, snack=15)
+        candidates = Recipe.objects.filter(diets=self.diet).with_nutrition_data()
+        self.assertIsNone(find_best_meal_plan(candidates, 1800, self.targets(), layout=layout))
+        self.assertIsNotNone(find_best_meal_plan(candidates, 1800, self.targets()))
+
+
+class CatalogueImportExportTests(CatalogueTestCase):
+    """Потоковый экспорт и импорт каталога (CSV и JSON Lines)."""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def snapshot(self):
+        return sorted(
+            (recipe.name, recipe.meal_type, tuple(recipe.diets.values_list('name', flat=True)),
+             recipe.nutrition.calories_per_serving, recipe.nutrition.carbs_per_serving)
+            for recipe in Recipe.objects.select_related('nutrition')
+        )
+
+    def test_export_and_import_round_trip(self):
+        expected = self.snapshot()
+        for file_format in ('csv', 'jsonl'):
+            call_command('export_catalogue', self.directory, format=file_format, stdout=StringIO())
+            Recipe.objects.all().delete()
+            Ingredient.objects.all().delete()
+
+            call_command('import_catalogue', stdout=StringIO(), batch_size=4, **{
+                kind: str(self.directory / f'{kind}.{file_format}')
+                for kind in ('ingredients', 'recipes', 'recipe_ingredients')
+            })
+            self.assertEqual(self.snapshot(), expected)
+
+        # Счетчик id продолжает загруженные рецепты.
+        self.assertGreater(create_recipe("Новый", 'LUNCH', self.diet, []).pk, max(r.pk for r in self.recipes))
+
+    def test_invalid_lines_are_reported_and_skipped(self):
+        path = self.directory / 'ingredients.csv'
+        path.write_text(
+            "name,calories,proteins,fats,carbs\n"
+            "Гречка,343,13.3,3.4,72\n"
+            "Сахар,много,0,0,100\n"
+            "Курица,170,30,4,0\n",
+            encoding='utf-8',
+        )
+        stderr = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('import_catalogue', ingredients=str(path), stdout=StringIO(), stderr=stderr)
+        self.assertIn('ingredients.csv:3: calories', stderr.getvalue())
+        self.assertTrue(Ingredient.objects.filter(name="Гречка").exists())
+        self.assertFalse(Ingredient.objects.filter(name="Сахар").exists())
+        # Существующий ингредиент обновлен, а КБЖУ его рецептов пересчитано.
+        self.assertEqual(Ingredient.objects.get(name="Курица").calories, Decimal('170'))
+        lunch = Recipe.objects.get(name="Курица с рисом 0")
+        self.assertEqual(lunch.nutrition.total_calories, Decimal('170') * 2 + Decimal('130') * 2)
+
+    def test_sequence_is_reset_in_primary(self):
+        from unittest import mock
+
+        from .catalogue_io import finish_import, import_context
+        from .routers import start_db_routing, stop_db_routing
+
+        context = dict(import_context(), explicit_ids=True)
+        routing, token = start_db_routing()
+        routing.read_alias = 'replica'
+        try:
+            with mock.patch('recipes.catalogue_io.connections') as connections_mock:
+                finish_import(context)
+        finally:
+            stop_db_routing(token)
+        connections_mock.__getitem__.assert_called_once_with('default')
+
+
+class MealPlanCacheTests(CatalogueTestCase):
+    """Кэш наборов планов: повторное использование в корзине и инвалидация при изменении каталога."""
+
+    targets = {'proteins': 0, 'fats': 0, 'carbs': 1000, 'carb_constraint_type': 'AT_MOST'}
+
+    def get_plan(self, diet=None, calories=2000, engine='random', exclusions=((), ())):
+        from .caching import get_meal_plan
+        from .snapshot import get_diet_candidates
+
+        diet = diet or self.diet
+        candidates = get_diet_candidates(diet.pk, *exclusions)
+        return get_meal_plan(diet, candidates, calories, self.targets, engine, exclusions)
+
+    def count_builds(self):
+        from unittest import mock
+
+        from .caching import build_meal_plan_pool
+
+        return mock.patch('recipes.caching.build_meal_plan_pool', wraps=build_meal_plan_pool)
+
+    def test_pool_reused_within_bucket(self):
+        with self.count_builds() as build:
+            self.assertIsNotNone(self.get_plan(calories=2000))
+            self.assertIsNotNone(self.get_plan(calories=2030))
+            self.assertIsNotNone(self.get_plan(calories=2000))
+        self.assertEqual(build.call_count, 1)
+
+        with self.count_builds() as build:
+            self.get_plan(calories=2050)
+        self.assertEqual(build.call_count, 1)
+
+    def test_separate_pools_per_diet_engine_and_exclusions(self):
+        other_diet = Diet.objects.create(name="Другая диета")
+        for recipe in self.recipes:
+            recipe.diets.add(other_diet)
+
+        requests = [
+            {},
+            {'diet': other_diet},
+            {'engine': 'exact'},
+            {'exclusions': ((self.oil.pk,), ())},
+            {'exclusions': ((self.oil.pk, self.rice.pk), ())},
+        ]
+        with self.count_builds() as build:
+            for params in requests:
+                self.get_plan(**params)
+            for params in requests:
+                self.get_plan(**params)
+        self.assertEqual(build.call_count, len(requests))
+
+    def test_catalogue_changes_invalidate_pools(self):
+        from .caching import CATALOGUE_VERSION_KEY, get_catalogue_version
+
+        recipe = self.recipes[1]
+        link = recipe.recipeingredient_set.first()
+        changes = {
+            'recipe saved': lambda: recipe.save(),
+            'recipe ingredient saved': lambda: link.save(),
+            'recipe ingredient deleted': lambda: link.delete(),
+            'ingredient saved': lambda: self.rice.save(),
+            'ingredient deleted': lambda: Ingredient.objects.create(
+                name="Соль", calories=0, proteins=0, fats=0, carbs=0).delete(),
+            'diet saved': lambda: self.diet.save(),
+            'diet deleted': lambda: Diet.objects.create(name="Временная").delete(),
+            'diet added to recipe': lambda: recipe.diets.add(Diet.objects.create(name="Новая")),
+            'diet removed from recipe': lambda: recipe.diets.remove(self.diet),
+            'recipe deleted': lambda: recipe.delete(),
+        }
+        for number, (name, change) in enumerate(changes.items(), start=1):
+            with self.subTest(name):
+                # Заведомо новая версия: набор планов составляется и затем используется повторно.
+                cache.set(CATALOGUE_VERSION_KEY, number, timeout=None)
+                with self.count_builds() as build:
+                    self.get_plan()
+                    self.get_plan()
+                self.assertEqual(build.call_count, 1)
+
+                with self.captureOnCommitCallbacks(execute=True):
+                    change()
+                self.assertNotEqual(get_catalogue_version(), number)
+                with self.count_builds() as build:
+                    self.get_plan()
+                self.assertEqual(build.call_count, 1)
+
+
+class CatalogueVersionCommitTests(TransactionTestCase):
+    """Версия каталога меняется после фиксации транзакции, а не при сохранении."""
+
+    def setUp(self):
+        from .caching import get_catalogue_version
+
+        self.version = get_catalogue_version()
+
+    def assert_version_changed(self, changed):
+        from .caching import get_catalogue_version
+
+        if changed:
+            self.assertNotEqual(get_catalogue_version(), self.version)
+        else:
+            self.assertEqual(get_catalogue_version(), self.version)
+
+    def test_version_changes_after_commit(self):
+        from .models import IngredientGroup
+
+        with transaction.atomic():
+            Diet.objects.create(name="Временная")
+            group = IngredientGroup.objects.create(name="Крупы")
+            group.ingredients.add(Ingredient.objects.create(name="Гречка", calories=343, proteins=13, fats=3, carbs=62))
+            self.assert_version_changed(False)
+        self.assert_version_changed(True)
+
+    def test_rollback_keeps_version(self):
+        with transaction.atomic():
+            Diet.objects.create(name="Временная")
+            transaction.set_rollback(True)
+        self.assert_version_changed(False)
+        self.assertFalse(Diet.objects.filter(name="Временная").exists())
+
+
+class PageCacheTests(CatalogueTestCase):
+    """Кэш страниц рецепта и каталога: повторные и условные запросы без рендеринга."""
+
+    def test_recipe_detail_is_cached_with_validators(self):
+        recipe = self.recipes[1]
+        url = reverse('recipes:recipe_detail', args=[recipe.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'])
+        self.assertTrue(response['Last-Modified'])
+
+        # Один запрос на страницу - время изменения рецепта для ключа кэша.
+        with self.assertNumQueries(2):
+            cached = self.client.get(url)
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(not_modified.status_code, 304)
+
+        # Изменение другого рецепта (и версии каталога) страницу не сбрасывает.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[0].save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).content, response.content)
+
+        # Изменение ингредиента рецепта обновляет отметку времени и саму страницу.
+        updated_at = recipe.updated_at
+        item = recipe.recipeingredient_set.first()
+        item.weight_grams += 50
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        recipe.refresh_from_db()
+        self.assertGreater(recipe.updated_at, updated_at)
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_missing_recipe_detail(self):
+        self.assertEqual(self.client.get(reverse('recipes:recipe_detail', args=[0])).status_code, 404)
+
+    def test_recipe_list_is_cached_per_filter_combination(self):
+        url = reverse('recipes:recipe_list')
+        first = self.client.get(url, {'meal_type': 'LUNCH'})
+        other = self.client.get(url, {'meal_type': 'DINNER'})
+        self.assertNotEqual(first['ETag'], other['ETag'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, {'meal_type': 'LUNCH'}).content, first.content)
+            self.assertEqual(
+                self.client.get(url, {'meal_type': 'LUNCH'}, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code,
+                304,
+            )
+
+
+@override_settings(MEAL_PLAN_ENGINE='random')
+class MealPlanApiTests(CatalogueTestCase):
+    """JSON API генератора: воспроизводимость по seed, ограничение нагрузки и таймаут."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Пороги по умолчанию недостижимы для маленького тестового каталога - смягчаем их.
+        Diet.objects.filter(pk=cls.diet.pk).update(
+            protein_per_1000_kcal=20, fat_per_1000_kcal=20, carbs_constraint='AT_MOST')
+
+    def request_plan(self, **params):
+        return self.client.get(reverse('recipes:meal_plan_api'), dict({'diet': self.diet.id, 'calories': 1500}, **params))
+
+    def test_same_seed_gives_same_plan(self):
+        first = self.request_plan(seed=42)
+        second = self.request_plan(seed=42)
+        self.assertEqual(first.status_code, 200)
+        self.assertIsNotNone(first.json()['plan'])
+        self.assertEqual(first.json(), second.json())
+
+    def test_exclusions_use_separate_cached_plans(self):
+        self.assertIsNotNone(self.request_plan().json()['plan'])
+        # Без риса обед составить не из чего - план из кэша без исключений не подходит.
+        data = self.request_plan(exclude_ingredients=[self.rice.id, 'x']).json()
+        self.assertEqual(data['excluded'], {'ingredients': [self.rice.id], 'groups': []})
+        self.assertIsNone(data['plan'])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.request_plan(calories='много').status_code, 400)
+        self.assertEqual(self.request_plan(seed='x').status_code, 400)
+        self.assertEqual(self.request_plan(diet=0).status_code, 404)
+
+    def test_invalid_diet_layout_is_json_error(self):
+        # Настройки, сохраненные в обход валидации модели: доли калорий в сумме не 100%.
+        Diet.objects.filter(pk=self.diet.pk).update(breakfast_percent=90)
+        for params in ({}, {'seed': 1}):
+            response = self.request_plan(**params)
+            self.assertEqual(response.status_code, 500)
+            self.assertIn('error', response.json())
+
+    def test_busy_when_all_slots_taken(self):
+        from .workers import get_slots
+
+        slots = get_slots()
+        taken = 0
+        while slots.acquire(blocking=False):
+            taken += 1
+        try:
+            response = self.request_plan()
+        finally:
+            for _ in range(taken):
+                slots.release()
+        self.assertEqual(response.status_code, 503)
+
+    @override_settings(MEAL_PLAN_API_TIMEOUT=0)
+    def test_timeout(self):
+        self.assertEqual(self.request_plan(seed=1).status_code, 504)
+
+    def test_generator_runs_in_request_context(self):
+        # Этап генератора учитывается в замерах запроса, хотя выполняется в потоке пула.
+        with self.assertLogs('recipes.timing', 'INFO') as logs:
+            self.assertEqual(self.request_plan(seed=1).status_code, 200)
+        stages = json.loads(logs.records[0].getMessage())['stages']
+        self.assertIn('search_random', stages)
+
+
+class RecipeNutritionSignalTests(CatalogueTestCase):
+    """Таблица RecipeNutrition пересчитывается сигналами при каждом изменении рецепта."""
+
+    def nutrition(self, recipe):
+        from .models import RecipeNutrition
+
+        return RecipeNutrition.objects.get(recipe=recipe)
+
+    def expected(self, recipe):
+        from .utils import calculate_recipe_nutrition
+
+        return calculate_recipe_nutrition(Recipe.objects.get(pk=recipe.pk))
+
+    def assertNutritionUpToDate(self, recipe):
+        self.assertEqual(self.nutrition(recipe).as_dict(), self.expected(recipe))
+
+    def test_recipe_ingredient_added_changed_deleted(self):
+        recipe = self.recipes[1]
+        before = self.nutrition(recipe).total_calories
+
+        item = RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=self.oil, weight_grams=10, display_amount='10', display_unit='г')
+        self.assertEqual(self.nutrition(recipe).total_calories, before + Decimal('88.4'))
+        self.assertNutritionUpToDate(recipe)
+
+        item.weight_grams = 20
+        item.save()
+        self.assertEqual(self.nutrition(recipe).total_calories, before + Decimal('176.8'))
+        self.assertNutritionUpToDate(recipe)
+
+        item.delete()
+        self.assertEqual(self.nutrition(recipe).total_calories, before)
+
+    def test_ingredient_change_recomputes_only_its_recipes(self):
+        breakfast, lunch = self.recipes[0], self.recipes[1]
+        lunch_before = self.nutrition(lunch).as_dict()
+
+        self.oats.calories = Decimal('400')
+        self.oats.save()
+        self.assertEqual(self.nutrition(breakfast).total_calories, Decimal('400') + Decimal('88.4'))
+        self.assertNutritionUpToDate(breakfast)
+        self.assertEqual(self.nutrition(lunch).as_dict(), lunch_before)
+
+    def test_servings_change_uses_stored_totals(self):
+        from .models import RecipeNutrition
+
+        recipe = self.recipes[1]
+        # Суммы в таблице отличаются от расчета по ингредиентам: значения на порцию
+        # должны быть пересчитаны именно из них.
+        RecipeNutrition.objects.filter(recipe=recipe).update(total_calories=Decimal('1000'))
+        recipe.servings = 4
+        recipe.save(update_fields=['servings'])
+        self.assertEqual(self.nutrition(recipe).calories_per_serving, Decimal('250.00'))
+
+        recipe.name = "Новое название"
+        recipe.save(update_fields=['name'])
+        self.assertEqual(self.nutrition(recipe).calories_per_serving, Decimal('250.00'))
+
+    def test_recipe_deletion_cascades_without_recomputing(self):
+        from unittest import mock
+
+        from .models import RecipeNutrition
+
+        recipe = self.recipes[2]
+        with mock.patch('recipes.signals.update_recipe_nutrition') as update:
+            recipe.delete()
+        update.assert_not_called()
+        self.assertFalse(RecipeNutrition.objects.filter(recipe_id=self.recipes[2].pk).exists())
+
+    def test_migration_backfills_missing_rows(self):
+        from importlib import import_module
+        from types import SimpleNamespace
+
+        from django.apps import apps
+        from django.db import connection
+
+        from .models import RecipeNutrition
+
+        # Рецепт на несколько порций - значения на порцию округляются.
+        recipes = self.recipes + [
+            create_recipe("Плов", 'LUNCH', self.diet, [(self.rice, 333), (self.chicken, 127), (self.oil, 7)], servings=3)
+        ]
+        expected = {recipe.pk: self.expected(recipe) for recipe in recipes}
+        RecipeNutrition.objects.filter(recipe__in=recipes[:4] + recipes[-1:]).delete()
+
+        migration = import_module('recipes.migrations.0015_backfill_recipe_nutrition')
+        # Функции миграции нужно только соединение редактора схемы.
+        migration.backfill_recipe_nutrition(apps, SimpleNamespace(connection=connection))
+        self.assertEqual({recipe.pk: self.nutrition(recipe).as_dict() for recipe in recipes}, expected)
+
+    def test_rebuild_nutrition_invalidates_caches(self):
+        from .caching import get_catalogue_version
+        from .models import RecipeNutrition
+
+        RecipeNutrition.objects.filter(recipe=self.recipes[0]).update(calories_per_serving=0)
+        version = get_catalogue_version()
+        call_command('rebuild_nutrition', stdout=StringIO())
+        self.assertNutritionUpToDate(self.recipes[0])
+        self.assertNotEqual(get_catalogue_version(), version)
+
+
+class FixedPointNutritionTests(CatalogueTestCase):
+    """Целочисленные расчеты КБЖУ совпадают с прежними расчетами в Decimal."""
+
+    def decimal_nutrition(self, totals, servings):
+        """Прежний расчет: деление и округление до 2 знаков в Decimal."""
+        servings = Decimal(servings)
+        result = {'total_calories': round(totals['total_calories'], 2)}
+        for name in ('calories', 'proteins', 'fats', 'carbs'):
+            value = totals[f'total_{name}'] / servings if servings > 0 else Decimal(0)
+            result[f'{name}_per_serving'] = round(value, 2)
+        return result
+
+    def test_per_serving_rounding_matches_decimal(self):
+        from .utils import calculate_nutrition_from_totals
+
+        # Суммы хранятся в базе с 4 знаками после запятой; среди случаев - точные "половинки".
+        rng = random.Random(0)
+        cases = [Decimal('0.0050'), Decimal('0.0150'), Decimal('0.0250'), Decimal('2.5050'), Decimal('100.0000')]
+        cases += [Decimal(rng.randint(0, 10 ** 8)).scaleb(-4) for _ in range(300)]
+        for total in cases:
+            totals = {
+                'total_calories': total,
+                'total_proteins': Decimal(rng.randint(0, 10 ** 7)).scaleb(-4),
+                'total_fats': Decimal(rng.randint(0, 10 ** 6)).scaleb(-4),
+                'total_carbs': total + Decimal('0.0050'),
+            }
+            for servings in (0, 1, 2, 3, 4, 6, 7):
+                self.assertEqual(
+                    calculate_nutrition_from_totals(totals, servings), self.decimal_nutrition(totals, servings),
+                    msg=f'{total} / {servings}',
+                )
+
+    def test_recipe_totals_are_exact(self):
+        from .utils import calculate_recipe_totals
+
+        for recipe in self.recipes:
+            expected = sum(
+                item.ingredient.calories * Decimal(item.weight_grams) / Decimal(100)
+                for item in recipe.recipeingredient_set.all()
+            )
+            self.assertEqual(calculate_recipe_totals(recipe)['total_calories'], expected)
+
+    def test_score_matches_decimal_formula(self):
+        from .generator import (
+            IDEAL_MEAL_DISTRIBUTION, MEAL_BALANCE_PENALTY, SCORE_SCALE, find_best_meal_plan, plan_totals, score_meal_plan,
+        )
+
+        targets = {'proteins': 0, 'fats': 0, 'carbs': 1000, 'carb_constraint_type': 'AT_MOST'}
+        meal_plan = find_best_meal_plan(Recipe.objects.filter(diets=self.diet).with_nutrition_data(), 1500, targets)
+        expected = (plan_totals(meal_plan)['calories'] - 1500) ** 2
+        for meal_type, data in meal_plan.items():
+            meal_calories = data['recipe_data']['nutrition']['calories_per_serving'] * data['servings']
+            expected += (meal_calories - 1500 * IDEAL_MEAL_DISTRIBUTION[meal_type.upper()]) ** 2 * MEAL_BALANCE_PENALTY
+        self.assertEqual(score_meal_plan(meal_plan, 1500), expected * SCORE_SCALE)
+
+
+class CatalogueSnapshotTests(CatalogueTestCase):
+    """Снимок каталога в памяти: те же кандидаты, что и из базы, без повторных запросов."""
+
+    def candidate_ids(self, candidates):
+        return {slot: sorted((c['recipe'].pk, c['values']) for c in items) for slot, items in candidates.items()}
+
+    def test_candidates_match_database(self):
+        from .generator import prepare_meal_candidates
+        from .snapshot import get_diet_candidates
+
+        other_diet = Diet.objects.create(name="Другая")
+        self.recipes[0].diets.add(other_diet)
+
+        for diet in (self.diet, other_diet):
+            expected = prepare_meal_candidates(Recipe.objects.filter(diets=diet).with_nutrition_data())
+            self.assertEqual(self.candidate_ids(get_diet_candidates(diet.pk)), self.candidate_ids(expected))
+
+    def test_snapshot_is_reused_until_catalogue_changes(self):
+        from .snapshot import get_catalogue_snapshot, get_diet_candidates
+
+        get_diet_candidates(self.diet.pk)
+        with self.assertNumQueries(0):
+            candidates = get_diet_candidates(self.diet.pk)
+        self.assertEqual(len(candidates['lunch']), 3)
+
+        snapshot = get_catalogue_snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_more_recipes(2)
+        self.assertIsNot(get_catalogue_snapshot(), snapshot)
+        self.assertEqual(len(get_diet_candidates(self.diet.pk)['lunch']), 5)
+
+    def test_hydrate_loads_recipes_in_one_query(self):
+        from .generator import find_meal_plans_for_days
+        from .snapshot import get_diet_candidates, hydrate_meal_plans
+
+        targets = {'proteins': 0, 'fats': 0, 'carbs': 1000, 'carb_constraint_type': 'AT_MOST'}
+        with self.assertNumQueries(2):
+            plans = find_meal_plans_for_days(get_diet_candidates(self.diet.pk), 1500, targets, days=3)
+        with self.assertNumQueries(1):
+            plans = hydrate_meal_plans(plans)
+        for meal_plan in plans:
+            for data in meal_plan.values():
+                self.assertIsInstance(data['recipe_data']['recipe'], Recipe)
+
+    def test_database_candidates_in_one_query(self):
+        from .snapshot import get_catalogue_snapshot, load_diet_candidates
+
+        expected = self.candidate_ids(get_catalogue_snapshot().candidates_for_diet(self.diet.pk))
+        with self.assertNumQueries(1):
+            candidates = load_diet_candidates(self.diet.pk)
+        self.assertEqual(self.candidate_ids(candidates), expected)
+
+        # Количество запросов не зависит от числа рецептов в диете.
+        self.add_more_recipes(5)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(load_diet_candidates(self.diet.pk)['lunch']), 8)
+
+    @override_settings(CATALOGUE_SNAPSHOT_ENABLED=False)
+    def test_snapshot_can_be_disabled(self):
+        from .snapshot import get_diet_candidates
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(get_diet_candidates(self.diet.pk)['lunch']), 3)
+
+    def test_recipes_without_nutrition_are_skipped_without_writes(self):
+        from .models import RecipeNutrition
+        from .snapshot import build_catalogue_snapshot
+
+        RecipeNutrition.objects.filter(recipe=self.recipes[1]).delete()
+        with self.assertNumQueries(2), self.assertLogs('recipes.snapshot', 'WARNING'):
+            snapshot = build_catalogue_snapshot()
+        self.assertNotIn(self.recipes[1].pk, {record.pk for record in snapshot.recipes})
+        self.assertEqual(len(snapshot.candidates_for_diet(self.diet.pk)['lunch']), 2)
+        self.assertFalse(RecipeNutrition.objects.filter(recipe=self.recipes[1]).exists())
+
+
+class SeededGeneratorTests(TestCase):
+    """Воспроизводимость генератора по seed и параллельный поиск с перезапусками."""
+
+    def setUp(self):
+        from .benchmarks import catalogue_to_snapshot, diet_targets, generate_catalogue
+
+        catalogue = generate_catalogue(300, seed=3)
+        diet = catalogue['diets'][0]
+        self.candidates = catalogue_to_snapshot(catalogue).candidates_for_diet(diet['pk'])
+        self.targets = diet_targets(diet, 2000)
+
+    def plan_key(self, meal_plan):
+        self.assertIsNotNone(meal_plan)
+        return {slot: (data['recipe_data']['recipe'].pk, data['servings']) for slot, data in meal_plan.items()}
+
+    def test_same_seed_gives_same_plan(self):
+        from .generator import ENGINE_PARALLEL, ENGINE_RANDOM, find_best_meal_plan, find_meal_plans_for_days
+
+        for engine in (ENGINE_RANDOM, ENGINE_PARALLEL):
+            first = find_best_meal_plan(self.candidates, 2000, self.targets, engine=engine, seed=7)
+            second = find_best_meal_plan(self.candidates, 2000, self.targets, engine=engine, seed=7)
+            self.assertEqual(self.plan_key(first), self.plan_key(second))
+
+        first = find_meal_plans_for_days(self.candidates, 2000, self.targets, 3, seed=7)
+        second = find_meal_plans_for_days(self.candidates, 2000, self.targets, 3, seed=7)
+        self.assertEqual([self.plan_key(plan) for plan in first], [self.plan_key(plan) for plan in second])
+
+    def test_parallel_result_does_not_depend_on_worker_count(self):
+        from .parallel import search_meal_plan_parallel
+
+        plans = [
+            search_meal_plan_parallel(
+                self.candidates, 2000, self.targets, rng=random.Random(11), restarts=4, attempts=400, workers=workers
+            )
+            for workers in (1, 2)
+        ]
+        self.assertEqual(self.plan_key(plans[0]), self.plan_key(plans[1]))
+
+
+class ExactSearchTests(TestCase):
+    """Точный поиск (exact.py): оптимальность, воспроизводимость и бюджет времени."""
+
+    def setUp(self):
+        from .benchmarks import catalogue_to_snapshot, diet_targets, generate_catalogue
+
+        catalogue = generate_catalogue(24, seed=5)
+        diet = catalogue['diets'][0]
+        self.candidates = catalogue_to_snapshot(catalogue).candidates_for_diet(diet['pk'])
+        self.targets = diet_targets(diet, 2000)
+
+    def best_by_enumeration(self, target_calories, targets):
+        """Наименьший штраф среди всех сочетаний (рецепт, порции) для слотов, подходящих по БЖУ."""
+        from itertools import product
+
+        from .generator import DEFAULT_MEAL_LAYOUT, MAX_SERVINGS, plan_meets_targets, score_meal_plan
+
+        slot_options = [
+            [(data, servings) for data in self.candidates[meal_type] for servings in range(1, MAX_SERVINGS + 1)]
+            for _, meal_type, _ in DEFAULT_MEAL_LAYOUT
+        ]
+        best = None
+        for combination in product(*slot_options):
+            meal_plan = {
+                slot: {'recipe_data': data, 'servings': servings}
+                for (slot, _, _), (data, servings) in zip(DEFAULT_MEAL_LAYOUT, combination)
+            }
+            if plan_meets_targets(meal_plan, targets):
+                score = score_meal_plan(meal_plan, target_calories)
+                if best is None or score < best:
+                    best = score
+        return best
+
+    def plan_key(self, meal_plan):
+        return {slot: (data['recipe_data']['recipe'].pk, data['servings']) for slot, data in meal_plan.items()}
+
+    def test_matches_exhaustive_enumeration(self):
+        from .exact import search_meal_plan_exact
+        from .generator import plan_meets_targets, score_meal_plan
+
+        for target_calories in (1500, 2000, 2600):
+            for carb_constraint_type in ('AT_MOST', 'AT_LEAST'):
+                targets = dict(self.targets, carb_constraint_type=carb_constraint_type)
+                expected = self.best_by_enumeration(target_calories, targets)
+                meal_plan = search_meal_plan_exact(self.candidates, target_calories, targets, time_budget=None)
+                if expected is None:
+                    self.assertIsNone(meal_plan)
+                    continue
+                self.assertTrue(plan_meets_targets(meal_plan, targets))
+                self.assertEqual(score_meal_plan(meal_plan, target_calories), expected,
+                                 msg=f'{target_calories} {carb_constraint_type}')
+
+    def test_result_is_reproducible(self):
+        from .exact import search_meal_plan_exact
+
+        first = search_meal_plan_exact(self.candidates, 2000, self.targets, time_budget=None)
+        second = search_meal_plan_exact(self.candidates, 2000, self.targets, time_budget=None)
+        self.assertIsNotNone(first)
+        self.assertEqual(self.plan_key(first), self.plan_key(second))
+
+    def test_time_budget_falls_back_to_random_search(self):
+        from unittest import mock
+
+        from .exact import search_meal_plan_exact
+        from .generator import search_meal_plan_random
+
+        # Бюджет исчерпан уже на первом проверенном варианте: плана еще нет,
+        # поэтому возвращается результат случайного поиска с тем же генератором.
+        with mock.patch('recipes.exact.TIME_CHECK_INTERVAL', 1):
+            meal_plan = search_meal_plan_exact(self.candidates, 2000, self.targets, time_budget=-1,
+                                               rng=random.Random(1))
+        expected = search_meal_plan_random(self.candidates, 2000, self.targets, rng=random.Random(1))
+        self.assertIsNotNone(meal_plan)
+        self.assertEqual(self.plan_key(meal_plan), self.plan_key(expected))
+
+
+class VectorizedSearchTests(TestCase):
+    """Пакетный поиск на NumPy (vectorized.py): ограничения БЖУ, штраф и оптимальность."""
+
+    setUp = ExactSearchTests.setUp
+    best_by_enumeration = ExactSearchTests.best_by_enumeration
+    plan_key = ExactSearchTests.plan_key
+
+    def search(self, target_calories, targets, seed=0):
+        from .vectorized import search_meal_plan_vectorized
+
+        return search_meal_plan_vectorized(self.candidates, target_calories, targets, rng=random.Random(seed))
+
+    def test_plans_meet_targets_and_match_exhaustive_best(self):
+        from .generator import plan_meets_targets, score_meal_plan
+
+        for target_calories in (1500, 2000, 2600):
+            for carb_constraint_type in ('AT_MOST', 'AT_LEAST'):
+                with self.subTest(target_calories=target_calories, carb_constraint_type=carb_constraint_type):
+                    targets = dict(self.targets, carb_constraint_type=carb_constraint_type)
+                    expected = self.best_by_enumeration(target_calories, targets)
+                    meal_plan = self.search(target_calories, targets)
+                    if expected is None:
+                        self.assertIsNone(meal_plan)
+                        continue
+                    self.assertTrue(plan_meets_targets(meal_plan, targets))
+                    self.assertEqual(score_meal_plan(meal_plan, target_calories), expected)
+
+    def test_score_matches_score_meal_plan(self):
+        import numpy as np
+
+        from .generator import DEFAULT_MEAL_LAYOUT, SCORE_SCALE, score_meal_plan
+        from .vectorized import ideal_slot_calories, pack_nutrition, score_combinations
+
+        for seed in range(3):
+            meal_plan = self.search(2000, self.targets, seed)
+            slots = [slot for slot, _, _ in DEFAULT_MEAL_LAYOUT]
+            per_serving = pack_nutrition([meal_plan[slot]['recipe_data'] for slot in slots])[None]
+            servings = np.array([[[meal_plan[slot]['servings'] for slot in slots]]], dtype=np.float64)
+            _, score = score_combinations(per_serving, servings, 2000.0, ideal_slot_calories(2000))
+
+            expected = score_meal_plan(meal_plan, 2000) / SCORE_SCALE
+            self.assertAlmostEqual(float(score[0, 0]), expected, delta=expected * 1e-9)
+
+    def test_result_is_reproducible_with_seed(self):
+        first = self.search(2000, self.targets, seed=7)
+        second = self.search(2000, self.targets, seed=7)
+        self.assertIsNotNone(first)
+        self.assertEqual(self.plan_key(first), self.plan_key(second))
+
+
+class BenchmarkTests(TestCase):
+    """Синтетические каталоги для замеров совпадают с тем, что видит приложение."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_synthetic_snapshot_matches_loaded_catalogue(self):
+        from .benchmarks import catalogue_to_snapshot, generate_catalogue, load_catalogue
+        from .snapshot import get_diet_candidates
+
+        catalogue = generate_catalogue(60, coverage=0.5, seed=1)
+        ids = load_catalogue(catalogue)
+        in_memory = catalogue_to_snapshot(catalogue).candidates_for_diet(1)
+        from_database = get_diet_candidates(ids['diets'][1])
+        for slot, items in in_memory.items():
+            self.assertEqual(
+                sorted((ids['recipes'][c['recipe'].pk], c['values']) for c in items),
+                sorted((c['recipe'].pk, c['values']) for c in from_database[slot]),
+            )
+
+    def test_benchmarks_report_every_engine_and_view(self):
+        from .benchmarks import benchmark_generator, benchmark_views, generate_catalogue, load_catalogue
+        from .generator import ENGINES
+
+        catalogue = generate_catalogue(40, seed=2)
+        rows = benchmark_generator(catalogue, runs=2)
+        self.assertEqual([row['engine'] for row in rows], list(ENGINES))
+        self.assertTrue(all(0 <= row['success_rate'] <= 1 for row in rows))
+
+        ids = load_catalogue(catalogue)
+        rows = benchmark_views(catalogue, ids['recipes'], runs=1)
+        queries = {row['view']: row['queries'] for row in rows}
+        self.assertTrue(set(queries).issuperset({'index', 'recipe_detail', 'recipe_list'}))
+        self.assertTrue(all(queries[view] > 0 for view in ('index_cold', 'recipe_detail_cold', 'recipe_list_cold')))
+        self.assertEqual(queries['recipe_list'], 0)
+
+
+class RequestTimingTests(CatalogueTestCase):
+    """Замеры этапов запроса: заголовок Server-Timing и выборочное профилирование."""
+
+    @override_settings(REQUEST_TIMING_HEADER=True)
+    def test_server_timing_header_lists_stages(self):
+        response = self.client.post(reverse('recipes:index'), {'diet': self.diet.id, 'calories': 2000})
+        stages = {metric.split(';')[0] for metric in response['Server-Timing'].split(', ')}
+        self.assertTrue({'diets', 'candidates', 'snapshot', 'generator', 'search_random', 'render', 'db', 'total'} <= stages)
+
+    @override_settings(CATALOGUE_SNAPSHOT_ENABLED=False)
+    def test_candidates_stage_is_timed_once(self):
+        with self.assertLogs('recipes.timing', 'INFO') as logs:
+            self.client.post(reverse('recipes:index'), {'diet': self.diet.id, 'calories': 2000})
+        stages = json.loads(logs.records[0].getMessage())['stages']
+        self.assertEqual(stages['candidates']['count'], 1)
+
+    @override_settings(REQUEST_TIMING_HEADER=False)
+    def test_header_is_optional(self):
+        with self.assertLogs('recipes.timing', 'INFO') as logs:
+            response = self.client.get(reverse('recipes:recipe_list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertIn('"path": "/recipes/"', logs.output[0])
+
+    def test_profiling_dumps_sampled_requests(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_DIR=directory):
+                self.client.get(reverse('recipes:recipe_list'))
+            self.assertEqual(len(list(Path(directory).glob('*.prof'))), 1)
@@ -0,0 +1,152 @@
+import io
+import json
+import logging
+import posixpath
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# Уменьшенные копии изображений (миниатюры) для карточек, рецепта и иконок диет
+# ==============================================================================
+# Для каждого изображения и варианта отображения (preset) создаются копии нужной
+# ширины в WebP и в запасном формате (JPEG, а для изображений с прозрачностью - PNG).
+# Шаблоны выводят их через <picture> и srcset (см. тег responsive_image), и браузер
+# загружает копию под ширину экрана вместо исходного файла.
+#
+# Копии и описание варианта (manifest.json: ширины и запасной формат) хранятся
+# в хранилище медиафайлов в каталоге thumbnails/<путь исходного файла>/. Описание
+# дополнительно запоминается в кэше, поэтому при выводе страницы хранилище не читается.
+# Копии создаются при сохранении рецепта или диеты (см. signals.py), при первом
+# выводе изображения или командой `python manage.py build_thumbnails`.
+
+# Варианты отображения: ширины копий (пиксели) и атрибут sizes для браузера.
+PRESETS = {
+    'card': {'widths': (360, 720), 'sizes': '(max-width: 768px) 100vw, 360px'},
+    'plan': {'widths': (200, 400), 'sizes': '200px'},
+    'detail': {'widths': (640, 960, 1280), 'sizes': '(max-width: 768px) 100vw, 50vw'},
+    'icon': {'widths': (48, 96), 'sizes': '48px'},
+}
+
+# Варианты, которые создаются заранее для полей моделей.
+RECIPE_IMAGE_PRESETS = ('card', 'plan', 'detail')
+DIET_ICON_PRESETS = ('icon',)
+
+THUMBNAILS_DIR = 'thumbnails'
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+# Время хранения описаний в кэше (сек): описание меняется только вместе с исходным файлом.
+MANIFEST_CACHE_TIMEOUT = 60 * 60 * 24
+
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+    'png': ('PNG', 'png'),
+}
+
+
+def thumbnail_dir(name, preset):
+    return posixpath.join(THUMBNAILS_DIR, name, preset)
+
+
+def thumbnail_name(name, preset, width, fmt):
+    return posixpath.join(thumbnail_dir(name, preset), f'{width}w.{FORMATS[fmt][1]}')
+
+
+def _manifest_name(name, preset):
+    return posixpath.join(thumbnail_dir(name, preset), 'manifest.json')
+
+
+def _cache_key(name, preset):
+    return f'recipes:thumbnails:{preset}:{name}'
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    pil_format = FORMATS[fmt][0]
+    if fmt == 'webp':
+        image.save(buffer, pil_format, quality=WEBP_QUALITY, method=4)
+    elif fmt == 'jpeg':
+        image.save(buffer, pil_format, quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, pil_format, optimize=True)
+    return buffer.getvalue()
+
+
+def generate_thumbnails(name, preset, storage=default_storage):
+    """
+    Создает копии изображения name для варианта preset и сохраняет их описание.
+    Копии не шире исходного изображения; если оно уже самой узкой копии, создается одна
+    копия исходной ширины. Для файлов, которые Pillow не может открыть (например, SVG),
+    сохраняется пустое описание, и шаблон выводит исходный файл.
+
+    Возвращает:
+        dict: описание {'widths': [...], 'fallback': 'jpeg' | 'png'}.
+    """
+    manifest = {'widths': [], 'fallback': 'jpeg'}
+    try:
+        with storage.open(name, 'rb') as source:
+            image = Image.open(source)
+            image.load()
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as error:
+        logger.info("Изображение %s выводится без уменьшенных копий: %s", name, error)
+    else:
+        # Поворот по EXIF (фото с телефона), затем приведение к RGB/RGBA.
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        manifest['fallback'] = 'png' if has_alpha else 'jpeg'
+
+        widths = [width for width in PRESETS[preset]['widths'] if width <= image.width] or [image.width]
+        for width in widths:
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+            for fmt in ('webp', manifest['fallback']):
+                target = thumbnail_name(name, preset, width, fmt)
+                if storage.exists(target):
+                    storage.delete(target)
+                storage.save(target, ContentFile(_encode(resized, fmt)))
+        manifest['widths'] = widths
+
+    manifest_name = _manifest_name(name, preset)
+    if storage.exists(manifest_name):
+        storage.delete(manifest_name)
+    storage.save(manifest_name, ContentFile(json.dumps(manifest).encode('utf-8')))
+    cache.set(_cache_key(name, preset), manifest, MANIFEST_CACHE_TIMEOUT)
+    return manifest
+
+
+def get_thumbnails(name, preset, storage=default_storage):
+    """
+    Описание копий изображения для варианта preset: из кэша, из хранилища или,
+    если копий еще нет, после их создания.
+    """
+    key = _cache_key(name, preset)
+    manifest = cache.get(key)
+    if manifest is not None:
+        return manifest
+
+    manifest_name = _manifest_name(name, preset)
+    if storage.exists(manifest_name):
+        with storage.open(manifest_name, 'rb') as file:
+            manifest = json.loads(file.read())
+        cache.set(key, manifest, MANIFEST_CACHE_TIMEOUT)
+        return manifest
+    return generate_thumbnails(name, preset, storage)
+
+
+def ensure_thumbnails(name, presets, force=False, storage=default_storage):
+    """Создает копии для нескольких вариантов (force - пересоздает уже существующие)."""
+    for preset in presets:
+        if force or not storage.exists(_manifest_name(name, preset)):
+            generate_thumbnails(name, preset, storage)
+
+
+def srcset(name, preset, fmt, widths, storage=default_storage):
+    """Значение атрибута srcset: 'url 360w, url 720w'."""
+    return ', '.join(f'{storage.url(thumbnail_name(name, preset, width, fmt))} {width}w' for width in widths)
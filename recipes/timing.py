@@ -0,0 +1,71 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+
+# ==============================================================================
+# Замеры времени этапов обработки запроса
+# ==============================================================================
+# Middleware (см. middleware.py) создает для запроса объект RequestTimings, а код
+# view и генератора отмечает свои этапы через `with timed('этап'):`. Вне запроса
+# (или если замеры отключены) timed ничего не делает, кроме одной проверки.
+
+_current_timings = contextvars.ContextVar('recipes_request_timings', default=None)
+
+
+class RequestTimings:
+    """Суммарное время и количество вызовов каждого этапа запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        duration, count = self.stages.get(stage, (0.0, 0))
+        self.stages[stage] = (duration + seconds, count + 1)
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        """Этапы в миллисекундах: {этап: {'ms': ..., 'count': ...}}."""
+        return {
+            stage: {'ms': round(duration * 1000, 3), 'count': count}
+            for stage, (duration, count) in self.stages.items()
+        }
+
+    def server_timing_header(self, total=None):
+        """Значение заголовка Server-Timing (https://www.w3.org/TR/server-timing/)."""
+        metrics = [f'{stage};dur={duration * 1000:.1f}' for stage, (duration, _) in self.stages.items()]
+        if total is not None:
+            metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+def start_request_timings():
+    """Начинает замеры для текущего запроса. Возвращает объект замеров и токен для stop_request_timings."""
+    timings = RequestTimings()
+    return timings, _current_timings.set(timings)
+
+
+def stop_request_timings(token):
+    _current_timings.reset(token)
+
+
+def get_request_timings():
+    """Замеры текущего запроса или None, если они не ведутся."""
+    return _current_timings.get()
+
+
+@contextmanager
+def timed(stage):
+    """Засекает время блока и добавляет его к этапу stage замеров текущего запроса."""
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage, time.perf_counter() - started)
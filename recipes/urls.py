@@ -5,6 +5,10 @@ app_name = 'recipes'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('plan/days/', views.meal_plan_days, name='meal_plan_days'),
+    path('api/meal-plan/', views.meal_plan_api, name='meal_plan_api'),
     path('recipe/<int:recipe_id>/', views.recipe_detail, name='recipe_detail'),
     path('recipes/', views.recipe_list, name='recipe_list'),
+    path('pantry/', views.pantry_search, name='pantry'),
+    path('ingredients/autocomplete/', views.ingredient_autocomplete, name='ingredient_autocomplete'),
 ]
\ No newline at end of file
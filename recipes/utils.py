@@ -1,48 +1,108 @@
-from decimal import Decimal # Используем Decimal для точных расчетов
+from .fixedpoint import NUTRIENTS, SCALE, TOTALS_DIGITS, TOTALS_SCALE, divide_round, from_fixed, to_fixed
+from .models import RecipeNutrition
 
-def calculate_recipe_nutrition(recipe):
+def calculate_recipe_totals(recipe):
     """
-    Рассчитывает пищевую ценность (КБЖУ) для всего рецепта
-    и для одной порции на основе его ингредиентов.
+    Рассчитывает суммарную пищевую ценность (КБЖУ) всех ингредиентов рецепта без округления.
 
     Аргументы:
         recipe (Recipe): объект модели Recipe.
 
     Возвращает:
-        dict: Словарь с рассчитанными значениями КБЖУ.
+        dict: Словарь с ключами total_calories, total_proteins, total_fats, total_carbs.
     """
-    total_calories = Decimal(0)
-    total_proteins = Decimal(0)
-    total_fats = Decimal(0)
-    total_carbs = Decimal(0)
+    # Суммы считаются в целых числах (см. fixedpoint.py): значение на 100 г в сотых долях,
+    # умноженное на вес в граммах, - это точная сумма в десятитысячных долях.
+    totals = [0, 0, 0, 0]
 
-    # 1. Проходим по всем ингредиентам в рецепте через связующую модель.
+    # Проходим по всем ингредиентам в рецепте через связующую модель.
     for item in recipe.recipeingredient_set.all():
         ingredient = item.ingredient
-        # Коэффициент для пересчета КБЖУ со 100г на реальный вес в рецепте.
-        weight_factor = Decimal(item.weight_grams) / Decimal(100)
-        
-        total_calories += ingredient.calories * weight_factor
-        total_proteins += ingredient.proteins * weight_factor
-        total_fats += ingredient.fats * weight_factor
-        total_carbs += ingredient.carbs * weight_factor
-        
-    # 2. Рассчитываем КБЖУ на одну порцию
-    servings = Decimal(recipe.servings)
+        weight = item.weight_grams
+
+        totals[0] += to_fixed(ingredient.calories) * weight
+        totals[1] += to_fixed(ingredient.proteins) * weight
+        totals[2] += to_fixed(ingredient.fats) * weight
+        totals[3] += to_fixed(ingredient.carbs) * weight
+
+    return {f'total_{name}': from_fixed(value, TOTALS_DIGITS) for name, value in zip(NUTRIENTS, totals)}
+
+
+def calculate_nutrition_from_totals(totals, servings):
+    """
+    Рассчитывает КБЖУ на одну порцию по суммарным значениям рецепта.
+
+    Аргументы:
+        totals (dict): результат calculate_recipe_totals (или аналогичный словарь).
+        servings (int): количество порций в рецепте.
+
+    Возвращает:
+        dict: Словарь с рассчитанными значениями КБЖУ.
+    """
+    fixed_totals = {name: to_fixed(totals[f'total_{name}'], TOTALS_DIGITS) for name in NUTRIENTS}
+    # Переход от десятитысячных долей к сотым.
+    divisor = TOTALS_SCALE // SCALE
+
     if servings > 0:
-        calories_per_serving = total_calories / servings
-        proteins_per_serving = total_proteins / servings
-        fats_per_serving = total_fats / servings
-        carbs_per_serving = total_carbs / servings
+        per_serving = {name: divide_round(value, divisor * servings) for name, value in fixed_totals.items()}
     else:
         # На случай, если в базе у рецепта почему-то 0 порций
-        calories_per_serving = proteins_per_serving = fats_per_serving = carbs_per_serving = Decimal(0)
-        
-    # 3. Возвращает результат с округленными значениями.
-    return {
-        'total_calories': round(total_calories, 2),
-        'calories_per_serving': round(calories_per_serving, 2),
-        'proteins_per_serving': round(proteins_per_serving, 2),
-        'fats_per_serving': round(fats_per_serving, 2),
-        'carbs_per_serving': round(carbs_per_serving, 2),
-    }
\ No newline at end of file
+        per_serving = dict.fromkeys(NUTRIENTS, 0)
+
+    # Возвращает результат с округленными значениями.
+    result = {'total_calories': from_fixed(divide_round(fixed_totals['calories'], divisor))}
+    result.update({f'{name}_per_serving': from_fixed(value) for name, value in per_serving.items()})
+    return result
+
+
+def calculate_recipe_nutrition(recipe):
+    """
+    Рассчитывает пищевую ценность (КБЖУ) для всего рецепта
+    и для одной порции на основе его ингредиентов.
+
+    Аргументы:
+        recipe (Recipe): объект модели Recipe.
+
+    Возвращает:
+        dict: Словарь с рассчитанными значениями КБЖУ.
+    """
+    return calculate_nutrition_from_totals(calculate_recipe_totals(recipe), recipe.servings)
+
+
+def recipe_nutrition_fields(recipe, totals=None):
+    """
+    Формирует значения полей RecipeNutrition для рецепта: суммы без округления
+    и округленные значения на порцию.
+    Если суммарные значения уже известны (totals), обход ингредиентов пропускается.
+    """
+    if totals is None:
+        totals = calculate_recipe_totals(recipe)
+    nutrition = calculate_nutrition_from_totals(totals, recipe.servings)
+
+    fields = dict(totals)
+    fields.update({key: value for key, value in nutrition.items() if 'per_serving' in key})
+    return fields
+
+
+def update_recipe_nutrition(recipe, totals=None):
+    """
+    Пересчитывает и сохраняет КБЖУ рецепта в таблицу RecipeNutrition.
+
+    Возвращает:
+        RecipeNutrition: сохраненный объект.
+    """
+    defaults = recipe_nutrition_fields(recipe, totals)
+    recipe_nutrition, _ = RecipeNutrition.objects.update_or_create(recipe=recipe, defaults=defaults)
+    return recipe_nutrition
+
+
+def get_recipe_nutrition(recipe):
+    """
+    Возвращает КБЖУ рецепта из таблицы RecipeNutrition (в формате calculate_recipe_nutrition).
+    Если для рецепта еще нет сохраненных значений, рассчитывает и сохраняет их.
+    """
+    try:
+        recipe_nutrition = recipe.nutrition
+    except RecipeNutrition.DoesNotExist:
+        recipe_nutrition = update_recipe_nutrition(recipe)
+    return recipe_nutrition.as_dict()
@@ -0,0 +1,196 @@
+import numpy as np
+
+from .fixedpoint import SCALE, to_fixed
+from .generator import (
+    DEFAULT_MEAL_LAYOUT, MAX_SERVINGS, MEAL_BALANCE_PENALTY, meal_type_slot_counts, prune_slot_candidates,
+    same_type_slots,
+)
+
+# Индексы показателей в массивах КБЖУ.
+CALORIES, PROTEINS, FATS, CARBS = range(4)
+
+# Для планов не больше чем из стольких слотов перебираются все варианты порций;
+# для большего числа слотов (с перекусами) - столько же вариантов около подобранных порций.
+FULL_GRID_SLOTS = 3
+
+
+def pack_nutrition(recipes_with_nutrition):
+    """
+    Упаковывает КБЖУ на порцию для списка рецептов в массив float формы (n, 4).
+    """
+    values = np.array([r['values'] for r in recipes_with_nutrition], dtype=np.float64).reshape(-1, 4)
+    return values / SCALE
+
+
+def servings_grid(max_servings, slot_count=3):
+    """
+    Все варианты порций (1..max_servings) для slot_count приемов пищи,
+    массив формы (max_servings ** slot_count, slot_count).
+    """
+    values = np.arange(1, max_servings + 1, dtype=np.float64)
+    grid = np.meshgrid(*[values] * slot_count, indexing='ij')
+    return np.stack([axis.ravel() for axis in grid], axis=1)
+
+
+def ideal_slot_calories(target_calories, layout=DEFAULT_MEAL_LAYOUT):
+    """"Идеальные" калории слотов layout для целевой калорийности, массив (S,)."""
+    target = float(target_calories)
+    return np.array([target * percent / 100 for _, _, percent in layout])
+
+
+def score_combinations(per_serving, servings, target, ideal):
+    """
+    Суммарное КБЖУ и штраф (в ккал^2, то есть score_meal_plan / SCORE_SCALE) для
+    комбинаций рецептов с вариантами порций.
+
+    Аргументы:
+        per_serving: КБЖУ на порцию рецептов комбинаций, массив (B, S, 4).
+        servings: варианты порций, массив (1, K, S) или (B, K, S).
+        target (float): целевая калорийность.
+        ideal: "идеальные" калории слотов, массив (S,).
+
+    Возвращает:
+        tuple: (суммы КБЖУ (B, K, 4), штрафы (B, K)).
+    """
+    # КБЖУ с учетом порций: (B, K, S, 4)
+    scaled = per_serving[:, None, :, :] * servings[..., None]
+    meal_calories = scaled[..., CALORIES]                       # (B, K, S)
+    totals = scaled.sum(axis=2)                                 # (B, K, 4)
+
+    # Штраф = (отклонение по общим калориям)^2 + (штрафы за дисбаланс по приемам пищи).
+    score = (totals[..., CALORIES] - target) ** 2
+    score += ((meal_calories - ideal) ** 2).sum(axis=2) * float(MEAL_BALANCE_PENALTY)
+    return totals, score
+
+
+def search_meal_plan_vectorized(candidates, target_calories, nutrition_targets,
+                                number_of_samples=5000, max_servings=MAX_SERVINGS, batch_size=1000, rng=None,
+                                layout=DEFAULT_MEAL_LAYOUT):
+    """
+    Пакетный поиск плана питания на NumPy.
+
+    Вместо 300 последовательных попыток с подгонкой порций оценивает сразу тысячи
+    комбинаций (по рецепту на каждый слот layout x количество порций каждого блюда
+    от 1 до max_servings). Рецепты для слотов предварительно отбираются по калорийности
+    (generator.prune_slot_candidates). Если всех комбинаций меньше, чем number_of_samples,
+    перебираются все, иначе - случайная выборка. Для планов с перекусами вместо всех
+    вариантов порций оцениваются варианты около подобранных (см. FULL_GRID_SLOTS), а
+    перекусы получают разные рецепты. Ограничения по БЖУ и формула штрафа те же, что и
+    в generator.search_meal_plan_random.
+
+    rng - numpy.random.Generator или random.Random (из него берется зерно для NumPy).
+
+    Возвращает:
+        dict | None: план в формате find_best_meal_plan (без финальной проверки отклонения).
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    elif not isinstance(rng, np.random.Generator):
+        rng = np.random.default_rng(rng.getrandbits(64))
+
+    slot_count = len(layout)
+    target = float(target_calories)
+    ideal = ideal_slot_calories(target_calories, layout)
+
+    # Кандидаты слотов после отбора по калорийности ("идеальные" калории - в сотых долях x 100)
+    # и подобранное для каждого из них число порций.
+    slot_counts = meal_type_slot_counts(layout)
+    pruned = [
+        prune_slot_candidates(
+            candidates[meal_type], to_fixed(target_calories) * percent, max_servings, slot_counts[meal_type]
+        )
+        for _, meal_type, percent in layout
+    ]
+    slot_candidates = [[data for data, _ in options] for options in pruned]
+    packed = [pack_nutrition(recipes) for recipes in slot_candidates]
+    sizes = [len(values) for values in packed]
+
+    # Варианты порций. Полная сетка растет как max_servings ** slot_count, поэтому для планов
+    # с перекусами вместо нее для каждой комбинации оцениваются подобранные порции и
+    # столько же, сколько в сетке для FULL_GRID_SLOTS слотов, случайных отклонений от них
+    # на одну порцию: объем вычислений и промежуточных массивов остается как для трех слотов.
+    if slot_count <= FULL_GRID_SLOTS:
+        grid = servings_grid(max_servings, slot_count)[None, :, :]  # (1, K, S)
+        fitted = offsets = None
+    else:
+        fitted = [np.array([servings for _, servings in options], dtype=np.float64) for options in pruned]
+        offsets = rng.integers(-1, 2, size=(max_servings ** FULL_GRID_SLOTS, slot_count)).astype(np.float64)
+        offsets[0] = 0                                              # (K, S)
+
+    # Слоты того же типа, что и предыдущие (перекусы): одинаковые рецепты в них не допускаются,
+    # если рецептов этого типа хватает.
+    recipe_ids = [np.array([id(data) for data in recipes]) for recipes in slot_candidates]
+    distinct_pairs = [
+        (index, other)
+        for index, others in same_type_slots(layout).items() if sizes[index] > len(others)
+        for other in others
+    ]
+
+    # 1. Выбор комбинаций рецептов
+    #---------------------------------------------------------------------------
+    total_combinations = int(np.prod(sizes, dtype=np.float64))
+    if total_combinations <= number_of_samples:
+        combinations = np.stack(
+            np.unravel_index(np.arange(total_combinations), sizes), axis=1
+        )
+    else:
+        combinations = np.stack([rng.integers(0, size, number_of_samples) for size in sizes], axis=1)
+
+    # 2. Константы для оценки
+    #---------------------------------------------------------------------------
+    min_proteins = float(nutrition_targets['proteins'])
+    min_fats = float(nutrition_targets['fats'])
+    carbs_limit = float(nutrition_targets['carbs'])
+    carb_constraint_type = nutrition_targets['carb_constraint_type']
+
+    best_score = np.inf
+    best_combination = None
+    best_servings = None
+
+    # 3. Пакетная оценка: (комбинации в пакете) x (варианты порций)
+    #---------------------------------------------------------------------------
+    for start in range(0, len(combinations), batch_size):
+        batch = combinations[start:start + batch_size]
+
+        # КБЖУ на порцию для каждого слота: (B, S, 4)
+        per_serving = np.stack([packed[i][batch[:, i]] for i in range(slot_count)], axis=1)
+
+        # Варианты порций для комбинаций пакета: (1, K, S) или (B, K, S)
+        if fitted is None:
+            servings = grid
+        else:
+            base = np.stack([fitted[i][batch[:, i]] for i in range(slot_count)], axis=1)
+            servings = np.clip(base[:, None, :] + offsets[None, :, :], 1, max_servings)
+
+        totals, score = score_combinations(per_serving, servings, target, ideal)
+
+        # Жесткие ограничения по БЖУ.
+        valid = (totals[..., PROTEINS] >= min_proteins) & (totals[..., FATS] >= min_fats)
+        if carb_constraint_type == 'AT_MOST':
+            valid &= totals[..., CARBS] <= carbs_limit
+        elif carb_constraint_type == 'AT_LEAST':
+            valid &= totals[..., CARBS] >= carbs_limit
+        for index, other in distinct_pairs:
+            valid &= (recipe_ids[index][batch[:, index]] != recipe_ids[other][batch[:, other]])[:, None]
+
+        score = np.where(valid, score, np.inf)
+
+        flat_index = int(np.argmin(score))
+        combination_index, servings_index = np.unravel_index(flat_index, score.shape)
+        if score[combination_index, servings_index] < best_score:
+            best_score = score[combination_index, servings_index]
+            best_combination = batch[combination_index]
+            best_servings = servings[0 if fitted is None else combination_index, servings_index]
+
+    if best_combination is None:
+        return None
+
+    # 4. Сборка результата в формате find_best_meal_plan
+    #---------------------------------------------------------------------------
+    return {
+        slot: {
+            'recipe_data': slot_candidates[i][int(best_combination[i])],
+            'servings': int(best_servings[i]),
+        }
+        for i, (slot, _, _) in enumerate(layout)
+    }
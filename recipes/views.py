@@ -1,27 +1,116 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, get_object_or_404
-from .models import Diet, Recipe, Ingredient
-from .utils import calculate_recipe_nutrition
-from .generator import find_best_meal_plan
-from decimal import Decimal
+from django.urls import reverse
+from django.views.decorators.http import require_GET
+from .models import Diet, Recipe, Ingredient, IngredientGroup
+from .utils import get_recipe_nutrition
+from .caching import cached_page, get_catalogue_version, get_meal_plan, get_cached_recipe_count
+from .fixedpoint import NUTRIENTS, from_fixed
+from .generator import diet_meal_layout, find_best_meal_plan, find_meal_plans_for_days, plan_totals, sum_plans_totals
+from .pagination import paginate_by_keyset
+from .pantry import search_pantry
+from .routers import replica_reads
+from .search import search_recipes
+from .snapshot import expand_excluded_ingredients, get_diet_candidates, hydrate_meal_plans
+from .timing import timed
+from .workers import GeneratorBusy, run_in_pool
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
 from django.db import models
 
 
+# ==============================================================================
+# Вспомогательные функции для страниц генератора меню
+# ==============================================================================
+def _get_ordered_diets():
+    """Список диет для формы: "Сбалансированная" первой в списке для удобства."""
+    try:
+        balanced_diet = Diet.objects.get(name="Сбалансированная")
+        other_diets = Diet.objects.exclude(name="Сбалансированная").order_by('name')
+        return [balanced_diet] + list(other_diets)
+    except Diet.DoesNotExist:
+        return list(Diet.objects.all().order_by('name'))
+
+
+def _build_nutrition_targets(diet, target_calories):
+    """Рассчитывает целевые пороги БЖУ на день для диеты и калорийности."""
+    calories_factor = Decimal(target_calories) / Decimal(1000)
+    return {
+        'proteins': round(diet.protein_per_1000_kcal * calories_factor),
+        'fats': round(diet.fat_per_1000_kcal * calories_factor),
+        'carbs': round(diet.carb_per_1000_kcal * calories_factor),
+        'carb_constraint_type': diet.carbs_constraint,
+        'carb_constraint_text': diet.get_carbs_constraint_display()
+    }
+
+
+def _parse_ids(values):
+    """id из списка параметров запроса: мусорные значения пропускаются, повторы убираются."""
+    return sorted({int(value) for value in values if value.isdigit()})
+
+
+def _parse_exclusions(params):
+    """
+    Исключенные ингредиенты и группы ингредиентов из параметров exclude_ingredients и exclude_groups.
+
+    Возвращает:
+        tuple: (список id ингредиентов, список id групп).
+    """
+    return _parse_ids(params.getlist('exclude_ingredients')), _parse_ids(params.getlist('exclude_groups'))
+
+
+def _exclusions_context(exclusions):
+    """Данные для блока исключений в форме (шаблон recipes/exclusion_filter.html)."""
+    ingredient_ids, group_ids = exclusions
+    return {
+        'ingredient_groups': IngredientGroup.objects.all(),
+        'excluded_groups': group_ids,
+        'excluded_ingredients_list': Ingredient.objects.filter(id__in=ingredient_ids).only('id', 'name'),
+    }
+
+
+def _build_plan_for_template(meal_plan_raw):
+    """
+    Преобразует результат генератора в данные для шаблона:
+    КБЖУ каждого блюда масштабируется на количество порций и суммируется.
+
+    Возвращает:
+        tuple: (план для шаблона, суммарное КБЖУ за день).
+    """
+    final_plan_for_template = {}
+    for meal_type, data in meal_plan_raw.items():
+        recipe_data = data['recipe_data']
+        servings = data['servings']
+        
+        # Масштабируем КБЖУ на количество порций (в Decimal переводим только для вывода)
+        nutrition = {
+            f'{name}_per_serving': from_fixed(value * servings) for name, value in zip(NUTRIENTS, recipe_data['values'])
+        }
+        
+        final_plan_for_template[meal_type] = {
+            'recipe': recipe_data['recipe'],
+            'servings': servings,
+            'nutrition': nutrition,
+        }
+
+    return final_plan_for_template, plan_totals(meal_plan_raw)
+
+
 # ==============================================================================
 # View для главной страницы (генератор меню)
 # ==============================================================================
+@replica_reads
 def index(request):
     """
     Отображает главную страницу с формой генерации меню.
     При POST-запросе обрабатывает данные, запускает генератор и выводит результат.
     """
     # Шаг 1: Подготовка данных для формы.
-    # Ставим "Сбалансированную" диету первой в списке для удобства.
-    try:
-        balanced_diet = Diet.objects.get(name="Сбалансированная")
-        other_diets = Diet.objects.exclude(name="Сбалансированная").order_by('name')
-        all_diets = [balanced_diet] + list(other_diets)
-    except Diet.DoesNotExist:
-        all_diets = list(Diet.objects.all().order_by('name'))
+    with timed('diets'):
+        all_diets = _get_ordered_diets()
 
     # --- ЭТАП 2: Инициализация контекста для первого захода на страницу (GET) ---
     context = {
@@ -32,6 +121,7 @@ def index(request):
         'total_nutrition': None,
         'nutrition_targets': None,
         'error_message': None,
+        **_exclusions_context(((), ())),
     }
 
     # --- ЭТАП 3: ОБРАБОТКА POST-ЗАПРОСА ---
@@ -40,91 +130,328 @@ def index(request):
             # Получаем данные от пользователя
             diet_id = int(request.POST.get('diet'))
             target_calories = int(request.POST.get('calories', 2000))
+            exclusions = _parse_exclusions(request.POST)
             selected_diet = get_object_or_404(Diet, id=diet_id)
             
             # Обновляем контекст, чтобы "запомнить" выбор пользователя
             context.update({
                 'selected_diet': selected_diet,
                 'calories_value': target_calories,
+                **_exclusions_context(exclusions),
             })
 
             # Рассчитываем и обновляем в контексте целевые пороги БЖУ
-            calories_factor = Decimal(target_calories) / Decimal(1000)
-            nutrition_targets = {
-                'proteins': round(selected_diet.protein_per_1000_kcal * calories_factor),
-                'fats': round(selected_diet.fat_per_1000_kcal * calories_factor),
-                'carbs': round(selected_diet.carb_per_1000_kcal * calories_factor),
-                'carb_constraint_type': selected_diet.carbs_constraint,
-                'carb_constraint_text': selected_diet.get_carbs_constraint_display()
-            }
+            nutrition_targets = _build_nutrition_targets(selected_diet, target_calories)
             context['nutrition_targets'] = nutrition_targets
             
-            # Запуск генератора
-            possible_recipes = Recipe.objects.filter(diets=selected_diet)
+            # Запуск генератора (кандидаты берутся из снимка каталога в памяти)
+            with timed('candidates'):
+                possible_recipes = get_diet_candidates(selected_diet.pk, *exclusions)
             targets_for_generator = nutrition_targets.copy()
             targets_for_generator.pop('carb_constraint_text')
-            meal_plan_raw = find_best_meal_plan(possible_recipes, target_calories, targets_for_generator)
+            with timed('generator'):
+                meal_plan_raw = get_meal_plan(
+                    selected_diet, possible_recipes, target_calories, targets_for_generator,
+                    engine=settings.MEAL_PLAN_ENGINE, exclusions=exclusions,
+                )
         
             # Обработка результата генератора
             if meal_plan_raw:
-                final_plan_for_template = {}
-                total_nutrition = {'calories': 0, 'proteins': 0, 'fats': 0, 'carbs': 0}
-
-                for meal_type, data in meal_plan_raw.items():
-                    recipe_data = data['recipe_data']
-                    servings = data['servings']
-                    
-                    # Масштабируем КБЖУ на количество порций
-                    nutrition = {key: value * servings for key, value in recipe_data['nutrition'].items() if 'per_serving' in key}
-                    
-                    final_plan_for_template[meal_type] = {
-                        'recipe': recipe_data['recipe'],
-                        'servings': servings,
-                        'nutrition': nutrition,
-                    }
-                    
-                    total_nutrition['calories'] += nutrition['calories_per_serving']
-                    total_nutrition['proteins'] += nutrition['proteins_per_serving']
-                    total_nutrition['fats'] += nutrition['fats_per_serving']
-                    total_nutrition['carbs'] += nutrition['carbs_per_serving']
-                
-                context['meal_plan'] = final_plan_for_template
-                context['total_nutrition'] = total_nutrition
+                with timed('hydrate'):
+                    meal_plan_raw, = hydrate_meal_plans([meal_plan_raw])
+                context['meal_plan'], context['total_nutrition'] = _build_plan_for_template(meal_plan_raw)
             else:
                 context['error_message'] = "К сожалению, не удалось составить меню..."
 
         except (ValueError, TypeError, Diet.DoesNotExist):
             context['error_message'] = "Произошла ошибка. Пожалуйста, проверьте введенные данные и попробуйте снова."
     
-    return render(request, 'recipes/index.html', context)
+    with timed('render'):
+        return render(request, 'recipes/index.html', context)
+
+
+# ==============================================================================
+# View для генерации меню на несколько дней
+# ==============================================================================
+MAX_PLAN_DAYS = 14
+
+@replica_reads
+def meal_plan_days(request):
+    """
+    Отображает форму генерации меню на несколько дней (по умолчанию - на неделю).
+    При POST-запросе составляет планы на все дни за один вызов генератора,
+    без повторения блюд, и выводит суммарное КБЖУ за весь период.
+    """
+    all_diets = _get_ordered_diets()
+
+    context = {
+        'diets': all_diets,
+        'selected_diet': all_diets[0] if all_diets else None,
+        'calories_value': (all_diets[0].default_calories if all_diets else 2000),
+        'days_value': 7,
+        'max_days': MAX_PLAN_DAYS,
+        'day_plans': None,
+        'period_nutrition': None,
+        'nutrition_targets': None,
+        'error_message': None,
+        **_exclusions_context(((), ())),
+    }
+
+    if request.method == 'POST':
+        try:
+            diet_id = int(request.POST.get('diet'))
+            target_calories = int(request.POST.get('calories', 2000))
+            days = int(request.POST.get('days', 7))
+            if not 1 <= days <= MAX_PLAN_DAYS:
+                raise ValueError
+            exclusions = _parse_exclusions(request.POST)
+            selected_diet = get_object_or_404(Diet, id=diet_id)
+
+            context.update({
+                'selected_diet': selected_diet,
+                'calories_value': target_calories,
+                'days_value': days,
+                **_exclusions_context(exclusions),
+            })
+
+            nutrition_targets = _build_nutrition_targets(selected_diet, target_calories)
+            context['nutrition_targets'] = nutrition_targets
+
+            possible_recipes = get_diet_candidates(selected_diet.pk, *exclusions)
+            targets_for_generator = nutrition_targets.copy()
+            targets_for_generator.pop('carb_constraint_text')
+            meal_plans_raw = find_meal_plans_for_days(
+                possible_recipes, target_calories, targets_for_generator, days, engine=settings.MEAL_PLAN_ENGINE,
+                layout=diet_meal_layout(selected_diet),
+            )
+
+            if any(meal_plans_raw):
+                meal_plans_raw = hydrate_meal_plans(meal_plans_raw)
+                day_plans = []
+                for day_number, meal_plan_raw in enumerate(meal_plans_raw, start=1):
+                    meal_plan, total_nutrition = (
+                        _build_plan_for_template(meal_plan_raw) if meal_plan_raw else (None, None)
+                    )
+                    day_plans.append({'day': day_number, 'meal_plan': meal_plan, 'total_nutrition': total_nutrition})
+                context['day_plans'] = day_plans
+                context['period_nutrition'] = sum_plans_totals(meal_plans_raw)
+            else:
+                context['error_message'] = "К сожалению, не удалось составить меню..."
+
+        except (ValueError, TypeError, Diet.DoesNotExist):
+            context['error_message'] = "Произошла ошибка. Пожалуйста, проверьте введенные данные и попробуйте снова."
+
+    return render(request, 'recipes/meal_plan_days.html', context)
+
+
+# ==============================================================================
+# JSON API генератора меню
+# ==============================================================================
+def _generate_meal_plan(diet, layout, possible_recipes, target_calories, nutrition_targets, seed, exclusions):
+    """
+    Запуск генератора для API (выполняется в пуле потоков, без обращений к базе).
+    Без seed план берется из кэша, с seed - генерируется заново и воспроизводимо.
+    """
+    if seed is None:
+        return get_meal_plan(
+            diet, possible_recipes, target_calories, nutrition_targets,
+            engine=settings.MEAL_PLAN_ENGINE, exclusions=exclusions, layout=layout,
+        )
+    return find_best_meal_plan(
+        possible_recipes, target_calories, nutrition_targets, engine=settings.MEAL_PLAN_ENGINE, seed=seed,
+        layout=layout,
+    )
+
+
+def _serialize_meal_plan(meal_plan_raw):
+    """Преобразует план генератора в словарь для JSON: блюда и итоговое КБЖУ за день."""
+    meal_plan, total_nutrition = _build_plan_for_template(meal_plan_raw)
+    meals = {}
+    for meal_type, data in meal_plan.items():
+        recipe = data['recipe']
+        nutrition = data['nutrition']
+        meals[meal_type] = {
+            'recipe_id': recipe.id,
+            'name': recipe.name,
+            'url': reverse('recipes:recipe_detail', args=[recipe.id]),
+            'servings': data['servings'],
+            'calories': float(round(nutrition['calories_per_serving'], 2)),
+            'proteins': float(round(nutrition['proteins_per_serving'], 2)),
+            'fats': float(round(nutrition['fats_per_serving'], 2)),
+            'carbs': float(round(nutrition['carbs_per_serving'], 2)),
+        }
+    total = {key: float(round(value, 2)) for key, value in total_nutrition.items()}
+    return meals, total
+
+
+@require_GET
+async def meal_plan_api(request):
+    """
+    Генерирует план питания на день и возвращает его в формате JSON.
+
+    Параметры запроса: diet (id диеты), calories (целевая калорийность),
+    seed (необязательно, целое число - для воспроизводимого результата),
+    exclude_ingredients и exclude_groups (необязательно, можно несколько раз) -
+    исключенные ингредиенты и группы ингредиентов.
+
+    Генератор выполняется в пуле потоков (см. workers.py): при ASGI-развертывании
+    цикл событий не блокируется. Если генератор уже запущен для
+    MEAL_PLAN_API_MAX_CONCURRENCY запросов, возвращается 503, а если результат
+    не получен за MEAL_PLAN_API_TIMEOUT секунд - 504.
+    """
+    try:
+        diet_id = int(request.GET['diet'])
+        target_calories = int(request.GET['calories'])
+        seed = request.GET.get('seed') or None
+        if seed is not None:
+            seed = int(seed)
+        if target_calories <= 0:
+            raise ValueError
+        exclusions = _parse_exclusions(request.GET)
+    except (KeyError, ValueError):
+        return JsonResponse(
+            {'error': "Укажите id диеты (diet) и положительную калорийность (calories); seed - целое число."},
+            status=400,
+        )
+
+    try:
+        diet = await Diet.objects.aget(pk=diet_id)
+    except Diet.DoesNotExist:
+        return JsonResponse({'error': "Диета не найдена."}, status=404)
+
+    # Слоты плана проверяются до запуска генератора: ошибка в сохраненных настройках
+    # диеты (например, доли калорий в сумме не 100%) - ошибка сервера, а не запроса.
+    try:
+        layout = diet_meal_layout(diet)
+    except ValueError as error:
+        return JsonResponse({'error': f"Некорректные настройки диеты: {error}."}, status=500)
+
+    nutrition_targets = _build_nutrition_targets(diet, target_calories)
+    targets_for_generator = nutrition_targets.copy()
+    targets_for_generator.pop('carb_constraint_text')
+
+    # Кандидаты берутся из снимка каталога (при смене версии каталога снимок перестраивается
+    # с обращением к базе, поэтому вызов выполняется вне цикла событий).
+    possible_recipes = await sync_to_async(get_diet_candidates)(diet.pk, *exclusions)
+
+    try:
+        meal_plan_raw = await run_in_pool(
+            _generate_meal_plan, diet, layout, possible_recipes, target_calories, targets_for_generator, seed,
+            exclusions,
+            timeout=settings.MEAL_PLAN_API_TIMEOUT,
+        )
+    except GeneratorBusy:
+        response = JsonResponse({'error': "Сервер занят, повторите запрос позже."}, status=503)
+        response['Retry-After'] = '1'
+        return response
+    except asyncio.TimeoutError:
+        return JsonResponse({'error': "Не удалось составить меню за отведенное время."}, status=504)
+
+    data = {
+        'diet': diet.id,
+        'calories': target_calories,
+        'seed': seed,
+        'excluded': {'ingredients': exclusions[0], 'groups': exclusions[1]},
+        'targets': {
+            'proteins': nutrition_targets['proteins'],
+            'fats': nutrition_targets['fats'],
+            'carbs': nutrition_targets['carbs'],
+            'carb_constraint_type': nutrition_targets['carb_constraint_type'],
+        },
+        'plan': None,
+        'total': None,
+    }
+    if meal_plan_raw:
+        data['plan'], data['total'] = _serialize_meal_plan(meal_plan_raw)
+    return JsonResponse(data)
 
 
 # ==============================================================================
 # View для детальной страницы рецепта
 # ==============================================================================
+@replica_reads
 def recipe_detail(request, recipe_id):
     """
     Отображает страницу с полной информацией о конкретном рецепте,
     включая ингредиенты, инструкцию и рассчитанный КБЖУ.
+    Страница кэшируется (см. caching.cached_page) до изменения самого рецепта: ключ и
+    Last-Modified - время его изменения (Recipe.updated_at, его обновляют и изменения
+    состава, см. signals.touch_recipes), поэтому правки других рецептов страницу не сбрасывают.
     """
-    recipe = get_object_or_404(Recipe, pk=recipe_id)
-    nutrition = calculate_recipe_nutrition(recipe)
+    updated_at = Recipe.objects.filter(pk=recipe_id).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        raise Http404("Рецепт не найден.")
+    return cached_page(
+        request, 'recipe_detail', recipe_id, lambda: _render_recipe_detail(request, recipe_id),
+        version=updated_at.isoformat(),
+    )
+
+
+def _render_recipe_detail(request, recipe_id):
+    recipe = get_object_or_404(Recipe.objects.for_detail(), pk=recipe_id)
+    nutrition = get_recipe_nutrition(recipe)
     context = {
         'recipe': recipe,
         'nutrition': nutrition,
     }
-    return render(request, 'recipes/recipe_detail.html', context)
+    return render(request, 'recipes/recipe_detail.html', context), int(recipe.updated_at.timestamp())
 
 
 # ==============================================================================
 # View для каталога рецептов
 # ==============================================================================
+@replica_reads
 def recipe_list(request):
     """
     Отображает страницу с каталогом всех рецептов.
     Реализует сложную фильтрацию и сортировку на основе GET-параметров.
+    Страница кэшируется для каждой комбинации параметров (см. caching.cached_page),
+    Last-Modified - время последнего изменения каталога.
+    """
+    return cached_page(
+        request, 'recipe_list', sorted(request.GET.lists()),
+        lambda: (_render_recipe_list(request), get_catalogue_version() // 10 ** 9),
+    )
+
+
+# Показатели для фильтров и сортировки каталога по КБЖУ на порцию.
+NUTRITION_FILTER_LABELS = (
+    ('calories', "Калории, ккал"),
+    ('proteins', "Белки, г"),
+    ('fats', "Жиры, г"),
+    ('carbs', "Углеводы, г"),
+)
+
+
+def _parse_nutrition_ranges(params):
+    """
+    Диапазоны КБЖУ на порцию из GET-параметров min_<показатель> и max_<показатель>
+    (например, max_calories=400, min_proteins=30). Некорректные и отрицательные значения игнорируются.
+
+    Возвращает:
+        dict: {показатель: (от, до)} только для заданных показателей, границы - Decimal или None.
     """
-    recipes = Recipe.objects.filter(is_simple_ingredient=False)
+    ranges = {}
+    for nutrient in NUTRIENTS:
+        bounds = tuple(_parse_amount(params.get(f'{bound}_{nutrient}')) for bound in ('min', 'max'))
+        if bounds != (None, None):
+            ranges[nutrient] = bounds
+    return ranges
+
+
+def _parse_amount(value):
+    try:
+        amount = Decimal((value or '').strip().replace(',', '.'))
+    except InvalidOperation:
+        return None
+    if not amount.is_finite() or amount < 0:
+        return None
+    # Столбцы КБЖУ хранят 2 знака после запятой (max_digits=10).
+    return min(amount, Decimal('99999999')).quantize(Decimal('0.01'))
+
+
+def _render_recipe_list(request):
+    recipes = Recipe.objects.filter(is_simple_ingredient=False).for_catalogue_card()
     diets = Diet.objects.all().order_by('name')
     meal_types = Recipe.MEAL_TYPE_CHOICES
 
@@ -133,8 +460,12 @@ def recipe_list(request):
     selected_meal_type = request.GET.get('meal_type')
     max_cooking_time = request.GET.get('max_time')
     included_ingredients = request.GET.getlist('ingredients')
-    search_query = request.GET.get('q')
-    sort_by = request.GET.get('sort', 'name') # По умолчанию сортируем по названию
+    excluded_ingredients = request.GET.getlist('exclude_ingredients')
+    ingredients_mode = request.GET.get('ingredients_mode', 'all')
+    search_query = request.GET.get('q', '').strip()
+    nutrition_ranges = _parse_nutrition_ranges(request.GET)
+    # По умолчанию сортируем по названию, а при поиске - по релевантности
+    sort_by = request.GET.get('sort') or ('-rank' if search_query else 'name')
     
     # Последовательно применяем фильтры
     if selected_diet_id and selected_diet_id.isdigit():
@@ -146,43 +477,160 @@ def recipe_list(request):
     if max_cooking_time and max_cooking_time.isdigit():
         recipes = recipes.filter(cooking_time__lte=max_cooking_time)
 
-    # Фильтр по ингредиентам: рецепт должен содержать КАЖДЫЙ из выбранных ингредиентов.
-    if included_ingredients:
-        for ingredient_id in included_ingredients:
-            if ingredient_id.isdigit(): # Добавлена проверка на случай мусора в GET-параметрах
-                recipes = recipes.filter(ingredients__id=ingredient_id)
+    # Фильтр по ингредиентам (проверка isdigit - на случай мусора в GET-параметрах):
+    # рецепт должен содержать КАЖДЫЙ ("all") или ХОТЯ БЫ ОДИН ("any") из выбранных ингредиентов
+    # и не содержать ни одного из исключенных.
+    selected_ingredients = [int(i) for i in included_ingredients if i.isdigit()]
+    selected_excluded_ingredients = [int(i) for i in excluded_ingredients if i.isdigit()]
+    # Исключенные группы раскрываются в ингредиенты по обратному индексу снимка каталога.
+    excluded_groups = _parse_ids(request.GET.getlist('exclude_groups'))
+    if ingredients_mode not in ('all', 'any'):
+        ingredients_mode = 'all'
 
-    # Фильтруем по поисковому запросу, если он есть
+    if ingredients_mode == 'any':
+        recipes = recipes.with_any_ingredients(selected_ingredients)
+    else:
+        recipes = recipes.with_all_ingredients(selected_ingredients)
+    recipes = recipes.without_ingredients(expand_excluded_ingredients(selected_excluded_ingredients, excluded_groups))
+
+    # Диапазоны КБЖУ на порцию (например, "калорий до 400", "белков от 30 г") - фильтр в базе.
+    recipes = recipes.with_nutrition_in_ranges(nutrition_ranges)
+
+    # Фильтруем по поисковому запросу, если он есть (полнотекстовый поиск, см. search.py)
     if search_query:
-        recipes = recipes.filter(
-            models.Q(name__icontains=search_query) | 
-            models.Q(description__icontains=search_query) |
-            models.Q(ingredients__name__icontains=search_query)
-        ).distinct()
+        recipes = search_recipes(recipes, search_query)
 
     # --- Применяем сортировку ---
-    VALID_SORT_FIELDS = ['name', 'cooking_time', 'servings']
+    VALID_SORT_FIELDS = ['name', 'cooking_time', 'servings', *NUTRIENTS]
+    if search_query:
+        VALID_SORT_FIELDS.append('rank')
 
     # Проверяем, что поле для сортировки (без знака "-") находится в нашем "списке"
-    if sort_by.lstrip('-') in VALID_SORT_FIELDS:
-        recipes = recipes.order_by(sort_by)
-    else:
+    if sort_by.lstrip('-') not in VALID_SORT_FIELDS:
         # Если в URL передан невалидный параметр сортировки, применяем сортировку по умолчанию.
         sort_by = 'name'
-        recipes = recipes.order_by(sort_by)
+
+    if sort_by.lstrip('-') in NUTRIENTS:
+        # Сортировка по КБЖУ на порцию выполняется в базе по столбцам RecipeNutrition.
+        recipes = recipes.with_nutrition_columns()
+
+    # Общее количество найденных рецептов кэшируется для каждой комбинации фильтров.
+    filters = {
+        'diet': selected_diet_id,
+        'meal_type': selected_meal_type,
+        'max_time': max_cooking_time,
+        'ingredients': sorted(selected_ingredients),
+        'ingredients_mode': ingredients_mode,
+        'exclude_ingredients': sorted(selected_excluded_ingredients),
+        'exclude_groups': excluded_groups,
+        'q': search_query,
+        'nutrition': {nutrient: [str(bound) for bound in bounds] for nutrient, bounds in nutrition_ranges.items()},
+    }
+    total_count = get_cached_recipe_count(recipes, filters)
+
+    # --- Постраничный вывод по курсору ---
+    page, next_cursor = paginate_by_keyset(
+        recipes, sort_by, request.GET.get('cursor'), settings.RECIPE_LIST_PAGE_SIZE
+    )
 
     context = {
-        'recipes': recipes,
+        'recipes': page,
+        'total_count': total_count,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
         'diets': diets,
         'meal_types': meal_types,
-        'ingredients_all': Ingredient.objects.all(),
+        # Вместо полного списка ингредиентов выводятся только выбранные,
+        # остальные подгружаются через поиск (см. ingredient_autocomplete).
+        'selected_ingredients_list': Ingredient.objects.filter(id__in=selected_ingredients).only('id', 'name'),
+        **_exclusions_context((selected_excluded_ingredients, excluded_groups)),
         # Передаем обратно в шаблон, чтобы "запомнить" выбор пользователя
         'selected_diet_id': int(selected_diet_id) if selected_diet_id and selected_diet_id.isdigit() else None,
         'selected_meal_type': selected_meal_type,
         'search_query': search_query,
         'current_sort': sort_by,
         'max_cooking_time': max_cooking_time,
-        'selected_ingredients': [int(i) for i in included_ingredients if i.isdigit()],
+        'selected_ingredients': selected_ingredients,
+        'ingredients_mode': ingredients_mode,
+        'nutrition_filters': [
+            (nutrient, label, *nutrition_ranges.get(nutrient, (None, None)))
+            for nutrient, label in NUTRITION_FILTER_LABELS
+        ],
     }
     
-    return render(request, 'recipes/recipe_list.html', context)
\ No newline at end of file
+    return render(request, 'recipes/recipe_list.html', context)
+
+
+# ==============================================================================
+# View для поиска рецептов по имеющимся продуктам
+# ==============================================================================
+PANTRY_MAX_MISSING = 3
+PANTRY_RESULTS_LIMIT = 48
+
+@replica_reads
+def pantry_search(request):
+    """
+    Подбирает рецепты по продуктам, которые есть у пользователя (GET-параметры ingredients),
+    разрешая докупить не более max_missing ингредиентов. Рецепты ранжируются по числу
+    недостающих ингредиентов; поиск выполняется по индексу состава рецептов в памяти
+    (см. pantry.py), из базы загружаются только показанные рецепты и недостающие ингредиенты.
+    """
+    ingredient_ids = _parse_ids(request.GET.getlist('ingredients'))
+    try:
+        max_missing = min(max(int(request.GET.get('max_missing', 0)), 0), PANTRY_MAX_MISSING)
+    except ValueError:
+        max_missing = 0
+
+    results, total_count = [], 0
+    if ingredient_ids:
+        with timed('pantry'):
+            matches = search_pantry(ingredient_ids, max_missing)
+        total_count = len(matches)
+        matches = matches[:PANTRY_RESULTS_LIMIT]
+        recipes = Recipe.objects.for_catalogue_card().in_bulk([match.recipe_id for match in matches])
+        missing_ingredients = Ingredient.objects.only('id', 'name').in_bulk(
+            {ingredient_id for match in matches for ingredient_id in match.missing}
+        )
+        results = [
+            {
+                'recipe': recipes[match.recipe_id],
+                'matched': match.matched,
+                'total': match.total,
+                'missing': sorted(
+                    missing_ingredients[ingredient_id].name
+                    for ingredient_id in match.missing if ingredient_id in missing_ingredients
+                ),
+            }
+            for match in matches if match.recipe_id in recipes
+        ]
+
+    context = {
+        'selected_ingredients_list': Ingredient.objects.filter(id__in=ingredient_ids).only('id', 'name'),
+        'max_missing': max_missing,
+        'max_missing_choices': range(PANTRY_MAX_MISSING + 1),
+        'searched': bool(ingredient_ids),
+        'results': results,
+        'total_count': total_count,
+    }
+    return render(request, 'recipes/pantry.html', context)
+
+
+# ==============================================================================
+# View для поиска ингредиентов (фильтр каталога)
+# ==============================================================================
+INGREDIENT_AUTOCOMPLETE_LIMIT = 20
+
+@replica_reads
+def ingredient_autocomplete(request):
+    """
+    Возвращает JSON со списком ингредиентов, название которых содержит строку из GET-параметра "q".
+    Используется фильтром по ингредиентам в каталоге вместо загрузки всего списка.
+    """
+    query = request.GET.get('q', '').strip()
+    ingredients = Ingredient.objects.none()
+    if query:
+        ingredients = Ingredient.objects.filter(name__icontains=query).only('id', 'name')[:INGREDIENT_AUTOCOMPLETE_LIMIT]
+
+    return JsonResponse({
+        'results': [{'id': ingredient.id, 'name': ingredient.name} for ingredient in ingredients],
+    })
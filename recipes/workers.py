@@ -0,0 +1,92 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+
+
+# ==============================================================================
+# Пул потоков для генератора меню
+# ==============================================================================
+# Генератор выполняется вне цикла событий, чтобы асинхронный view (ASGI) не
+# блокировал обработку других запросов. Пул и счетчик свободных мест создаются
+# один раз на процесс при первом обращении.
+
+class GeneratorBusy(Exception):
+    """Все места для одновременных запусков генератора заняты."""
+
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+_process_pool = None
+
+
+def get_executor():
+    """Возвращает пул потоков генератора (MEAL_PLAN_API_WORKERS потоков)."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.MEAL_PLAN_API_WORKERS, thread_name_prefix='meal-plan'
+            )
+        return _executor
+
+
+def get_slots():
+    """
+    Возвращает семафор, ограничивающий число запусков генератора, которые выполняются
+    или ожидают свободного потока (MEAL_PLAN_API_MAX_CONCURRENCY).
+    """
+    global _slots
+    with _lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(settings.MEAL_PLAN_API_MAX_CONCURRENCY)
+        return _slots
+
+
+async def run_in_pool(func, *args, timeout=None, **kwargs):
+    """
+    Выполняет func(*args, **kwargs) в пуле потоков и ожидает результат не дольше timeout секунд.
+    Функция выполняется в копии контекста запроса (contextvars): в потоке пула доступны
+    замеры этапов (timing.py) и выбранная для чтения база (routers.py).
+
+    Исключения:
+        GeneratorBusy: свободных мест нет - запрос не ставится в очередь.
+        asyncio.TimeoutError: результат не получен за timeout секунд. Если функция еще
+            ждала свободного потока, она отменяется; если уже выполняется - доработает
+            до конца, и место освободится только после ее завершения, поэтому долгие
+            запуски не могут переполнить пул.
+    """
+    slots = get_slots()
+    if not slots.acquire(blocking=False):
+        raise GeneratorBusy()
+
+    try:
+        context = contextvars.copy_context()
+        future = get_executor().submit(context.run, func, *args, **kwargs)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+
+# ==============================================================================
+# Пул процессов для параллельного поиска (см. parallel.py)
+# ==============================================================================
+def get_process_pool():
+    """
+    Возвращает пул процессов (MEAL_PLAN_PARALLEL_WORKERS процессов) для перезапусков
+    случайного поиска. Процессы запускаются при первом обращении; при запуске методом
+    spawn в каждом из них выполняется django.setup().
+    """
+    global _process_pool
+    with _lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=settings.MEAL_PLAN_PARALLEL_WORKERS, initializer=django.setup
+            )
+        return _process_pool
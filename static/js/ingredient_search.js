@@ -0,0 +1,43 @@
+// Подгрузка ингредиентов для фильтров по мере ввода названия.
+document.querySelectorAll('.ingredient-search').forEach((input) => {
+    const list = input.closest('ul');
+    const field = input.dataset.field;
+    let timer = null;
+
+    function selectedIds() {
+        return Array.from(list.querySelectorAll(`input[name="${field}"]:checked`)).map((el) => el.value);
+    }
+
+    function render(results) {
+        list.querySelectorAll('li.ingredient-suggestion').forEach((el) => el.remove());
+        const selected = selectedIds();
+        results.filter((item) => !selected.includes(String(item.id))).forEach((item) => {
+            const li = document.createElement('li');
+            li.className = 'ingredient-suggestion';
+            const label = document.createElement('label');
+            const checkbox = document.createElement('input');
+            checkbox.type = 'checkbox';
+            checkbox.name = field;
+            checkbox.value = item.id;
+            label.append(checkbox, ' ' + item.name);
+            li.append(label);
+            list.append(li);
+            // Отмеченный ингредиент остается в списке при следующем поиске.
+            checkbox.addEventListener('change', () => li.classList.remove('ingredient-suggestion'));
+        });
+    }
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        const query = input.value.trim();
+        if (!query) {
+            render([]);
+            return;
+        }
+        timer = setTimeout(() => {
+            fetch(input.dataset.url + '?q=' + encodeURIComponent(query))
+                .then((response) => response.json())
+                .then((data) => render(data.results));
+        }, 250);
+    });
+});